@@ -0,0 +1,66 @@
+"""Compares selection time and plan quality of FedZero's selection for different candidate pruning factors.
+
+For each factor, the same rounds are selected on a synthetic scenario. Plan quality is reported as the round
+duration and as the objective `sum(utility * planned batches)` relative to the selection without pruning.
+
+Usage: python -m benchmarks.candidate_pruning --clients 300 --clients_per_round 30 --factor 2 --factor 4 --solver highs
+"""
+import contextlib
+import io
+import math
+import time
+from typing import List, Optional
+
+import click
+import numpy as np
+
+from benchmarks.synthetic import synthetic_scenario
+from fedzero.selection_strategy import FedZeroSelectionStrategy
+from fedzero.utility import StatUtilityJudge
+
+
+def _select_rounds(n_clients: int, n_zones: int, clients_per_round: int, factor: Optional[float],
+                   solver: Optional[str], rounds: List[int]):
+    power_domain_api, client_load_api, clients = synthetic_scenario(n_clients, n_zones=n_zones)
+    strategy = FedZeroSelectionStrategy(clients_per_round=clients_per_round,
+                                        utility_judge=StatUtilityJudge(clients),
+                                        alpha=0, exclusion_factor=0, min_epochs=1, max_epochs=5,
+                                        solver=solver, pruning_factor=factor)
+    utility = strategy.utility_judge.utility()
+    results = []
+    for round_number, now in enumerate(rounds, start=1):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = strategy.select(power_domain_api, client_load_api, round_number, now)
+        runtime = time.perf_counter() - start
+        if plan is None:
+            results.append((runtime, np.nan, np.nan))
+            continue
+        objective = sum(utility[c] * b for c, b in zip(plan.clients, plan.batches.sum(axis=1)))
+        results.append((runtime, plan.duration, objective))
+    return np.array(results)
+
+
+@click.command()
+@click.option('--clients', type=int, default=300)
+@click.option('--zones', type=int, default=10)
+@click.option('--clients_per_round', type=int, default=30)
+@click.option('--factor', type=float, multiple=True, default=[2, 4, 8])
+@click.option('--solver', type=str, default=None)  # defaults to SOLVER_BACKEND
+@click.option('--rounds', type=int, default=5)
+def main(clients: int, zones: int, clients_per_round: int, factor: List[float], solver: Optional[str], rounds: int):
+    # Rounds spread over the synthetic solar peak
+    timesteps = np.linspace(60, 180, rounds).astype(int).tolist()
+    baseline = _select_rounds(clients, zones, clients_per_round, None, solver, timesteps)
+    print(f"{'factor':>6} {'K':>5} {'select time':>12} {'speedup':>8} {'duration':>9} {'objective':>10}")
+    print(f"{'none':>6} {'all':>5} {baseline[:, 0].mean():>11.3f}s {1:>7.1f}x "
+          f"{np.nanmean(baseline[:, 1]):>9.1f} {1:>10.1%}")
+    for f in factor:
+        results = _select_rounds(clients, zones, clients_per_round, f, solver, timesteps)
+        k = math.ceil(f * clients_per_round / zones)
+        print(f"{f:>6g} {k:>5} {results[:, 0].mean():>11.3f}s {baseline[:, 0].mean() / results[:, 0].mean():>7.1f}x "
+              f"{np.nanmean(results[:, 1]):>9.1f} {np.nanmean(results[:, 2] / baseline[:, 2]):>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Measures the runtime of simulating training rounds with `execute_round`.
+
+Usage: python -m benchmarks.execute_round --clients_per_round 10 --clients_per_round 100 --clients_per_round 500
+"""
+import contextlib
+import io
+import time
+from typing import List
+
+import click
+import numpy as np
+
+from benchmarks.synthetic import synthetic_scenario
+from fedzero.entities import SelectionPlan, SimulationClock
+from fedzero.runtime_optimization import execute_round
+
+
+@click.command()
+@click.option('--clients_per_round', type=int, multiple=True, default=[10, 100, 500])
+@click.option('--rounds', type=int, default=20)
+@click.option('--duration', type=int, default=30)  # timesteps of the selection
+@click.option('--solar_scale', type=float, default=200)
+def main(clients_per_round: List[int], rounds: int, duration: int, solar_scale: float):
+    print(f"{'clients':>8} {'per round':>10} {'mean duration':>14}")
+    for n_clients in clients_per_round:
+        power_domain_api, client_load_api, clients = synthetic_scenario(max(n_clients * 2, 100),
+                                                                        solar_scale=solar_scale)
+        rng = np.random.default_rng(0)
+        elapsed = 0.0
+        durations = []
+        for r in range(rounds):
+            now = SimulationClock.timesteps(minutes=r * 5)
+            selected = [clients[i] for i in rng.choice(len(clients), n_clients, replace=False)]
+            selection = SelectionPlan.from_clients(selected, client_load_api, power_domain_api,
+                                                   start=now + 1,
+                                                   batches=rng.uniform(0, 5, (n_clients, duration)))
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                _, round_duration = execute_round(power_domain_api, client_load_api, selection, 1, 5)
+            elapsed += time.perf_counter() - start
+            durations.append(round_duration)
+        print(f"{n_clients:>8} {elapsed / rounds:>9.3f}s {np.mean(durations):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Compares the build time of the selection MIPs with per-variable and matrix API construction.
+
+Usage: python -m benchmarks.model_construction --clients 100 --clients 1000 --clients 5000
+"""
+import time
+from typing import List
+
+import click
+
+from benchmarks.synthetic import synthetic_scenario
+from fedzero.selection_strategy import FedZeroSelectionStrategy
+from fedzero.solvers import build_matrix_model
+from fedzero.utility import StaticJudge
+
+
+def _timed(build) -> float:
+    start = time.perf_counter()
+    model = build()
+    model.update()
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('--clients', type=int, multiple=True, default=[100, 1000, 5000])
+@click.option('--duration', type=int, default=60)  # timesteps
+@click.option('--clients_per_round', type=int, default=10)
+def main(clients: List[int], duration: int, clients_per_round: int):
+    print(f"{'clients':>8} {'model':>6} {'per variable':>13} {'matrix':>8} {'speedup':>8}")
+    for n_clients in clients:
+        power_domain_api, client_load_api, all_clients = synthetic_scenario(n_clients)
+        strategy = FedZeroSelectionStrategy(clients_per_round=clients_per_round,
+                                            utility_judge=StaticJudge(all_clients),
+                                            alpha=0, exclusion_factor=0, min_epochs=1, max_epochs=5)
+        utility = strategy.utility_judge.utility()
+        now = 0
+
+        per_variable = _timed(lambda: strategy._build_optimal_selection_model(
+            power_domain_api, client_load_api, all_clients, utility, duration, now)[0])
+        matrix = _timed(lambda: build_matrix_model(strategy._selection_problem(
+            client_load_api, all_clients, utility, duration, now, n_clients=clients_per_round,
+            power_domain_api=power_domain_api))[0])
+        print(f"{n_clients:>8} {'green':>6} {per_variable:>12.2f}s {matrix:>7.2f}s {per_variable / matrix:>7.1f}x")
+
+        per_variable = _timed(lambda: strategy._build_brown_selection_model(
+            client_load_api, all_clients, utility, duration, 10 ** 6, 1, now)[0])
+        matrix = _timed(lambda: build_matrix_model(strategy._selection_problem(
+            client_load_api, all_clients, utility, duration, now, n_clients=1, exact_n_clients=False,
+            min_batches_offset=1, energy_budget=10 ** 6))[0])
+        print(f"{n_clients:>8} {'brown':>6} {per_variable:>12.2f}s {matrix:>7.2f}s {per_variable / matrix:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compares FedZero's selection of one round at a time with planning several rounds ahead in a single MIP.
+
+Consecutive rounds are selected and executed on a synthetic scenario, each starting when the previous one ended.
+Reports the time spent in the solver, how many rounds were taken from a plan and the mean round duration. The
+synthetic load forecasts are up to 20% off, so the default tolerance is higher than `REPLANNING_TOLERANCE`.
+
+Usage: python -m benchmarks.multi_round_planning --clients 30 --rounds 20 --planning_rounds 2 --planning_rounds 4
+"""
+import contextlib
+import io
+from typing import List, Optional
+
+import click
+import numpy as np
+
+from benchmarks.synthetic import synthetic_scenario
+from fedzero.runtime_optimization import execute_round
+from fedzero.selection_strategy import FedZeroSelectionStrategy
+from fedzero.utility import StaticJudge
+
+
+def _run_rounds(n_clients: int, clients_per_round: int, rounds: int, planning_rounds: Optional[int],
+                tolerance: float, solver: Optional[str]):
+    power_domain_api, client_load_api, clients = synthetic_scenario(n_clients, n_zones=5,
+                                                                    planning_rounds=planning_rounds)
+    strategy = FedZeroSelectionStrategy(clients_per_round=clients_per_round, utility_judge=StaticJudge(clients),
+                                        alpha=0, exclusion_factor=0, min_epochs=1, max_epochs=5,
+                                        model_builder="matrix", solver=solver, planning_rounds=planning_rounds,
+                                        replanning_tolerance=tolerance)
+    now, durations = 30, []
+    for round_number in range(1, rounds + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = strategy.select(power_domain_api, client_load_api, round_number, now)
+            if plan is None:
+                now += 5
+                continue
+            _, duration = execute_round(power_domain_api, client_load_api, plan, 1, 5)
+        durations.append(duration)
+        now += duration
+    stats = [s for round_stats in strategy.solve_stats.values() for s in round_stats]
+    from_plan = sum(1 for solves in strategy.solve_counts.values() if solves == 0)
+    return sum(s.runtime for s in stats), len(stats), from_plan, np.mean(durations)
+
+
+@click.command()
+@click.option('--clients', type=int, default=30)
+@click.option('--clients_per_round', type=int, default=5)
+@click.option('--rounds', type=int, default=20)
+@click.option('--planning_rounds', type=int, multiple=True, default=[2, 4])
+@click.option('--tolerance', type=float, default=0.3)  # see REPLANNING_TOLERANCE
+@click.option('--solver', type=str, default="highs")  # the planning MIP exceeds size-limited Gurobi licences
+def main(clients: int, clients_per_round: int, rounds: int, planning_rounds: List[int], tolerance: float,
+         solver: Optional[str]):
+    print(f"{'planned':>8} {'solver time':>12} {'solves':>7} {'from plan':>10} {'duration':>9}")
+    baseline = None
+    for n in [None, *planning_rounds]:
+        runtime, solves, from_plan, duration = _run_rounds(clients, clients_per_round, rounds, n, tolerance, solver)
+        baseline = runtime if baseline is None else baseline
+        print(f"{str(n or 1):>8} {runtime:>11.3f}s {solves:>7} {from_plan:>10} {duration:>9.1f} "
+              f"({1 - runtime / baseline:.1%} saved)")
+
+
+if __name__ == "__main__":
+    main()
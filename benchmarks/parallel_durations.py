@@ -0,0 +1,60 @@
+"""Compares selection time of FedZero's sequential duration search and the parallel search over batches of durations.
+
+For each batch size, the same rounds are selected on a synthetic scenario. Since the parallel search solves
+more durations in total, the speedup depends on the number of cores (see `SELECTION_PROCESSES`).
+
+Usage: python -m benchmarks.parallel_durations --clients 300 --batch 4 --batch 8 --solver highs
+"""
+import contextlib
+import io
+import time
+from typing import List, Optional
+
+import click
+import numpy as np
+
+from benchmarks.synthetic import synthetic_scenario
+from fedzero.parallel import process_pool
+from fedzero.selection_strategy import FedZeroSelectionStrategy
+from fedzero.utility import StatUtilityJudge
+
+
+def _select_rounds(n_clients: int, clients_per_round: int, batch: Optional[int], solver: Optional[str],
+                   rounds: List[int]):
+    power_domain_api, client_load_api, clients = synthetic_scenario(n_clients)
+    strategy = FedZeroSelectionStrategy(clients_per_round=clients_per_round,
+                                        utility_judge=StatUtilityJudge(clients),
+                                        alpha=0, exclusion_factor=0, min_epochs=1, max_epochs=5,
+                                        model_builder="matrix", solver=solver, parallel_durations=batch)
+    results = []
+    for round_number, now in enumerate(rounds, start=1):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = strategy.select(power_domain_api, client_load_api, round_number, now)
+        results.append((time.perf_counter() - start, np.nan if plan is None else plan.duration,
+                        strategy.solve_counts[round_number]))
+    return np.array(results)
+
+
+@click.command()
+@click.option('--clients', type=int, default=300)
+@click.option('--clients_per_round', type=int, default=30)
+@click.option('--batch', type=int, multiple=True, default=[2, 4, 8])
+@click.option('--solver', type=str, default=None)  # defaults to SOLVER_BACKEND
+@click.option('--rounds', type=int, default=5)
+def main(clients: int, clients_per_round: int, batch: List[int], solver: Optional[str], rounds: int):
+    process_pool().submit(np.zeros, 1).result()  # start the workers outside of the measurements
+    # Rounds spread over the synthetic solar peak
+    timesteps = np.linspace(60, 180, rounds).astype(int).tolist()
+    baseline = _select_rounds(clients, clients_per_round, None, solver, timesteps)
+    print(f"{'batch':>6} {'select time':>12} {'speedup':>8} {'duration':>9} {'solves':>7}")
+    print(f"{'none':>6} {baseline[:, 0].mean():>11.3f}s {1:>7.1f}x {np.nanmean(baseline[:, 1]):>9.1f} "
+          f"{baseline[:, 2].mean():>7.1f}")
+    for b in batch:
+        results = _select_rounds(clients, clients_per_round, b, solver, timesteps)
+        print(f"{b:>6} {results[:, 0].mean():>11.3f}s {baseline[:, 0].mean() / results[:, 0].mean():>7.1f}x "
+              f"{np.nanmean(results[:, 1]):>9.1f} {results[:, 2].mean():>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compares solve time and objective of the solver backends (and the greedy heuristic) on selection problems.
+
+Problems are either recorded during an experiment (set `RECORD_SELECTION_PROBLEMS` in fedzero/config.py) or
+generated from synthetic scenarios.
+
+Usage: python -m benchmarks.solver_backends --problems recorded_problems/
+       python -m benchmarks.solver_backends --clients 100 --clients 1000 --duration 30
+       python -m benchmarks.solver_backends --solvers highs --solvers greedy
+"""
+import glob
+import os
+import time
+from typing import List, Optional, Tuple
+
+import click
+import numpy as np
+
+from benchmarks.synthetic import synthetic_scenario
+from fedzero.selection_strategy import FedZeroSelectionStrategy
+from fedzero.solvers import SelectionProblem, get_solver, greedy_selection
+from fedzero.utility import StaticJudge
+
+
+def _synthetic_problems(clients: List[int], duration: int,
+                        clients_per_round: int) -> List[Tuple[str, SelectionProblem]]:
+    problems = []
+    for n_clients in clients:
+        power_domain_api, client_load_api, all_clients = synthetic_scenario(n_clients)
+        strategy = FedZeroSelectionStrategy(clients_per_round=clients_per_round,
+                                            utility_judge=StaticJudge(all_clients),
+                                            alpha=0, exclusion_factor=0, min_epochs=1, max_epochs=5,
+                                            model_builder="matrix")
+        utility = strategy.utility_judge.utility()
+        problems.append((f"green_{n_clients}", strategy._selection_problem(
+            client_load_api, all_clients, utility, duration, 0, n_clients=clients_per_round,
+            power_domain_api=power_domain_api)))
+        problems.append((f"brown_{n_clients}", strategy._selection_problem(
+            client_load_api, all_clients, utility, duration, 0, n_clients=1, exact_n_clients=False,
+            min_batches_offset=1, energy_budget=10 ** 6)))
+    return problems
+
+
+def _solve(solver: str, problem: SelectionProblem) -> Tuple[float, Optional[float]]:
+    start = time.perf_counter()
+    try:
+        if solver == "greedy":
+            solution = greedy_selection(problem)
+        else:
+            solution = get_solver(solver).solve_selection(problem)
+    except Exception as e:  # e.g. problem too large for a size-limited Gurobi licence
+        print(f"  {solver} failed: {e}")
+        return time.perf_counter() - start, np.nan
+    return time.perf_counter() - start, None if solution is None else solution.objective
+
+
+@click.command()
+@click.option('--problems', type=click.Path(exists=True, file_okay=False), default=None)
+@click.option('--clients', type=int, multiple=True, default=[100, 1000])
+@click.option('--duration', type=int, default=30)  # timesteps
+@click.option('--clients_per_round', type=int, default=10)
+@click.option('--solvers', type=str, multiple=True, default=["gurobi", "highs"])
+def main(problems: Optional[str], clients: List[int], duration: int, clients_per_round: int, solvers: List[str]):
+    if problems is not None:
+        paths = sorted(glob.glob(os.path.join(problems, "*.npz")))
+        selection_problems = [(os.path.basename(p), SelectionProblem.load(p)) for p in paths]
+    else:
+        selection_problems = _synthetic_problems(clients, duration, clients_per_round)
+
+    print(f"{'problem':>28} {'clients':>8} {'steps':>6} " + " ".join(f"{s:>10} {'objective':>12}" for s in solvers))
+    totals = {s: 0.0 for s in solvers}
+    for name, problem in selection_problems:
+        row = f"{name:>28} {problem.capacity.shape[0]:>8} {problem.capacity.shape[1]:>6} "
+        for solver in solvers:
+            duration_s, objective = _solve(solver, problem)
+            totals[solver] += duration_s
+            row += f"{duration_s:>9.3f}s {'infeasible' if objective is None else f'{objective:.2f}':>12} "
+        print(row)
+    print(f"{'total':>44} " + " ".join(f"{totals[s]:>9.3f}s {'':>12}" for s in solvers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Synthetic scenarios of arbitrary size for benchmarking the selection and runtime models."""
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from vessim.signal import HistoricalSignal
+
+from fedzero.config import TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, PLANNING_ROUNDS
+from fedzero.entities import Client, ClientLoadApi, PowerDomainApi
+from fedzero.scenarios import get_client_sizes
+
+START = pd.to_datetime("2022-06-08 00:00:00")
+
+
+def synthetic_scenario(n_clients: int,
+                       n_zones: int = 10,
+                       hours: int = 4,
+                       solar_scale: float = 800,
+                       seed: int = 0,
+                       planning_rounds: Optional[int] = PLANNING_ROUNDS
+                       ) -> Tuple[PowerDomainApi, ClientLoadApi, List[Client]]:
+    """Creates random client load and solar signals for `n_clients` clients spread over `n_zones` zones.
+
+    Clients are sized like in `get_scenario` and have a random number of samples. The signals reach
+    `planning_rounds` rounds of the longest duration past the end.
+    """
+    rng = np.random.default_rng(seed)
+    end = START + timedelta(hours=hours)
+    index = pd.date_range(START, end + timedelta(minutes=MAX_ROUND_IN_MIN * (planning_rounds or 1)),
+                          freq=f"{TIMESTEP_IN_MIN}min")
+
+    zones = [f"zone{z}" for z in range(n_zones)]
+    client_sizes = get_client_sizes(net_arch_size_factor=1)
+    clients = []
+    for i in range(n_clients):
+        zone = zones[i % n_zones]
+        size = client_sizes[rng.choice(list(client_sizes))]
+        client = Client(name=f"{i}_{zone}", zone=zone, batches_per_timestep=size["batches_per_timestep"],
+                        energy_per_batch=size["energy_per_batch"])
+        client.num_samples = int(rng.integers(100, 1000))
+        clients.append(client)
+
+    load = pd.DataFrame(rng.integers(0, 100, (len(index), n_clients)) / 100, index=index,
+                        columns=[c.name for c in clients])
+    reserved = (load + rng.integers(0, 20, load.shape) / 100).clip(upper=1)
+    client_load_api = ClientLoadApi(clients, HistoricalSignal(load, reserved, fill_method="bfill"),
+                                    planning_rounds=planning_rounds)
+
+    # A solar peak per zone with some noise, the forecast is the actual value with 10% error
+    peak = np.sin(np.linspace(0, np.pi, len(index)))[:, None]
+    solar = pd.DataFrame(np.clip(peak * rng.uniform(0.3, 1, (len(index), n_zones)), 0, None) * solar_scale,
+                         index=index, columns=zones)
+    forecast = solar * rng.uniform(0.9, 1.1, solar.shape)
+    power_domain_api = PowerDomainApi(HistoricalSignal(solar, forecast, fill_method="bfill"), start=START, end=end,
+                                      planning_rounds=planning_rounds)
+    return power_domain_api, client_load_api, clients
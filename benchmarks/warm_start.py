@@ -0,0 +1,55 @@
+"""Compares solver time of FedZero's selection with and without warm start from the previous round.
+
+Consecutive rounds are selected on a synthetic scenario, each starting when the previous one is planned to end.
+Warm starts require the gurobi backend, so the default sizes fit a size-limited licence.
+
+Usage: python -m benchmarks.warm_start --clients 30 --clients_per_round 5 --rounds 20 --model_builder matrix
+"""
+import contextlib
+import io
+from typing import Optional
+
+import click
+import numpy as np
+
+from benchmarks.synthetic import synthetic_scenario
+from fedzero.selection_strategy import FedZeroSelectionStrategy
+from fedzero.utility import StaticJudge
+
+
+def _select_rounds(n_clients: int, clients_per_round: int, rounds: int, model_builder: Optional[str],
+                   warm_start: bool):
+    power_domain_api, client_load_api, clients = synthetic_scenario(n_clients, n_zones=3)
+    strategy = FedZeroSelectionStrategy(clients_per_round=clients_per_round, utility_judge=StaticJudge(clients),
+                                        alpha=0, exclusion_factor=0, min_epochs=1, max_epochs=5,
+                                        model_builder=model_builder, solver="gurobi", warm_start=warm_start)
+    now, durations = 30, []
+    for round_number in range(1, rounds + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = strategy.select(power_domain_api, client_load_api, round_number, now)
+        durations.append(np.nan if plan is None else plan.duration)
+        now += 5 if plan is None else plan.duration
+    stats = [s for round_stats in strategy.solve_stats.values() for s in round_stats]
+    warm_starts = [s.warm_start for s in stats if s.warm_start is not None]
+    return (sum(s.runtime for s in stats), len(stats), np.nanmean(durations),
+            np.mean(warm_starts) if warm_starts else np.nan)
+
+
+@click.command()
+@click.option('--clients', type=int, default=30)
+@click.option('--clients_per_round', type=int, default=5)
+@click.option('--rounds', type=int, default=20)
+@click.option('--model_builder', type=click.Choice(["incremental", "matrix", "per_variable"]), default="matrix")
+def main(clients: int, clients_per_round: int, rounds: int, model_builder: str):
+    print(f"{'warm start':>10} {'solver time':>12} {'solves':>7} {'duration':>9} {'accepted':>9}")
+    baseline = None
+    for warm_start in [False, True]:
+        runtime, solves, duration, accepted = _select_rounds(clients, clients_per_round, rounds, model_builder,
+                                                             warm_start)
+        baseline = runtime if baseline is None else baseline
+        print(f"{str(warm_start):>10} {runtime:>11.3f}s {solves:>7} {duration:>9.1f} {accepted:>9.1%} "
+              f"({1 - runtime / baseline:.1%} saved)")
+
+
+if __name__ == "__main__":
+    main()
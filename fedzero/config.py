@@ -3,12 +3,38 @@ import gurobipy
 NIID_DATA_SEED = 42  # controls how the data is split across clients
 SAVE_TRAINED_MODELS = False
 GUROBI_ENV = gurobipy.Env(params={"OutputFlag": 0})
+SOLVER_BACKEND = "gurobi"  # "gurobi" or "highs" (scipy.optimize.milp, no licence required)
+ATTRIBUTION_ENGINE = "water_filling"  # "water_filling", "mip" (SOLVER_BACKEND) or "verify" (both, must agree)
+# Per zone, only the ceil(factor * clients_per_round / zones) clients with the highest utility * achievable batches
+# enter the green selection MIP, at least clients_per_round in total; all candidates if None (see
+# benchmarks/candidate_pruning.py)
+CANDIDATE_PRUNING_FACTOR = None
+# Round durations that FedZero's selection solves at once in worker processes, e.g. the number of cores. Durations are
+# searched one at a time if None.
+PARALLEL_DURATIONS = None
+SELECTION_PROCESSES = None  # worker processes for parallel selection (fedzero/parallel.py), all cores if None
+RECORD_SELECTION_PROBLEMS = None  # directory to store all selection problems in, e.g. for benchmarks/solver_backends.py
+# Limits of each selection/attribution solve, solver defaults if None. On a time limit, the best solution found so far
+# is used and selections without any solution fall back to the greedy heuristic.
+SELECTION_TIME_LIMIT_S = None
+SELECTION_MIP_GAP = None  # relative
+ATTRIBUTION_TIME_LIMIT_S = None
+ATTRIBUTION_MIP_GAP = None  # relative
+SOLVER_THREADS = None  # ignored by the highs backend
+SELECTION_WARM_START = False  # start the green selection MIP from the previous round's participants (gurobi only)
+# Rounds that FedZero's selection plans ahead in a single MIP, each round is planned on its own if None. Planned rounds
+# are used until the actual capacity or energy of an executed round deviates by more than REPLANNING_TOLERANCE.
+PLANNING_ROUNDS = None
+REPLANNING_TOLERANCE = 0.1  # relative deviation of the actual from the forecasted capacity or energy
 
 TIMESTEP_IN_MIN = 1  # minutes
 MAX_ROUND_IN_MIN = 60  # minutes
 MAX_ROUNDS = 120
 MAX_TIME_IN_DAYS = 7  # currently 11 max
 STOPPING_CRITERIA = None  # rounds without improved accuracy
+SKIP_INFEASIBLE_PERIODS = False  # retry failed selections only once enough clients have capacity and energy
+PIPELINED_ROUNDS = False  # select and simulate the next round while the current one is aggregated and evaluated
+ASYNC_EVALUATION = False  # evaluate the global model in a background thread, see fedzero/evaluation.py
 
 ENABLE_BROWN_CLIENTS = False
 TIME_WINDOW_LOWER_BOUND = 101
@@ -16,14 +42,18 @@ TIME_WINDOW_UPPER_BOUND = 120
 BROWN_CLIENTS_BUDGET_PERCENTAGE = 4.0
 BROWN_CLIENTS_NUMBER_PERCENTAGE = 4.0
 BROWN_EXCLUSION_UPDATE = False
+COMBINED_BROWN_SELECTION = False  # select green and brown clients in a single MIP instead of one after another
 
 DATA_SUBSET = 1.0
+CLIENT_LOAD_STORAGE = "float64"  # "float64", "float16" or "uint8" (load percentages, converted on access)
+DATA_CACHE_DIR = "data/cache"  # binary copies of the scenario data, see fedzero/data_cache.py
 
 NUM_CLIENTS = 100
 CLIENTS_PER_ROUND = 10
 BATCH_SIZE = 10
 MIN_LOCAL_EPOCHS = 1
 MAX_LOCAL_EPOCHS = 5
+STATISTICAL_UTILITY_HISTORY = 16  # rounds of statistical utility kept per client
 
 SOLAR_SIZE = 800  # W
 
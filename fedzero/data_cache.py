@@ -0,0 +1,137 @@
+"""Binary cache of the scenario input data.
+
+Each cached frame is stored as `<name>.npy` (values, memory-mapped on load), `<name>.index.npy` (timestamps
+in ns, one column per index level) and `<name>.json` (columns and provenance). Cached frames only cover the
+simulated window of a scenario, so loading them skips parsing the full CSVs.
+
+Convert once via: python -m fedzero.data_cache --scenario global --scenario germany
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import click
+import numpy as np
+import pandas as pd
+from vessim._data import VESSIM_DATASETS
+from vessim.signal import HistoricalSignal, _abs_path
+
+from fedzero.config import DATA_CACHE_DIR, MAX_ROUND_IN_MIN
+
+# Data before the start and after the end of a scenario needed to resample the first and last timesteps
+_WINDOW_MARGIN = timedelta(days=1, minutes=MAX_ROUND_IN_MIN)
+
+
+def save_frame(df: pd.DataFrame, name: str, **metadata) -> None:
+    """Stores `df` (with a DatetimeIndex or a MultiIndex of timestamps) under `name` in DATA_CACHE_DIR."""
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    path = os.path.join(DATA_CACHE_DIR, name)
+    if isinstance(df.index, pd.MultiIndex):
+        levels = [df.index.get_level_values(i) for i in range(df.index.nlevels)]
+        index = np.column_stack([_to_ns(level) for level in levels])
+    else:
+        index = _to_ns(df.index)
+    np.save(path + ".npy", np.ascontiguousarray(df.to_numpy()))
+    np.save(path + ".index.npy", index)
+    # The sidecar is written last and marks the entry as complete
+    with open(path + ".json", "w") as f:
+        json.dump({"columns": [str(c) for c in df.columns], "index_names": list(df.index.names), **metadata}, f)
+
+
+def load_frame(name: str) -> Optional[Tuple[pd.DataFrame, Dict]]:
+    """Returns the cached frame and its metadata or None if `name` has not been cached."""
+    path = os.path.join(DATA_CACHE_DIR, name)
+    if not os.path.isfile(path + ".json"):
+        return None
+    with open(path + ".json") as f:
+        metadata = json.load(f)
+    values = np.load(path + ".npy", mmap_mode="r")
+    index_ns = np.load(path + ".index.npy")
+    if index_ns.ndim > 1:
+        index = pd.MultiIndex.from_arrays([pd.DatetimeIndex(level.astype("datetime64[ns]")) for level in index_ns.T],
+                                          names=metadata["index_names"])
+    else:
+        index = pd.DatetimeIndex(index_ns.astype("datetime64[ns]"), name=metadata["index_names"][0])
+    return pd.DataFrame(values, index=index, columns=metadata["columns"], copy=False), metadata
+
+
+def load_solar_signal(dataset: str, start: datetime, end: datetime, use_forecast: bool) -> Optional[HistoricalSignal]:
+    """Returns the signal of `HistoricalSignal.from_dataset` within the window without scaling, if it has been cached.
+
+    The memory-mapped values are not copied, scale them via `PowerDomainApi(scale=...)` instead.
+    """
+    actual = load_frame(f"{_window_name(dataset, start, end)}_actual")
+    forecast = load_frame(f"{_window_name(dataset, start, end)}_forecast")
+    if actual is None or forecast is None:
+        return None
+    (actual, metadata), (forecast, _) = actual, forecast
+    if metadata.get("source_mtime") != _solar_source_mtimes(dataset):
+        return None  # dataset changed since conversion
+    return HistoricalSignal(actual, forecast if use_forecast else None, fill_method=metadata["fill_method"])
+
+
+def convert_solar_signal(dataset: str, start: datetime, end: datetime) -> None:
+    signal = HistoricalSignal.from_dataset(dataset, params={"scale": 1.0, "use_forecast": True})
+    source_mtime = _solar_source_mtimes(dataset)
+    lower, upper = start - _WINDOW_MARGIN, end + _WINDOW_MARGIN
+    actual = pd.DataFrame(signal._actual)
+    forecast = pd.DataFrame(signal._forecast)
+    # Keep the last forecast issued before the window and all forecasts issued within it
+    issue_times = forecast.index.get_level_values(0)
+    first_issue = issue_times[issue_times <= lower].max() if (issue_times <= lower).any() else issue_times.min()
+    forecast = forecast[(issue_times >= first_issue) & (issue_times <= upper)
+                        & (forecast.index.get_level_values(1) <= upper)]
+    name = _window_name(dataset, start, end)
+    save_frame(actual.loc[lower:upper], f"{name}_actual", fill_method=signal._fill_method, source_mtime=source_mtime)
+    save_frame(forecast, f"{name}_forecast", fill_method=signal._fill_method, source_mtime=source_mtime)
+
+
+def load_client_load(csv_path: str, index: pd.DatetimeIndex) -> Optional[pd.DataFrame]:
+    """Returns the first `len(index)` rows of the client load CSV indexed by `index`, if they have been cached."""
+    cached = load_frame(_client_load_name(csv_path, index))
+    if cached is None:
+        return None
+    df, metadata = cached
+    if metadata["source_mtime"] != os.path.getmtime(csv_path):
+        return None  # CSV changed since conversion
+    return df
+
+
+def convert_client_load(csv_path: str, index: pd.DatetimeIndex) -> None:
+    df = pd.read_csv(csv_path, nrows=len(index))
+    df.set_index(index, inplace=True)
+    save_frame(df, _client_load_name(csv_path, index), source_mtime=os.path.getmtime(csv_path))
+
+
+def _solar_source_mtimes(dataset: str) -> List[Optional[float]]:
+    """Modification times of the CSVs `HistoricalSignal.from_dataset` reads, None for missing files."""
+    config = VESSIM_DATASETS[dataset]
+    paths = [os.path.join(_abs_path(None), config[kind]) for kind in ("actual", "forecast")]
+    return [os.path.getmtime(path) if os.path.isfile(path) else None for path in paths]
+
+
+def _window_name(dataset: str, start: datetime, end: datetime) -> str:
+    return f"{dataset}_{start:%Y%m%d%H%M}-{end:%Y%m%d%H%M}"
+
+
+def _client_load_name(csv_path: str, index: pd.DatetimeIndex) -> str:
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return f"{stem}_{index[0]:%Y%m%d%H%M}_{len(index)}"
+
+
+def _to_ns(index: pd.Index) -> np.ndarray:
+    return np.asarray(index.values, dtype="datetime64[ns]").astype(np.int64)
+
+
+@click.command()
+@click.option('--scenario', type=click.Choice(["global", "germany"]), multiple=True, default=["global", "germany"])
+def main(scenario):
+    from fedzero.scenarios import convert_scenario_data
+    for solar_scenario in scenario:
+        print(f"Converting {solar_scenario} scenario data to {DATA_CACHE_DIR}...")
+        convert_scenario_data(solar_scenario)
+
+
+if __name__ == "__main__":
+    main()
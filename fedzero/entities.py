@@ -1,24 +1,60 @@
 import math
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Optional, List, Union
+from typing import Callable, Dict, Optional, List, Union
 
+import numpy as np
 import pandas as pd
 from vessim.signal import HistoricalSignal
 
-from fedzero.config import BATCH_SIZE, TIMESTEP_IN_MIN
+from fedzero.config import BATCH_SIZE, TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, CLIENT_LOAD_STORAGE, \
+    STATISTICAL_UTILITY_HISTORY, PLANNING_ROUNDS
+
+
+class _CatalogField:
+    """Client attribute that is stored in the arrays of the client's `ClientCatalog` once it is attached to one."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, client, owner=None):
+        if client is None:
+            return self
+        if client._catalog is None:
+            return client._detached[self.name]
+        return getattr(client._catalog, self.name)[client._position].item()
+
+    def __set__(self, client, value):
+        if client._catalog is None:
+            client._detached[self.name] = value
+        else:
+            getattr(client._catalog, self.name)[client._position] = value
 
 
 class Client:
-    def __init__(self, name: str, zone: str, batches_per_timestep: float, energy_per_batch: float):
+    batches_per_timestep = _CatalogField()
+    energy_per_batch = _CatalogField()  # Ws
+    num_samples = _CatalogField()
+    participated_rounds = _CatalogField()
+    participated_batches = _CatalogField()
+
+    def __init__(self, name: str, zone: str, batches_per_timestep: float, energy_per_batch: float,
+                 size: Optional[str] = None, fairness_group: Optional[str] = None):
+        self._catalog: Optional[ClientCatalog] = None
+        self._position = 0
+        self._detached = {}
+        self._detached_utilities = UtilityHistory(n_clients=1, depth=STATISTICAL_UTILITY_HISTORY)
+
         self.name = name
         self.zone = zone
+        self.size = size
+        self.fairness_group = fairness_group
         self.batches_per_timestep = batches_per_timestep
-        self.energy_per_batch = energy_per_batch # Ws
+        self.energy_per_batch = energy_per_batch
 
         self.participated_rounds = 0
         self.participated_batches = 0
         self.num_samples = 0.0
-        self._statistical_utilities: Dict = {}
 
         self.is_brown = False
 
@@ -37,23 +73,352 @@ class Client:
             self.participated_rounds += 1
             self.participated_batches += computed_batches
 
+    @property
+    def utility_history(self) -> "UtilityHistory":
+        """The history containing this client's statistical utilities at row `self._position`."""
+        return self._detached_utilities if self._catalog is None else self._catalog.utility_history
+
     def record_statistical_utility(self, server_round: int, utility: float) -> None:
-        self._statistical_utilities[server_round] = utility
+        self.utility_history.record(self._position, server_round, utility)
 
     def statistical_utility(self) -> float:
-        if len(self._statistical_utilities) == 0:
+        if self.utility_history.last_round[self._position] == UtilityHistory.NONE:
             return (self.num_samples)  # by convention (copied from the original Oort code)
-        return list(self._statistical_utilities.values())[-1]
+        return self.utility_history.last_utility[self._position].item()
 
     def participated_in_last_round(self, round_number) -> bool:
-        try:
-            return list(self._statistical_utilities.keys())[-1] == round_number - 1
-        except IndexError:
-            return False
+        return self.utility_history.last_round[self._position] == round_number - 1
+
+
+class UtilityHistory:
+    """Statistical utilities recorded for a set of clients, bounded to the last `depth` rounds per client.
+
+    Entries are kept in a (clients × depth) ring buffer. The last round and utility of each client are also
+    kept in separate arrays, so they can be read in constant time and for all clients at once.
+    """
+    NONE = -1  # round of clients without any recorded utility
+
+    def __init__(self, n_clients: int, depth: int = STATISTICAL_UTILITY_HISTORY):
+        if depth < 1:
+            raise ValueError("The utility history must keep at least one round.")
+        self.depth = depth
+        self.rounds = np.full((n_clients, depth), UtilityHistory.NONE, dtype=int)
+        self.utilities = np.full((n_clients, depth), np.nan)
+        self.last_round = np.full(n_clients, UtilityHistory.NONE, dtype=int)
+        self.last_utility = np.full(n_clients, np.nan)
+        self._head = np.full(n_clients, -1, dtype=int)
+
+    def record(self, i: int, server_round: int, utility: float) -> None:
+        if self.last_round[i] != server_round:  # recording the same round again overwrites its utility
+            self._head[i] = (self._head[i] + 1) % self.depth
+        self.rounds[i, self._head[i]] = server_round
+        self.utilities[i, self._head[i]] = utility
+        self.last_round[i] = server_round
+        self.last_utility[i] = utility
+
+    def history(self, i: int) -> Dict[int, float]:
+        """Returns the kept utilities of client `i` by round, from oldest to latest."""
+        order = (self._head[i] + 1 + np.arange(self.depth)) % self.depth
+        return {int(r): u for r, u in zip(self.rounds[i, order], self.utilities[i, order].tolist())
+                if r != UtilityHistory.NONE}
+
+
+class ClientCatalog:
+    """Attributes and counters of all clients as arrays, indexed by the clients' positions.
+
+    The clients become views on the catalog: reading or updating e.g. `client.participated_batches` accesses
+    the catalog's arrays, so per-round bookkeeping and reporting can be done on all clients at once. A client
+    is attached to the catalog it was added to last.
+    """
+
+    def __init__(self, clients: List[Client]):
+        self.clients = list(clients)
+        self.names = [c.name for c in self.clients]
+        zones, self.zone_ids = np.unique([c.zone for c in self.clients], return_inverse=True)
+        self.zones = [str(zone) for zone in zones]
+        self.sizes = np.array([c.size for c in self.clients], dtype=object)
+        self.fairness_groups = np.array([c.fairness_group for c in self.clients], dtype=object)
+        self.batches_per_timestep = np.array([c.batches_per_timestep for c in self.clients], dtype=float)
+        self.energy_per_batch = np.array([c.energy_per_batch for c in self.clients], dtype=float)
+        self.num_samples = np.array([c.num_samples for c in self.clients], dtype=float)
+        self.participated_rounds = np.array([c.participated_rounds for c in self.clients], dtype=int)
+        self.participated_batches = np.array([c.participated_batches for c in self.clients], dtype=int)
+        self.utility_history = UtilityHistory(n_clients=len(self.clients), depth=STATISTICAL_UTILITY_HISTORY)
+        for i, client in enumerate(self.clients):
+            for server_round, utility in client.utility_history.history(client._position).items():
+                self.utility_history.record(i, server_round, utility)
+
+        self._position = {name: i for i, name in enumerate(self.names)}
+        self._by_zone = _build_index([c.zone for c in self.clients])
+        self._by_size = _build_index(self.sizes)
+        self._by_fairness_group = _build_index(self.fairness_groups)
+        for i, client in enumerate(self.clients):
+            client._catalog, client._position = self, i
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def position(self, name: str) -> int:
+        return self._position[name]
+
+    def positions(self, zones: Optional[List[str]] = None, sizes: Optional[List[str]] = None,
+                  fairness_groups: Optional[List[str]] = None) -> np.ndarray:
+        """Returns the sorted positions of all clients matching all given filters."""
+        positions = np.arange(len(self.clients))
+        for index, keys in ((self._by_zone, zones), (self._by_size, sizes),
+                            (self._by_fairness_group, fairness_groups)):
+            if keys is not None:
+                selected = [index[k] for k in keys if k in index]
+                positions = np.intersect1d(positions, np.concatenate(selected) if selected else [])
+        return positions.astype(int)
+
+    def get_clients(self, positions: np.ndarray) -> List[Client]:
+        return [self.clients[i] for i in positions]
+
+    def to_array(self, values: Dict[str, float]) -> np.ndarray:
+        """Converts a dict of values by client name to an array over all clients (0 for missing clients)."""
+        array = np.zeros(len(self.clients))
+        for name, value in values.items():
+            array[self._position[name]] = value
+        return array
+
+    def sum_per_zone(self, values: np.ndarray) -> Dict[str, float]:
+        """Sums `values` (one per client) within each zone."""
+        sums = np.bincount(self.zone_ids, weights=values, minlength=len(self.zones))
+        return dict(zip(self.zones, sums.tolist()))
+
+    def statistical_utilities(self) -> np.ndarray:
+        """Vectorized `Client.statistical_utility` of all clients."""
+        recorded = self.utility_history.last_round != UtilityHistory.NONE
+        return np.where(recorded, self.utility_history.last_utility, self.num_samples)
+
+    def participated_in_last_round(self, round_number: int) -> np.ndarray:
+        """Vectorized `Client.participated_in_last_round` of all clients."""
+        return self.utility_history.last_round == round_number - 1
+
+    def record_usage(self, positions: np.ndarray, computed_batches: np.ndarray) -> None:
+        """Vectorized `Client.record_usage` for the clients at `positions`, `computed_batches` must be whole batches."""
+        participated = computed_batches > 0
+        self.participated_rounds[positions[participated]] += 1
+        self.participated_batches[positions[participated]] += computed_batches[participated].astype(int)
+
+
+def _build_index(keys: List[Optional[str]]) -> Dict[str, np.ndarray]:
+    index = {}
+    for i, key in enumerate(keys):
+        if key is not None:
+            index.setdefault(key, []).append(i)
+    return {key: np.array(positions, dtype=int) for key, positions in index.items()}
+
+
+@dataclass(frozen=True)
+class SimulationClock:
+    """Maps the simulation's integer timesteps to wall-clock time.
+
+    The simulation advances in timesteps of TIMESTEP_IN_MIN since `start`; datetimes are only needed for
+    logging and TensorBoard.
+    """
+    start: datetime
+
+    def to_datetime(self, timestep: int) -> datetime:
+        return self.start + timedelta(minutes=TIMESTEP_IN_MIN * int(timestep))
+
+    def to_timestep(self, dt: datetime) -> int:
+        """Returns the first timestep at or after `dt`."""
+        return math.ceil((dt - self.start) / timedelta(minutes=TIMESTEP_IN_MIN))
+
+    @staticmethod
+    def timesteps(hours: float = 0, minutes: float = 0) -> int:
+        """Converts a duration to timesteps."""
+        return int((hours * 60 + minutes) / TIMESTEP_IN_MIN)
+
+
+def planning_horizon(planning_rounds: Optional[int] = None) -> int:
+    """Returns how many timesteps of forecasts are needed to plan `planning_rounds` rounds of the longest duration."""
+    return int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN) * (planning_rounds or 1)
+
+
+class TimeSeriesStore:
+    """Dense NumPy copy of a `HistoricalSignal` on the TIMESTEP_IN_MIN grid.
+
+    Actual values are held in a single (timesteps × columns) matrix. Forecasts are held in one matrix per
+    forecast issue time (or a single one, if the forecasts do not depend on the request time), each covering
+    all timesteps that can be requested while it is the most recent forecast. Lookups resolve to the same
+    values as `HistoricalSignal.at` and `HistoricalSignal.forecast(..., resample_method="bfill")`.
+
+    Accessors are indexed by integer timesteps of `clock`, i.e. rows of the stored matrices.
+
+    Args:
+        signal: The signal to load.
+        start: Time of the first timestep.
+        end: Last time that can be requested via the accessors.
+        columns: Columns to load, defaults to all columns of the signal.
+        horizon_in_timesteps: Maximum duration that can be requested via `forecast_all`, see `planning_horizon`.
+        transform: Applied once to all loaded matrices, e.g. to convert units.
+        dtype: Storage type of the matrices. Missing values of integer types are stored as their maximum value.
+    """
+
+    def __init__(self,
+                 signal: HistoricalSignal,
+                 start: datetime,
+                 end: datetime,
+                 columns: Optional[List[str]] = None,
+                 horizon_in_timesteps: Optional[int] = None,
+                 transform: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                 dtype: np.dtype = np.float64):
+        self.clock = SimulationClock(pd.Timestamp(start))
+        self.step = timedelta(minutes=TIMESTEP_IN_MIN)
+        self.columns = signal.columns() if columns is None else list(columns)
+        if horizon_in_timesteps is None:
+            horizon_in_timesteps = planning_horizon()
+        self.horizon_in_timesteps = horizon_in_timesteps
+        grid = pd.date_range(self.clock.start, pd.Timestamp(end) + self.step * horizon_in_timesteps,
+                             freq=f"{TIMESTEP_IN_MIN}min").values
+        if transform is None:
+            transform = _identity
+        self._missing = np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else None
+
+        # vessim 0.4.0 does not expose the underlying series, so we read them once here
+        actual = np.column_stack([_fill(signal._actual[col], grid, signal._fill_method) for col in self.columns])
+        self._actual = self._freeze(transform(actual), dtype)
+        # First row at or after each row that lacks actual data for some column
+        missing = np.append(self._isnan(self._actual).any(axis=1), True)
+        rows = np.where(missing, np.arange(len(missing)), len(missing))
+        self._next_missing_actual = np.minimum.accumulate(rows[::-1])[::-1]
+
+        forecast_src = [signal._forecast[col].dropna() for col in self.columns]
+        if forecast_src[0].index.nlevels > 1:
+            issue_times, self._forecast_offsets, forecasts = _load_issued_forecasts(
+                forecast_src, grid, horizon_in_timesteps)
+            # Issue times are not necessarily aligned to the grid
+            self._issue_times = (issue_times - grid[0]) / np.timedelta64(self.step)
+        else:
+            self._issue_times = None
+            self._forecast_offsets = np.zeros(1, dtype=int)
+            forecasts = [np.column_stack([_fill(src, grid, "bfill") for src in forecast_src])]
+        self._forecasts = [self._freeze(transform(forecast), dtype) for forecast in forecasts]
+
+    def actual_all(self, timestep: int) -> np.ndarray:
+        """Returns the actual values of all columns at `timestep` as read-only view."""
+        if not 0 <= timestep < len(self._actual):
+            raise ValueError(f"Timestep {timestep} is out of range of the time series store.")
+        values = self._actual[timestep]
+        if self._isnan(values).any():
+            raise ValueError(f"No actual data available for all columns at timestep {timestep}.")
+        return values
+
+    def actual_horizon(self, timestep: int) -> int:
+        """Returns for how many timesteps from `timestep` on actual values are available for all columns."""
+        if not 0 <= timestep < len(self._actual):
+            return 0
+        return int(self._next_missing_actual[timestep]) - timestep
+
+    def forecast_all(self, timestep: int, duration_in_timesteps: int) -> np.ndarray:
+        """Returns the forecasted values of all columns for the next timesteps as read-only (timesteps × columns) view."""
+        if duration_in_timesteps > self.horizon_in_timesteps:
+            raise ValueError(f"Forecasts are only stored for up to {self.horizon_in_timesteps} timesteps.")
+        forecast, i = self._forecast_block(timestep)
+        if i < 0 or i + duration_in_timesteps > len(forecast):
+            raise ValueError(f"Timestep {timestep} is out of range of the time series store.")
+        values = forecast[i:i + duration_in_timesteps]
+        if self._isnan(values).any():
+            raise ValueError(f"Not enough forecast data available at timestep {timestep} for {duration_in_timesteps} timesteps.")
+        return values
+
+    def forecast_horizon(self, timestep: int) -> int:
+        """Returns for how many timesteps after `timestep` forecasts are available for all columns."""
+        forecast, i = self._forecast_block(timestep)
+        values = forecast[max(i, 0):i + self.horizon_in_timesteps]
+        if i < 0 or len(values) == 0:
+            return 0
+        missing = self._isnan(values).any(axis=1)
+        return int(np.argmax(missing)) if missing.any() else len(values)
+
+    def _freeze(self, values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+        if self._missing is not None:
+            values = np.where(np.isnan(values), self._missing, values)
+        values = np.ascontiguousarray(values, dtype=dtype)
+        values.setflags(write=False)
+        return values
+
+    def _isnan(self, values: np.ndarray) -> np.ndarray:
+        return np.isnan(values) if self._missing is None else values == self._missing
+
+    def _forecast_block(self, timestep: int):
+        """Returns the forecast matrix of the most recent issue time before `timestep` and the row of the next one."""
+        if self._issue_times is None:
+            issue = 0
+        else:
+            issue = np.searchsorted(self._issue_times, timestep, side="right") - 1
+            if issue < 0:
+                raise ValueError(f"No forecasts available at timestep {timestep}.")
+        return self._forecasts[issue], timestep + 1 - self._forecast_offsets[issue]
+
+
+def _identity(values: np.ndarray) -> np.ndarray:
+    return values
+
+
+def _to_percent(load: np.ndarray) -> np.ndarray:
+    return np.round(load * 100)
+
+
+def _fill(series: pd.Series, grid: np.ndarray, fill_method: str) -> np.ndarray:
+    """Resamples `series` to `grid` like vessim: bfill takes the first value at or after, ffill the last before."""
+    series = series.dropna()
+    index = series.index.values
+    if fill_method == "bfill":
+        pos = np.searchsorted(index, grid, side="left")
+        valid = pos < len(index)
+    else:
+        pos = np.searchsorted(index, grid, side="right") - 1
+        valid = pos >= 0
+    result = np.full(len(grid), np.nan)
+    result[valid] = series.values[pos[valid]]
+    return result
+
+
+def _load_issued_forecasts(forecast_src: List[pd.Series], grid: np.ndarray, horizon_in_timesteps: int):
+    """Splits forecasts indexed by (issue time, time) into one matrix per issue time.
+
+    The matrix of an issue time covers all timesteps that can be requested while it is the most recent one.
+    """
+    issue_times = forecast_src[0].index.get_level_values(0).unique().sort_values().values
+    # Only keep the last issue before the grid starts and all issues within the grid
+    first = max(np.searchsorted(issue_times, grid[0], side="right") - 1, 0)
+    last = np.searchsorted(issue_times, grid[-1], side="right")
+    issue_times = issue_times[first:last]
+
+    offsets = np.searchsorted(grid, issue_times, side="left")
+    ends = np.append(offsets[1:], len(grid)) + horizon_in_timesteps + 1
+    ends = np.minimum(ends, len(grid))
+
+    columns = []
+    for src in forecast_src:
+        requested = src.index.get_level_values(0).values
+        times = src.index.get_level_values(1).values
+        bounds = np.searchsorted(requested, issue_times, side="left")
+        bounds_end = np.searchsorted(requested, issue_times, side="right")
+        columns.append([pd.Series(src.values[a:b], index=times[a:b]) for a, b in zip(bounds, bounds_end)])
+
+    forecasts = [np.column_stack([_fill(column[j], grid[offsets[j]:ends[j]], "bfill") for column in columns])
+                 for j in range(len(issue_times))]
+    return issue_times, offsets, forecasts
 
 
 class ClientLoadApi:
-    def __init__(self, clients: List[Client], signal: HistoricalSignal, unconstrained: Union[bool, List[str]] = False):
+    """Capacity of the clients in batches per timestep, derived from their load.
+
+    Args:
+        storage: How loads are stored, "float64" stores the capacity in batches, "float16" and "uint8" store the
+            load as percentages (integer percentages are stored losslessly) and convert them on access.
+        planning_rounds: Forecasts are kept for this many rounds of the longest duration, see
+            `FedZeroSelectionStrategy(planning_rounds=...)`.
+    """
+
+    def __init__(self, clients: List[Client], signal: HistoricalSignal, unconstrained: Union[bool, List[str]] = False,
+                 start: Optional[datetime] = None, storage: Optional[str] = None,
+                 planning_rounds: Optional[int] = PLANNING_ROUNDS):
         self.signal = signal
         self._clients = {c.name: c for c in clients}
         if isinstance(unconstrained, list):
@@ -64,31 +429,89 @@ class ClientLoadApi:
             self._unconstrained = []
         self.signal = signal
 
+        # Positions in the catalog are also the columns of the load matrices
+        self.catalog = ClientCatalog(list(self._clients.values()))
+        batches_per_timestep = self.catalog.batches_per_timestep.copy()
+        unconstrained_mask = np.array([name in self._unconstrained for name in self._clients])
+
+        def to_batches(load: np.ndarray) -> np.ndarray:
+            return np.where(unconstrained_mask, batches_per_timestep, (1 - load) * batches_per_timestep)
+
+        storage = CLIENT_LOAD_STORAGE if storage is None else storage
+        if storage == "float64":
+            transform, dtype = to_batches, np.float64
+            self._to_batches = _identity
+        elif storage in ("float16", "uint8"):
+            transform, dtype = _to_percent, np.dtype(storage)
+            self._to_batches = lambda percent: to_batches(percent / 100)
+        else:
+            raise ValueError(f"Unknown client load storage: {storage}")
+
+        # The signal only spans the simulated time window
+        index = signal._actual[next(iter(self._clients))].index
+        self._store = TimeSeriesStore(signal, start=index[0] if start is None else start, end=index[-1],
+                                      columns=list(self._clients), transform=transform, dtype=dtype,
+                                      horizon_in_timesteps=planning_horizon(planning_rounds))
+
     def get_clients(self, zones: Optional[List[str]] = None) -> List[Client]:
         """Returs the names of clients present in one of the zones as list."""
         if zones is None:
-            return list(self._clients.values())
-        return [client for client in self._clients.values() if client.zone in zones]
+            return list(self.catalog.clients)
+        return self.catalog.get_clients(self.catalog.positions(zones=zones))
+
+    def column_index(self, clients: List[Client]) -> np.ndarray:
+        """Returns the positions of the clients in the arrays returned by `actual_all` and `forecast_all`."""
+        return np.array([self.catalog.position(c.name) for c in clients], dtype=int)
+
+    @property
+    def clock(self) -> SimulationClock:
+        return self._store.clock
 
-    def actual(self, dt: datetime, client_name: str) -> float:
+    def actual(self, now: int, client_name: str) -> float:
         """Returns the actual amount of batches than can be computed during the next timestep."""
-        if client_name in self._unconstrained:
-            return self._clients[client_name].batches_per_timestep
-        actual_batches = (1 - self.signal.at(dt, column=client_name)) * self._clients[client_name].batches_per_timestep
+        actual_batches = self._to_batches(self._store.actual_all(now))[self.catalog.position(client_name)]
         return round(actual_batches) if actual_batches < 1 else actual_batches
 
-    def forecast(self, now: datetime, duration_in_timesteps: int, client_name: str) -> pd.Series:
+    def actual_all(self, now: int) -> np.ndarray:
+        """Returns the actual amount of batches that all clients can compute during the next timestep."""
+        actual_batches = self._to_batches(self._store.actual_all(now))
+        return np.where(actual_batches < 1, np.round(actual_batches), actual_batches)
+
+    def forecast(self, now: int, duration_in_timesteps: int, client_name: str) -> pd.Series:
         """Returns the forecasted amount of batches than can be computed during the next timesteps."""
-        forecast = (1 - self.signal.forecast(now, now + timedelta(minutes=TIMESTEP_IN_MIN * duration_in_timesteps),
-                                     column=client_name, frequency=f"{TIMESTEP_IN_MIN}T",
-                                     resample_method="bfill")) * self._clients[client_name].batches_per_timestep
-        if client_name in self._unconstrained:
-            forecast[:] = self._clients[client_name].batches_per_timestep
-        return forecast
+        forecast = self.forecast_all(now, duration_in_timesteps)[:, self.catalog.position(client_name)]
+        return _to_series(forecast, now, client_name)
+
+    def forecast_all(self, now: int, duration_in_timesteps: int) -> np.ndarray:
+        """Returns the forecasted amount of batches of all clients as (timesteps × clients) array."""
+        return self._to_batches(self._store.forecast_all(now, duration_in_timesteps))
+
+    @property
+    def horizon_in_timesteps(self) -> int:
+        """Maximum duration that can be requested via `forecast_all`."""
+        return self._store.horizon_in_timesteps
+
+    def forecast_horizon(self, now: int) -> int:
+        """Returns for how many timesteps after `now` load forecasts are available."""
+        return self._store.forecast_horizon(now)
+
+    def actual_horizon(self, now: int) -> int:
+        """Returns for how many timesteps from `now` on actual loads are available."""
+        return self._store.actual_horizon(now)
 
 
 class PowerDomainApi:
-    def __init__(self, signal: HistoricalSignal, unconstrained: Union[bool, List[str]] = False):
+    """Energy available in the power domains in Ws per timestep.
+
+    Args:
+        scale: Factor applied to the signal's power values while loading them, e.g. the size of the solar panels.
+        planning_rounds: Forecasts are kept for this many rounds of the longest duration, see
+            `FedZeroSelectionStrategy(planning_rounds=...)`.
+    """
+
+    def __init__(self, signal: HistoricalSignal, unconstrained: Union[bool, List[str]] = False,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None, scale: float = 1.0,
+                 planning_rounds: Optional[int] = PLANNING_ROUNDS):
         self.signal = signal
         if isinstance(unconstrained, list):
             self._unconstrained = unconstrained
@@ -97,20 +520,130 @@ class PowerDomainApi:
         else:
             self._unconstrained = []
 
+        self._zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        unconstrained_mask = np.array([zone in self._unconstrained for zone in self.zones])
+
+        def to_energy(power: np.ndarray) -> np.ndarray:
+            return np.where(unconstrained_mask, 1000000000000.0, power * scale * 60 * TIMESTEP_IN_MIN)
+
+        index = signal._actual[self.zones[0]].index
+        self._store = TimeSeriesStore(signal, start=index[0] if start is None else start,
+                                      end=index[-1] if end is None else end, transform=to_energy,
+                                      horizon_in_timesteps=planning_horizon(planning_rounds))
+
     @property
     def zones(self) -> List[str]:
         return self.signal.columns()
 
-    def actual(self, dt: datetime, zone: str) -> float:
+    def zone_index(self, zones: List[str]) -> np.ndarray:
+        """Returns the positions of the zones in the arrays returned by `actual_all` and `forecast_all`."""
+        return np.array([self._zone_index[zone] for zone in zones], dtype=int)
+
+    @property
+    def clock(self) -> SimulationClock:
+        return self._store.clock
+
+    def actual(self, now: int, zone: str) -> float:
         """Returns the actual Ws available during the next timestep."""
-        if zone in self._unconstrained:
-            return 1000000000000.0
-        return self.signal.at(dt, column=zone) * 60 * TIMESTEP_IN_MIN
-    
-    def forecast(self, start_time: datetime, duration_in_timesteps: int, zone: str) -> pd.Series:
+        return self._store.actual_all(now)[self._zone_index[zone]]
+
+    def actual_all(self, now: int) -> np.ndarray:
+        """Returns the actual Ws available in all zones during the next timestep."""
+        return self._store.actual_all(now)
+
+    def forecast(self, now: int, duration_in_timesteps: int, zone: str) -> pd.Series:
         """Returns the forecasted Ws available during the next timesteps."""
-        forecast = (self.signal.forecast(start_time, start_time + timedelta(minutes=TIMESTEP_IN_MIN * duration_in_timesteps),
-                column=zone, frequency=f"{TIMESTEP_IN_MIN}T", resample_method="bfill") * 60 * TIMESTEP_IN_MIN)
-        if zone in self._unconstrained:
-            forecast[:] = 1000000000000.0
-        return forecast
+        forecast = self._store.forecast_all(now, duration_in_timesteps)[:, self._zone_index[zone]]
+        return _to_series(forecast, now, zone)
+
+    def forecast_all(self, now: int, duration_in_timesteps: int) -> np.ndarray:
+        """Returns the forecasted Ws available in all zones as read-only (timesteps × zones) view."""
+        return self._store.forecast_all(now, duration_in_timesteps)
+
+    @property
+    def horizon_in_timesteps(self) -> int:
+        """Maximum duration that can be requested via `forecast_all`."""
+        return self._store.horizon_in_timesteps
+
+    def forecast_horizon(self, now: int) -> int:
+        """Returns for how many timesteps after `now` energy forecasts are available."""
+        return self._store.forecast_horizon(now)
+
+    def actual_horizon(self, now: int) -> int:
+        """Returns for how many timesteps from `now` on actual energy values are available."""
+        return self._store.actual_horizon(now)
+
+
+@dataclass
+class SelectionPlan:
+    """Expected batches of the clients selected for a training round.
+
+    Attributes:
+        clients: The selected clients.
+        client_index: Positions of the clients in the arrays of `ClientLoadApi`.
+        zone_ids: Positions of the clients' power domains in the arrays of `PowerDomainApi`.
+        start: First timestep of the round.
+        batches: (clients × timesteps) expected batches.
+        is_brown: Whether each client may compute on brown energy, all green if None.
+    """
+    clients: List[Client]
+    client_index: np.ndarray
+    zone_ids: np.ndarray
+    start: int
+    batches: np.ndarray
+    is_brown: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        if self.is_brown is None:
+            self.is_brown = np.zeros(len(self.clients), dtype=bool)
+
+    @classmethod
+    def from_clients(cls, clients: List[Client], client_load_api: ClientLoadApi, power_domain_api: PowerDomainApi,
+                     start: int, batches: np.ndarray, is_brown: bool = False) -> "SelectionPlan":
+        return cls(clients=list(clients),
+                   client_index=client_load_api.column_index(clients),
+                   zone_ids=power_domain_api.zone_index([c.zone for c in clients]),
+                   start=start,
+                   batches=np.asarray(batches, dtype=np.float32).reshape(len(clients), -1),
+                   is_brown=np.full(len(clients), is_brown))
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, client_load_api: ClientLoadApi,
+                       power_domain_api: PowerDomainApi, is_brown: bool = False) -> "SelectionPlan":
+        """Converts a DataFrame indexed by clients with one column per timestep."""
+        return cls.from_clients(list(df.index), client_load_api, power_domain_api, int(df.columns[0]), df.to_numpy(),
+                                is_brown)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.batches, index=self.clients, columns=self.timesteps)
+
+    @property
+    def duration(self) -> int:
+        """Expected duration of the round in timesteps."""
+        return self.batches.shape[1]
+
+    @property
+    def timesteps(self) -> np.ndarray:
+        return np.arange(self.start, self.start + self.duration)
+
+    def resized(self, duration: int, fill_value: float = 1) -> "SelectionPlan":
+        """Returns the plan cut or padded with `fill_value` to `duration` timesteps."""
+        batches = np.full((len(self.clients), duration), fill_value, dtype=np.float32)
+        n = min(duration, self.duration)
+        batches[:, :n] = self.batches[:, :n]
+        return SelectionPlan(self.clients, self.client_index, self.zone_ids, self.start, batches, self.is_brown)
+
+    def concat(self, other: "SelectionPlan") -> "SelectionPlan":
+        """Appends the clients of another plan with the same start, padding the shorter one with zeros."""
+        duration = max(self.duration, other.duration)
+        return SelectionPlan(clients=self.clients + other.clients,
+                             client_index=np.concatenate([self.client_index, other.client_index]),
+                             zone_ids=np.concatenate([self.zone_ids, other.zone_ids]),
+                             start=self.start,
+                             batches=np.vstack([self.resized(duration, 0).batches,
+                                                other.resized(duration, 0).batches]),
+                             is_brown=np.concatenate([self.is_brown, other.is_brown]))
+
+
+def _to_series(forecast: np.ndarray, now: int, name: str) -> pd.Series:
+    return pd.Series(forecast.copy(), index=pd.RangeIndex(now + 1, now + 1 + len(forecast)), name=name)
@@ -0,0 +1,65 @@
+"""Evaluates snapshots of the global model in the background while federated learning continues.
+
+`EvaluationWorker` keeps a single evaluation model in a dedicated thread, so it is built once per experiment
+instead of once per round. The server submits the global parameters after each round and only waits for the
+result if it needs it, e.g. for `STOPPING_CRITERIA`. A thread is used since PyTorch releases the GIL during
+evaluation and the test data does not need to be copied into another process.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+import torch
+from flwr.common import NDArrays, Scalar
+
+EvaluationResult = Tuple[float, Dict[str, Scalar]]
+
+
+class EvaluationWorker:
+    """Evaluates parameter snapshots one after another, in the order they were submitted.
+
+    Args:
+        model_fn: Creates the evaluation model, called once in the worker thread.
+        evaluate_fn: Loads the parameters of a round into the model and returns loss and metrics.
+    """
+
+    def __init__(self, model_fn: Callable[[], torch.nn.Module],
+                 evaluate_fn: Callable[[torch.nn.Module, int, NDArrays], EvaluationResult]):
+        self._model_fn = model_fn
+        self._evaluate_fn = evaluate_fn
+        self._queue: "queue.Queue[Optional[Tuple[Future, int, NDArrays]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="evaluation", daemon=True)
+        self._thread.start()
+
+    def submit(self, server_round: int, parameters: NDArrays) -> Future:
+        """Queues the parameters of `server_round` for evaluation, the future resolves to loss and metrics."""
+        future = Future()
+        self._queue.put((future, server_round, parameters))
+        return future
+
+    def join(self) -> None:
+        """Blocks until all submitted snapshots are evaluated and the callbacks of their futures have run."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Evaluates all queued snapshots and stops the worker thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        model = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            future, server_round, parameters = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    if model is None:
+                        model = self._model_fn()
+                    future.set_result(self._evaluate_fn(model, server_round, parameters))
+                except BaseException as e:
+                    future.set_exception(e)
+            self._queue.task_done()
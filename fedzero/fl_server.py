@@ -15,14 +15,14 @@
 """Flower server."""
 import json
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import deepcopy
-from datetime import datetime, timedelta
-from logging import DEBUG, INFO
+from functools import partial
+from logging import DEBUG, INFO, WARNING
 from typing import Dict, List, Optional, Tuple
 
 import numpy as np
-import pandas as pd
-from flwr.common import Parameters, Scalar
+from flwr.common import Parameters, Scalar, parameters_to_ndarrays
 from flwr.common.logger import log
 from flwr.server import Server, SimpleClientManager
 from flwr.server.client_proxy import ClientProxy
@@ -31,8 +31,10 @@ from flwr.server.server import fit_clients, FitResultsAndFailures
 from flwr.server.strategy import Strategy
 from torch.utils.tensorboard import SummaryWriter
 
-from fedzero.config import STOPPING_CRITERIA
-from fedzero.runtime_optimization import execute_round
+from fedzero.config import STOPPING_CRITERIA, TIMESTEP_IN_MIN, SKIP_INFEASIBLE_PERIODS, PIPELINED_ROUNDS
+from fedzero.entities import SelectionPlan, SimulationClock
+from fedzero.evaluation import EvaluationResult, EvaluationWorker
+from fedzero.runtime_optimization import record_round, simulate_round
 from fedzero.scenarios import Scenario
 from fedzero.selection_strategy import SelectionStrategy
 
@@ -56,20 +58,27 @@ class FedZeroServer(Server):
                  max_epochs: float,
                  strategy: Strategy,
                  writer: SummaryWriter,
+                 evaluator: Optional[EvaluationWorker] = None,
                  ) -> None:
         self.power_domain_api = scenario.power_domain_api
         self.client_load_api = scenario.client_load_api
         self.selection_strategy = selection_strategy
         self.min_epochs = min_epochs
         self.max_epochs = max_epochs
-        self.start_time = scenario.start_date
-        self.end_time = scenario.end_date
+        self.clock = SimulationClock(scenario.start_date)
+        self.end_timestep = self.clock.to_timestep(scenario.end_date)
         self.writer = writer
+        self.evaluator = evaluator  # evaluates rounds in the background instead of `strategy.evaluate` if set
         self._last_agg_local_loss = None
         self._last_agg_local_loss_ema = None
         self._last_agg_local_accuracy = None
         self._last_agg_local_accuracy_ema = None
         self._last_metrics = None
+        self.skipped_timesteps = 0  # simulated time skipped without selection attempts, see SKIP_INFEASIBLE_PERIODS
+        # With PIPELINED_ROUNDS, the next round is selected and simulated while the current one is aggregated and
+        # evaluated, see `_start_next_selection`
+        self._selection_worker = ThreadPoolExecutor(max_workers=1) if PIPELINED_ROUNDS else None
+        self._next_selection: Optional[Future] = None
         super(FedZeroServer, self).__init__(client_manager=FedZeroClientManager(), strategy=strategy)
 
     _ema_window = 5
@@ -95,23 +104,29 @@ class FedZeroServer(Server):
             log(INFO, f"initial parameters (loss, other metrics): {res[0]}, {res[1]}")
             history.add_loss_centralized(server_round=0, loss=res[0])
             history.add_metrics_centralized(server_round=0, metrics=res[1])
-            self.writer.add_scalar("timestamp", 0, global_step=0, walltime=self.start_time.timestamp())
-            self.writer.add_scalar("val_loss", res[0], global_step=0, walltime=self.start_time.timestamp())
-            self.writer.add_scalar("accuracy", res[1]["accuracy"], global_step=0, walltime=self.start_time.timestamp())
+            self.writer.add_scalar("timestamp", 0, global_step=0, walltime=self.clock.start.timestamp())
+            self.writer.add_scalar("val_loss", res[0], global_step=0, walltime=self.clock.start.timestamp())
+            self.writer.add_scalar("accuracy", res[1]["accuracy"], global_step=0, walltime=self.clock.start.timestamp())
 
         # Run federated learning for num_rounds
-        now = self.start_time
+        now = 0  # timestep of self.clock
         best_accuracy = 0
         rounds_without_accuracy_improvement = 0
-        log(INFO, f"FL starting at {now}")
+        evaluation: Optional[Future] = None  # of the last round, if evaluated in the background
+        log(INFO, f"FL starting at {self.clock.start}")
         for current_round in range(1, num_rounds + 1):
             start_time = time.time()
+            skipped_timesteps = self.skipped_timesteps
             # Train model and replace previous global model
             while True:
                 start_time_fit = time.time()
-                res_fit = self.fit_round_ra(server_round=current_round, now=now,
-                                            timeout=timeout)
-                tb_props = dict(global_step=current_round, walltime=now.timestamp())
+                if self._next_selection is not None:
+                    selected, self._next_selection = self._next_selection.result(), None
+                    res_fit = selected and self.fit_round_ra(server_round=current_round, now=now, timeout=timeout,
+                                                             selected=selected)
+                else:
+                    res_fit = self.fit_round_ra(server_round=current_round, now=now, timeout=timeout)
+                tb_props = dict(global_step=current_round, walltime=self.clock.to_datetime(now).timestamp())
                 if res_fit:
                     print(f'Select & fit time: {time.time() - start_time_fit:.1f} s')
                     parameters, metrics, _, participation, new_now = res_fit  # fit_metrics_aggregated
@@ -140,56 +155,71 @@ class FedZeroServer(Server):
                     self.writer.add_scalar("weighted_train_accuracy_delta_ema",
                                            metrics.get("local_weighted_train_acc_delta_ema", np.nan), **tb_props)
                     break
-                now += timedelta(minutes=5)  # wait for 5 min and try again
+                now += SimulationClock.timesteps(minutes=5)  # wait for 5 min and try again
+                if SKIP_INFEASIBLE_PERIODS:
+                    now = self._skip_infeasible_period(now)
+                    if now is None:
+                        break
+            if not res_fit:
+                log(INFO, "STOPPING no selection possible before max time.")
+                break
 
             now = new_now
             # Evaluate model using strategy implementation
             # We don't do client side evaluation!
             start_time_eval = time.time()
-            res_cen = self.strategy.evaluate(current_round, parameters=self.parameters)
-            if res_cen is not None:
-                loss_cen, metrics_cen = res_cen
-                if metrics_cen["accuracy"] > best_accuracy:
-                    best_accuracy = metrics_cen["accuracy"]
-                    rounds_without_accuracy_improvement = 0
-                else:
-                    rounds_without_accuracy_improvement += 1
-
-                tb_props = dict(global_step=current_round, walltime=now.timestamp())
-
-                log(INFO, f"fit progress: ({current_round}, {loss_cen}, {metrics_cen}, {now})")
-                self.writer.add_scalar("timestamp", now.timestamp() - self.start_time.timestamp(), **tb_props)
-                self.writer.add_scalar("val_loss", loss_cen, **tb_props)
-                self.writer.add_scalar("accuracy", metrics_cen["accuracy"], **tb_props)
+            if self.evaluator is None:
+                res_cen = self.strategy.evaluate(current_round, parameters=self.parameters)
+                if res_cen is not None:
+                    tb_props = dict(global_step=current_round, walltime=self.clock.to_datetime(now).timestamp())
+                    self._record_evaluation(current_round, now, res_cen)
+            else:  # the result is only awaited if STOPPING_CRITERIA needs it
+                res_cen = None
+                evaluation = self.evaluator.submit(current_round, parameters_to_ndarrays(self.parameters))
+                evaluation.add_done_callback(partial(self._record_background_evaluation, current_round, now))
+                tb_props = dict(global_step=current_round, walltime=self.clock.to_datetime(now).timestamp())
             print(f'Eval time: {time.time() - start_time_eval:.1f} s')
 
             # Report round duration
-            round_duration_in_min = int(duration.seconds / 60)
+            round_duration_in_min = duration * TIMESTEP_IN_MIN
             self.writer.add_scalar("round_duration", round_duration_in_min, **tb_props)
+            if SKIP_INFEASIBLE_PERIODS:
+                self.writer.add_scalar("skipped_time", (self.skipped_timesteps - skipped_timesteps) * TIMESTEP_IN_MIN,
+                                       **tb_props)
+
+            # Report number of MIP solves needed for selection (including retries in this round)
+            solve_counts = getattr(self.selection_strategy, "solve_counts", {})
+            if current_round in solve_counts:
+                self.writer.add_scalar("selection_solves", solve_counts[current_round], **tb_props)
+            solve_stats = getattr(self.selection_strategy, "solve_stats", {})
+            if current_round in solve_stats:
+                self.writer.add_scalar("selection_solve_time", sum(s.runtime for s in solve_stats[current_round]),
+                                       **tb_props)
+                warm_starts = [s.warm_start for s in solve_stats[current_round] if s.warm_start is not None]
+                if warm_starts:
+                    self.writer.add_scalar("selection_warm_start_accepted", np.mean(warm_starts), **tb_props)
+            selection_gaps = getattr(self.selection_strategy, "gaps", {})
+            if current_round in selection_gaps:
+                self.writer.add_scalar("selection_gap", selection_gaps[current_round], **tb_props)
 
             # Report energy usage
-            used_energy = _ws_to_kwh(sum(
-                client.participated_batches * client.energy_per_batch for client in self.client_load_api.get_clients()))
-            self.writer.add_scalar("energy/total", used_energy, **tb_props)
+            catalog = self.client_load_api.catalog
+            used_energy_per_client = catalog.participated_batches * catalog.energy_per_batch
+            self.writer.add_scalar("energy/total", _ws_to_kwh(used_energy_per_client.sum()), **tb_props)
 
             # Report round energy usage
-            round_energy = sum(
-                _ws_to_kwh(c.energy_per_batch) * participation[c.name] for c in self.client_load_api.get_clients()
-                if c.name in participation)
-            self.writer.add_scalar("energy/round", round_energy, **tb_props)
+            round_energy_per_client = _ws_to_kwh(catalog.energy_per_batch) * catalog.to_array(participation)
+            self.writer.add_scalar("energy/round", round_energy_per_client.sum(), **tb_props)
 
             # Report energy per domain
-            round_energy_per_domain_round = {zone: 0.0 for zone in self.power_domain_api.zones}
+            used_energy_per_domain = catalog.sum_per_zone(used_energy_per_client)
+            round_energy_per_domain = catalog.sum_per_zone(round_energy_per_client)
             for zone in self.power_domain_api.zones:
-                clients_in_zone = [client for client in self.client_load_api.get_clients() if client.zone == zone]
-                self.writer.add_scalar(f"energy_per_domain/{zone}", _ws_to_kwh(
-                    sum(client.participated_batches * client.energy_per_batch for client in clients_in_zone)),
+                self.writer.add_scalar(f"energy_per_domain/{zone}", _ws_to_kwh(used_energy_per_domain.get(zone, 0.0)),
+                                       **tb_props)
+            for zone in self.power_domain_api.zones:
+                self.writer.add_scalar(f"energy_per_domain_round/{zone}", round_energy_per_domain.get(zone, 0.0),
                                        **tb_props)
-                for c in clients_in_zone:
-                    if c.name in participation:
-                        round_energy_per_domain_round[zone] += _ws_to_kwh(c.energy_per_batch) * participation[c.name]
-            for domain_name, energy in round_energy_per_domain_round.items():
-                self.writer.add_scalar(f"energy_per_domain_round/{domain_name}", energy, **tb_props)
 
             # Report participation per client
             for c in self.client_load_api.get_clients():
@@ -197,40 +227,122 @@ class FedZeroServer(Server):
                 client_participation = participation[c.name] if c.name in participation else 0
                 self.writer.add_scalar(f"client_participation/{c.name}", client_participation, **tb_props)
 
+            if STOPPING_CRITERIA is not None and evaluation is not None:
+                res_cen = evaluation.result()
+            if res_cen is not None:
+                if res_cen[1]["accuracy"] > best_accuracy:
+                    best_accuracy = res_cen[1]["accuracy"]
+                    rounds_without_accuracy_improvement = 0
+                else:
+                    rounds_without_accuracy_improvement += 1
             if STOPPING_CRITERIA is not None and rounds_without_accuracy_improvement >= STOPPING_CRITERIA:
                 log(INFO, f"STOPPING no progress since {STOPPING_CRITERIA} rounds.: Best acc: {best_accuracy}")
                 break
-            if now >= self.end_time:
+            if now >= self.end_timestep:
                 log(INFO, "STOPPING max time reached before model converged.")
                 break
             print(f'Round time: {time.time() - start_time:.1f} s')
 
+        if self._next_selection is not None:  # selected after the last round, which is never taken
+            if not self._next_selection.cancel():
+                self._next_selection.result()  # discarded, as nothing is recorded before a round is taken
+            self._next_selection = None
+        if self.evaluator is not None:
+            self.evaluator.join()
+        if SKIP_INFEASIBLE_PERIODS:
+            log(INFO, f"Skipped {self.skipped_timesteps * TIMESTEP_IN_MIN / 60:.1f} h of simulated time in which no "
+                      f"selection was possible.")
         log(INFO, "FL finished.")
         return history
 
-    def fit_round_ra(self, server_round: int, now: datetime, timeout: Optional[float]) -> \
-            Optional[Tuple[Optional[Parameters], Dict, FitResultsAndFailures, Dict[str, int], datetime]]:
-        """Perform a single round of federated averaging."""
+    def _record_evaluation(self, server_round: int, now: int, res_cen: EvaluationResult) -> None:
+        """Logs the centralized evaluation of `server_round`, which ended at timestep `now`."""
+        loss_cen, metrics_cen = res_cen
+        tb_props = dict(global_step=server_round, walltime=self.clock.to_datetime(now).timestamp())
+        log(INFO, f"fit progress: ({server_round}, {loss_cen}, {metrics_cen}, {self.clock.to_datetime(now)})")
+        self.writer.add_scalar("timestamp", now * TIMESTEP_IN_MIN * 60, **tb_props)
+        self.writer.add_scalar("val_loss", loss_cen, **tb_props)
+        self.writer.add_scalar("accuracy", metrics_cen["accuracy"], **tb_props)
+
+    def _record_background_evaluation(self, server_round: int, now: int, evaluation: Future) -> None:
+        if evaluation.exception() is not None:
+            log(WARNING, f"Evaluation of round {server_round} failed: {evaluation.exception()!r}")
+            return
+        self._record_evaluation(server_round, now, evaluation.result())
+
+    def _skip_infeasible_period(self, now: int) -> Optional[int]:
+        """Returns the next retry time from `now` on (every 5 min) at which the selection strategy may find a selection.
+
+        None if there is none before `end_timestep`.
+        """
+        retry_interval = SimulationClock.timesteps(minutes=5)
+        next_now = self.selection_strategy.next_feasible_time(self.power_domain_api, self.client_load_api, now,
+                                                              until=self.end_timestep, step=retry_interval)
+        skipped = (self.end_timestep if next_now is None else next_now) - now
+        if skipped > 0:
+            self.skipped_timesteps += skipped
+            log(INFO, f"No selection possible before {self.clock.to_datetime(now + skipped)}, skipping "
+                      f"{skipped * TIMESTEP_IN_MIN} min ({skipped // retry_interval} selection attempts).")
+        return next_now
+
+    def _select_and_simulate(self, server_round: int, now: int) -> Optional[Tuple[SelectionPlan, np.ndarray, int]]:
+        """Selects the clients of a round starting at timestep `now` and simulates its execution.
+
+        Nothing is recorded, so this can run in the background, see `_start_next_selection`.
+
+        Returns:
+            None if no clients were selected. Otherwise, the selection, the batches computed by each selected client
+            and the round duration in timesteps.
+        """
         selection = self.selection_strategy.select(self.power_domain_api, self.client_load_api,
                                                    round_number=server_round, now=now)
         if selection is None:
-            log(INFO, f"fit_round {server_round} ({now}) no clients selected, cancel")
+            log(INFO, f"fit_round {server_round} ({self.clock.to_datetime(now)}) no clients selected, cancel")
             return None
-        
-        expected_duration = len(selection.columns)
-        participation, round_duration = execute_round(self.power_domain_api, self.client_load_api, selection,
-                                                      self.min_epochs, self.max_epochs)
+        participation, round_duration = simulate_round(self.power_domain_api, self.client_load_api, selection,
+                                                       self.min_epochs, self.max_epochs)
+        return selection, participation, round_duration
+
+    def _start_next_selection(self, server_round: int, now: int) -> None:
+        """Selects and simulates the next round in the background, if PIPELINED_ROUNDS is enabled.
+
+        Selection only depends on the participation and statistical utilities recorded so far, so it can run
+        while the current round is aggregated, evaluated and reported. The round's usage is only recorded once
+        `fit` takes it, a selection for a round after the last one is discarded.
+        """
+        if self._selection_worker is None or now >= self.end_timestep:
+            return
+        self._next_selection = self._selection_worker.submit(self._select_and_simulate, server_round, now)
+
+    def fit_round_ra(self, server_round: int, now: int, timeout: Optional[float],
+                     selected: Optional[Tuple[SelectionPlan, np.ndarray, int]] = None) -> \
+            Optional[Tuple[Optional[Parameters], Dict, FitResultsAndFailures, Dict[str, int], int]]:
+        """Perform a single round of federated averaging starting at timestep `now`.
+
+        Args:
+            selected: Result of `_select_and_simulate` if the round has already been selected and simulated.
+        """
+        now_dt = self.clock.to_datetime(now)
+        if selected is None:
+            selected = self._select_and_simulate(server_round, now)
+            if selected is None:
+                return None
+        selection, participation, round_duration = selected
+        expected_duration = selection.duration
+        participation = record_round(self.client_load_api, selection, participation)
         log(DEBUG,
-            f"Round {server_round} ({now}) training {int(round_duration.seconds / 60)} min ({expected_duration} min expected) "
+            f"Round {server_round} ({now_dt}) training {round_duration * TIMESTEP_IN_MIN} min "
+            f"({expected_duration * TIMESTEP_IN_MIN} min expected) "
             f"on {len(participation)} clients: {participation}")
 
         if len(participation) == 0:
-            log(INFO, f"fit_round {server_round} ({now}) no clients reached min epochs.")
+            log(INFO, f"fit_round {server_round} ({now_dt}) no clients reached min epochs.")
+            self._start_next_selection(server_round + 1, now + round_duration)
             return None, {}, None, participation, now + round_duration
 
         # Log the number of selected clients to TensorBoard
         selected_clients_count = len(participation)
-        tb_props = dict(global_step=server_round, walltime=now.timestamp())
+        tb_props = dict(global_step=server_round, walltime=now_dt.timestamp())
         self.writer.add_scalar("selected_clients_count", selected_clients_count, **tb_props)
 
         # Get clients and their respective instructions from strategy
@@ -254,7 +366,7 @@ class FedZeroServer(Server):
         )
         if failures:
             raise RuntimeError(
-                f"Round {server_round} ({now}) received {len(results)} results and {len(failures)} failures")
+                f"Round {server_round} ({now_dt}) received {len(results)} results and {len(failures)} failures")
 
         training_losses = {client_proxy.cid: result.metrics["local_loss"] for client_proxy, result in results}
         training_sample_size = {client_proxy.cid: result.metrics["number_samples"] for client_proxy, result in results}
@@ -325,6 +437,7 @@ class FedZeroServer(Server):
         for client in self.client_load_api.get_clients():
             if client.name in training_losses:
                 client.record_statistical_utility(server_round, statistical_utilities[client.name])
+        self._start_next_selection(server_round + 1, now + round_duration)
 
         # Aggregate training results
         aggregated_result: Tuple[
@@ -0,0 +1,115 @@
+"""Solves selection problems in worker processes, each with its own solver environment.
+
+`solve_round` solves all selection problems of one round duration so that `FedZeroSelectionStrategy` can evaluate
+several durations at once.
+
+Workers are started with the "spawn" method, so each one imports `fedzero.config` and creates its own
+`GUROBI_ENV` instead of sharing the parent's. Scripts using this module need an `if __name__ == "__main__":`
+guard.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fedzero.config import SELECTION_PROCESSES, BROWN_CLIENTS_BUDGET_PERCENTAGE, BROWN_CLIENTS_NUMBER_PERCENTAGE
+from fedzero.solvers import CombinedSelectionProblem, SelectionProblem, SelectionSolution, SolverSettings, \
+    SolveStats, get_solver, greedy_selection
+
+_POOLS: Dict[int, ProcessPoolExecutor] = {}
+
+
+def process_pool(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """Returns a pool of `processes` workers (defaults to `SELECTION_PROCESSES` or all cores), kept across calls."""
+    processes = processes or SELECTION_PROCESSES or os.cpu_count()
+    if processes not in _POOLS:
+        _POOLS[processes] = ProcessPoolExecutor(max_workers=processes,
+                                                mp_context=multiprocessing.get_context("spawn"))
+    return _POOLS[processes]
+
+
+@dataclass
+class RoundProblem:
+    """All selection problems of one round duration, solved as a whole by `solve_round`.
+
+    Attributes:
+        green: Green selection problem.
+        brown: Brown selection problem over all brown candidates, no brown clients are selected if None. Its
+            client number and energy budget are derived from the green solution.
+        brown_green_index: Position of each brown candidate in `green`, -1 if it is no green candidate.
+        brown_multiplicity: How often each brown candidate occurs in the candidate lists of
+            `FedZeroSelectionStrategy._select_for_duration`, which counts duplicates towards the minimum number of
+            brown clients.
+        combined: Green and brown selection as a single MIP over the clients of `green` and `brown`, the two
+            problems are solved one after another if None or if it hits the time limit without any solution.
+    """
+    green: SelectionProblem
+    brown: Optional[SelectionProblem] = None
+    brown_green_index: Optional[np.ndarray] = None
+    brown_multiplicity: Optional[np.ndarray] = None
+    combined: Optional[CombinedSelectionProblem] = None
+
+
+def solve_round(problem: RoundProblem,
+                solver: Optional[str] = None,
+                settings: Optional[SolverSettings] = None
+                ) -> Tuple[Optional[Tuple[SelectionSolution, Optional[SelectionSolution]]], List[SolveStats]]:
+    """Solves the green and, if given, the brown selection of a round duration, e.g. in a worker process.
+
+    Brown clients are selected among the brown candidates that have not been selected as green clients, under
+    a budget of `BROWN_CLIENTS_BUDGET_PERCENTAGE` times the planned green energy. If given, the combined problem
+    is solved instead.
+
+    Returns:
+        None if there is no solution, otherwise the green and brown solution (brown over all brown candidates).
+        Also returns the statistics of all solves.
+    """
+    stats = []
+    if problem.combined is not None:
+        solution, solve_stats = get_solver(solver).solve_selection_with_stats(problem.combined,
+                                                                              "Combined Selection Model", settings)
+        stats.append(solve_stats)
+        if solution is not None:
+            return problem.combined.split(solution), stats
+        if not (solve_stats.status == "TIME_LIMIT" and not solve_stats.has_solution):
+            return None, stats
+        print(f"Combined Selection Model: no solution within {settings.time_limit} s, "
+              f"selecting green and brown clients one after another.")
+    green = _solve_with_fallback(problem.green, "MIP Model", solver, settings, stats)
+    if green is None or problem.brown is None:
+        return (None if green is None else (green, None)), stats
+
+    in_green = problem.brown_green_index >= 0
+    candidates = np.flatnonzero(~in_green | ~green.selected[np.where(in_green, problem.brown_green_index, 0)])
+    if len(candidates) == 0:
+        return (green, None), stats
+    green_energy = green.allocation[green.selected].sum(axis=1) @ problem.green.energy_per_batch[green.selected]
+    budget = round(green_energy * BROWN_CLIENTS_BUDGET_PERCENTAGE)
+    min_clients = min(problem.brown_multiplicity[candidates].sum(),
+                      max(1, problem.green.n_clients * BROWN_CLIENTS_NUMBER_PERCENTAGE))
+    brown_problem = problem.brown.subset(candidates, n_clients=min_clients, energy_budget=budget)
+    brown = _solve_with_fallback(brown_problem, "Brown Client Selection Model", solver, settings, stats)
+    if brown is None or brown.selected.sum() < min_clients:
+        return None, stats
+
+    brown_energy = brown.allocation.sum(axis=1) @ brown_problem.energy_per_batch
+    if not (int(brown_energy) <= budget * 1.01):
+        raise RuntimeWarning(f"Brown Energy Limit Exceeded with {int(brown_energy)} of {budget * 1.01}")
+    allocation = np.zeros(problem.brown.capacity.shape)
+    allocation[candidates] = brown.allocation
+    selected = np.zeros(len(problem.brown.utility), dtype=bool)
+    selected[candidates] = brown.selected
+    return (green, SelectionSolution(allocation=allocation, selected=selected, objective=brown.objective)), stats
+
+
+def _solve_with_fallback(problem: SelectionProblem, name: str, solver: Optional[str],
+                         settings: Optional[SolverSettings], stats: List[SolveStats]) -> Optional[SelectionSolution]:
+    solution, solve_stats = get_solver(solver).solve_selection_with_stats(problem, name, settings)
+    stats.append(solve_stats)
+    if solve_stats.status == "TIME_LIMIT" and not solve_stats.has_solution:
+        print(f"{name}: no solution within {settings.time_limit} s, using the greedy heuristic.")
+        return greedy_selection(problem)
+    return solution
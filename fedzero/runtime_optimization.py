@@ -1,173 +1,203 @@
 import math
-from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 
-import gurobipy as grb
 import numpy as np
-import pandas as pd
 
-from fedzero.config import TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, MIN_LOCAL_EPOCHS, MAX_LOCAL_EPOCHS, GUROBI_ENV
-from fedzero.entities import PowerDomainApi, ClientLoadApi, Client
-
-EPSILON = 0.0001
+from fedzero.config import TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, MIN_LOCAL_EPOCHS, MAX_LOCAL_EPOCHS, \
+    ATTRIBUTION_ENGINE
+from fedzero.entities import PowerDomainApi, ClientLoadApi, Client, SelectionPlan
+from fedzero.solvers import AttributionProblem, attribution_tolerance, get_solver, water_filling
 
 
 def execute_round(power_domain_api: PowerDomainApi,
                   client_load_api: ClientLoadApi,
-                  selection: pd.DataFrame,
+                  selection: SelectionPlan,
                   min_epochs: float,
-                  max_epochs: float) -> Tuple[Dict[str, int], timedelta]:
-    """Simulates the execution of a training round."""
-    selection = _extend_selection_df(selection)
-    clients_in_round = len(selection.index)
-    time_iterator = [_execute_power_domain_round(power_domain_api, client_load_api, zone, p_selection, max_epochs)
-                     for zone, p_selection
-                     in selection.groupby(lambda c: c.zone)]
-
-    # We progress in all energy domains until <CLIENTS_PER_ROUND> clients have reached `min_epochs`
-    participation = {}
-    for p_timestep_results in zip(*time_iterator):
-        n_clients_above_min_epochs = 0
-        for p_participation, now in p_timestep_results:
-            for client, part in p_participation.items():
-                participation[client] = part
-                if participation[client] >= client.batches_per_epoch * min_epochs:
-                    n_clients_above_min_epochs += 1
-        if n_clients_above_min_epochs >= clients_in_round:
-            break
+                  max_epochs: float) -> Tuple[Dict[str, int], int]:
+    """Simulates the execution of a training round and records the clients' usage.
+
+    Returns:
+        The batches computed by each client that reached the minimum local epochs and the round duration in timesteps
+    """
+    participation, round_duration = simulate_round(power_domain_api, client_load_api, selection, min_epochs, max_epochs)
+    return record_round(client_load_api, selection, participation), round_duration
+
 
-    for client, client_participation in participation.items():
-        client.record_usage(client_participation)
-    round_duration = now - selection.columns[0]
+def simulate_round(power_domain_api: PowerDomainApi,
+                   client_load_api: ClientLoadApi,
+                   selection: SelectionPlan,
+                   min_epochs: float,
+                   max_epochs: float) -> Tuple[np.ndarray, int]:
+    """Simulates the execution of a training round without recording anything, see `record_round`.
 
+    Returns:
+        The whole batches computed by each client of `selection` and the round duration in timesteps
+    """
+    # Brown clients compute one batch per timestep after their planned allocation
+    selection = selection.resized(int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN) + 1, fill_value=1)
+    order = sorted(range(len(selection.clients)), key=lambda i: selection.clients[i].zone)  # grouped by power domain
+    clients = [selection.clients[i] for i in order]
+    sorted_participation, round_duration = _simulate_round(power_domain_api, client_load_api, clients,
+                                                           selection.timesteps, selection.client_index[order],
+                                                           selection.zone_ids[order], selection.is_brown[order],
+                                                           selection.batches[order].T, min_epochs, max_epochs)
+    participation = np.empty(len(order))
+    participation[order] = sorted_participation
+    return participation, round_duration
+
+
+def record_round(client_load_api: ClientLoadApi, selection: SelectionPlan, participation: np.ndarray) -> Dict[str, int]:
+    """Records the usage of a round simulated by `simulate_round` and flags the clients that computed on brown energy.
+
+    Returns:
+        The batches computed by each client that reached the minimum local epochs
+    """
+    client_load_api.catalog.record_usage(selection.client_index, participation)
     computed_batches = {}
-    for c, p in participation.items():
-        c: Client
+    for c, is_brown, p in zip(selection.clients, selection.is_brown, participation):
+        c.is_brown = bool(is_brown)
         minimum = c.batches_per_epoch * MIN_LOCAL_EPOCHS
         if math.floor(p) >= minimum:
             print(f"{c.name} - {'BROWN' if c.is_brown else 'GREEN'} computes {math.floor(p)} (above {minimum})")
             computed_batches[c.name] = math.floor(p)
         else:
             print(f"{c.name} - {'BROWN' if c.is_brown else 'GREEN'} computes {math.floor(p)} (BELOW {minimum})")
-
-    return computed_batches, round_duration
-
-
-def _execute_power_domain_round(power_domain_api: PowerDomainApi,
-                                client_load_api: ClientLoadApi,
-                                zone: str,
-                                selection: pd.DataFrame,
-                                max_epochs: float) -> Tuple[Dict[Client, int], datetime]:
-    """Simulates the execution of a training round within a power domain.
+    return computed_batches
+
+
+def _simulate_round(power_domain_api: PowerDomainApi,
+                    client_load_api: ClientLoadApi,
+                    clients: List[Client],
+                    timesteps: np.ndarray,
+                    client_index: np.ndarray,
+                    zone_index: np.ndarray,
+                    is_brown: np.ndarray,
+                    brown_batches: np.ndarray,
+                    min_epochs: float,
+                    max_epochs: float) -> Tuple[np.ndarray, int]:
+    """Simulates a training round in all power domains at once.
+
+    We progress until all clients have reached `min_epochs` or the round times out. Rounds also time out where the
+    actual data ends, e.g. if they start within the last MAX_ROUND_IN_MIN of the scenario. Timesteps in which no
+    client can compute (no excess capacity or energy, or all remaining clients finished) are skipped by
+    jumping straight to the next timestep at which some client makes progress.
+
+    Args:
+        client_index: Positions of the clients in the arrays of `client_load_api`.
+        zone_index: Positions of the clients' power domains in the arrays of `power_domain_api`.
+        is_brown: Whether each client computes on brown energy.
+        brown_batches: (timesteps × clients) batches that brown clients compute in each timestep.
 
     Returns:
-        Dict that maps clients to actually computed batches
+        The floored participation of each client and the number of timesteps the round took
     """
-    first_round = True
-    participation: Dict[Client, float] = {c: 0.0 for c in selection.index}
-    for now in selection.columns:
-        # yield aggregated participation after every completed time step
-        if not first_round:
-            yield {c: np.floor(p) for c, p in participation.items()}, now
+    n_steps = min(len(timesteps) - 1,
+                  client_load_api.actual_horizon(int(timesteps[0])),
+                  power_domain_api.actual_horizon(int(timesteps[0])))
+    zones, zone_ids = np.unique(zone_index, return_inverse=True)
+    zone_members = [np.flatnonzero(zone_ids == z) for z in range(len(zones))]
+    batches_per_epoch = np.array([c.batches_per_epoch for c in clients], dtype=float)
+    energy_per_batch = np.array([c.energy_per_batch for c in clients], dtype=float)
+
+    capacity = np.stack([client_load_api.actual_all(t)[client_index] for t in timesteps[:n_steps]])
+    energy = np.stack([power_domain_api.actual_all(t)[zones] for t in timesteps[:n_steps]])
+    client_energy = energy[:, zone_ids]  # (timesteps × clients) energy available in each client's power domain
+
+    participation = np.zeros(len(clients))
+    t = 0
+    while t < n_steps:
+        below_max = participation < batches_per_epoch * MAX_LOCAL_EPOCHS
+        # Minimum of how much the client can compute on excess capacity and until it reaches it max local epochs
+        max_batches = np.where(is_brown, brown_batches[t:n_steps],
+                               np.trunc(np.minimum(capacity[t:], batches_per_epoch * max_epochs - participation)))
+        progress = below_max & (max_batches > 0) & (is_brown | (client_energy[t:] > 0))
+        active_steps = np.flatnonzero(progress.any(axis=1))
+        if len(active_steps) == 0:  # nothing changes until the round times out
+            t = n_steps
+            break
+        t += int(active_steps[0])
+        max_batches = max_batches[active_steps[0]].copy()
+
+        for z in np.unique(zone_ids[progress[active_steps[0]]]):
+            members = zone_members[z]
+            _execute_power_domain_timestep(members[below_max[members]], members, participation, energy[t, z],
+                                           max_batches, batches_per_epoch, energy_per_batch, is_brown)
+        t += 1
+        if np.all(np.floor(participation) >= batches_per_epoch * min_epochs):
+            break
+    return np.floor(participation), t
 
-        clients_below_max = [c for c, p in participation.items() if p < c.batches_per_epoch * MAX_LOCAL_EPOCHS]
-        if len(clients_below_max) == 0:  # no more training
-            continue
 
-        # Minimum of how much the client can compute on excess capacity and until it reaches it max local epochs
-        max_batches: dict = {
-            c: int(min(client_load_api.actual(now, c.name), c.batches_per_epoch * max_epochs - participation[c])) 
-            for c in participation.keys() if (not c.is_brown)
-        }
-        # For brown clients, always compute the expected batches
-        max_batches.update(
-            {
-                c: selection[now][c] for c in participation.keys() if c.is_brown
-            }
-        )
-
-        participation = _execute_power_domain_timestep(clients=clients_below_max,
-                                                       participation=participation,
-                                                       available_energy=power_domain_api.actual(now, zone),
-                                                       max_batches=max_batches)
-        first_round = False
-
-
-def _execute_power_domain_timestep(clients: List[Client],
-                                   participation: Dict[Client, float],
+def _execute_power_domain_timestep(clients: np.ndarray,
+                                   members: np.ndarray,
+                                   participation: np.ndarray,
                                    available_energy: float,
-                                   max_batches: Dict[Client, int]) -> Dict[Client, float]:
-    """Simulates the execution of a training round for one timestep within a power domain."""
+                                   max_batches: np.ndarray,
+                                   batches_per_epoch: np.ndarray,
+                                   energy_per_batch: np.ndarray,
+                                   is_brown: np.ndarray) -> None:
+    """Simulates the execution of a training round for one timestep within a power domain.
+
+    Args:
+        clients: Positions of the clients below their max local epochs.
+        members: Positions of all clients in the power domain.
+    """
     if len(clients) == 1:
         c = clients[0]
-        if c.is_brown: 
+        if is_brown[c]:
             participation[c] += max_batches[c]
-        else: # For brown clients, always compute the expected batches
-            participation[c] += min(available_energy / c.energy_per_batch, max_batches[c])
+        else:  # For brown clients, always compute the expected batches
+            participation[c] += min(available_energy / energy_per_batch[c], max_batches[c])
     else:
         # First attribute energy to clients that haven't reached MIN_LOCAL_EPOCHS
-        participation1, remaining_energy = _attribute_power(MIN_LOCAL_EPOCHS, participation, available_energy, max_batches)
-        for c, p in participation1.items():
-            participation[c] += p
-            max_batches[c] -= p
+        batches, remaining_energy = _attribute_power(MIN_LOCAL_EPOCHS, participation[members], available_energy,
+                                                     max_batches[members], batches_per_epoch[members],
+                                                     energy_per_batch[members], is_brown[members])
+        participation[members] += batches
+        max_batches[members] -= batches
 
         # Attribute the remaining power by how much energy is still required to reach MAX_LOCAL_EPOCHS
         if remaining_energy > 0:
-            participation2, _ = _attribute_power(MAX_LOCAL_EPOCHS, participation, available_energy, max_batches)
-            for c, p in participation2.items():
-                participation[c] += p
+            batches, _ = _attribute_power(MAX_LOCAL_EPOCHS, participation[members], available_energy,
+                                          max_batches[members], batches_per_epoch[members],
+                                          energy_per_batch[members], is_brown[members])
+            participation[members] += batches
 
-    return participation
 
+def _attribute_power(required_epochs, participation, available_energy, max_batches, batches_per_epoch,
+                     energy_per_batch, is_brown) -> Tuple[np.ndarray, float]:
+    """Attributes power to all clients below <required_epochs>.
 
-def _attribute_power(required_epochs, participation, available_energy, max_batches):
-    """Attributes power to all clients below <required_epochs>."""
-    missing_batches = {c: c.batches_per_epoch * required_epochs - p for c, p in participation.items()}
-    clients: list[Client] = [c for c in participation.keys() if missing_batches[c] > 0]
+    Returns:
+        The batches attributed to each client and the remaining green energy
+    """
+    missing_batches = batches_per_epoch * required_epochs - participation
+    below = missing_batches > 0
+    green = ~is_brown[below]
     # Weight clients (exclude brown clients)
-    weighting = {c: missing_batches[c] * c.energy_per_batch for c in clients if (not c.is_brown)}
-
-    model = grb.Model(name="Runtime power attribution model", env=GUROBI_ENV)
+    weighting = np.where(green, missing_batches[below] * energy_per_batch[below], 0)
 
     # capping the available_energy to the max of possible usage allows us to use an equality constraint in (1)
     # Do not cap brown clients
-    _available_energy = min(available_energy, sum([max_batches[c] * c.energy_per_batch for c in clients if (not c.is_brown)]))
-
-    m = {c: model.addVar(lb=0, ub=max_batches[c]) for c in clients}
-    y = {c: model.addVar(vtype=grb.GRB.BINARY) for c in clients}
-    x = model.addVar(lb=0, ub=_available_energy/EPSILON)
-
-    # Limit green client energy usage to green energy budget
-    model.addConstr(grb.quicksum(m[c] * c.energy_per_batch for c in clients if (not c.is_brown)) <= _available_energy)
-    for c in [_client for _client in clients if (not _client.is_brown)]:
-        model.addGenConstrIndicator(y[c], False, m[c] == x * weighting[c])
-        model.addGenConstrIndicator(y[c], True, m[c] >= max_batches[c])
-        model.addGenConstrIndicator(y[c], True, x * weighting[c] >= max_batches[c])
-
-    # For brown clients, always compute the expected batches
-    for c in [_client for _client in clients if _client.is_brown]:
-        model.addConstr(y[c] == True)
-        model.addConstr(m[c] == max_batches[c])
-
-    model.ModelSense = grb.GRB.MAXIMIZE
-    model.setObjective(x)
-    model.optimize()
-
-    if model.Status == grb.GRB.OPTIMAL:
-        participation = {c: xc.X for c, xc in m.items()}
-        # Calculate remaining energy, but ignore brown client consumption
-        remaining_energy = available_energy - sum(p * c.energy_per_batch for c, p in participation.items() if (not c.is_brown))
-        return participation, 0 if np.isclose(remaining_energy, 0) else remaining_energy
-    elif model.Status == grb.GRB.INFEASIBLE:
-        raise RuntimeError("INFEASIBLE")
-    elif model.Status == grb.GRB.INF_OR_UNBD:
-        raise RuntimeError("INF_OR_UNBD")
+    _available_energy = min(available_energy, sum((max_batches[below] * energy_per_batch[below])[green].tolist()))
+
+    problem = AttributionProblem(
+        max_batches=max_batches[below],
+        weighting=weighting,
+        energy_per_batch=energy_per_batch[below],
+        is_brown=is_brown[below],
+        available_energy=_available_energy,
+    )
+    if ATTRIBUTION_ENGINE == "mip":
+        attributed = get_solver().attribute_power(problem)
     else:
-        raise Exception(model.Status)
-
-
-def _extend_selection_df(selection: pd.DataFrame):
-    start = selection.columns[0]
-    time = pd.date_range(start=start, end=start + timedelta(minutes=MAX_ROUND_IN_MIN),
-                         freq=f"{TIMESTEP_IN_MIN}min")
-    return selection.reindex(columns=time, fill_value=1)
+        attributed = water_filling(problem)
+        if ATTRIBUTION_ENGINE == "verify":
+            expected = get_solver().attribute_power(problem)
+            if not np.allclose(attributed, expected, rtol=0, atol=attribution_tolerance(problem)):
+                raise RuntimeError(f"Water-filling attribution {attributed} differs from MIP solution {expected}")
+    batches = np.zeros(len(participation))
+    batches[below] = attributed
+    # Calculate remaining energy, but ignore brown client consumption
+    remaining_energy = available_energy - sum((attributed * problem.energy_per_batch)[green].tolist())
+    return batches, 0 if np.isclose(remaining_energy, 0) else remaining_energy
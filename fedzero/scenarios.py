@@ -6,6 +6,7 @@ import pandas as pd
 from vessim.signal import HistoricalSignal
 
 from fedzero.config import TIMESTEP_IN_MIN, SOLAR_SIZE, MAX_TIME_IN_DAYS, BATCH_SIZE, DATA_SUBSET
+from fedzero import data_cache
 from fedzero.entities import Client, ClientLoadApi, PowerDomainApi
 
 _GLOBAL_START = pd.to_datetime("2022-06-08 00:00:00")
@@ -14,6 +15,9 @@ _GLOBAL_END = _GLOBAL_START + timedelta(days=MAX_TIME_IN_DAYS, minutes=-TIMESTEP
 _GERMANY_START = pd.to_datetime("2022-07-15 00:00:00")
 _GERMANY_END = _GERMANY_START + timedelta(days=MAX_TIME_IN_DAYS, minutes=-TIMESTEP_IN_MIN)
 
+_CLIENT_LOAD_USED_CSV = "data/client_load_gpu_used.csv"
+_CLIENT_LOAD_RESERVED_CSV = "data/client_load_gpu_reserved.csv"
+
 
 @dataclass
 class Scenario:
@@ -55,8 +59,12 @@ def get_scenario(solar_scenario: str,
 
     print("Load solar data...")
     dataset = f"solcast2022_{solar_scenario}"
-    power_domain_api = PowerDomainApi(
-        HistoricalSignal.from_dataset(dataset, params={"scale":SOLAR_SIZE, "use_forecast":(forecast_error != "no_error")}), unconstrained=unconstrained)
+    use_forecast = forecast_error != "no_error"
+    solar_signal = data_cache.load_solar_signal(dataset, start_date, end_date, use_forecast=use_forecast)
+    if solar_signal is None:
+        solar_signal = HistoricalSignal.from_dataset(dataset, params={"scale": 1.0, "use_forecast": use_forecast})
+    power_domain_api = PowerDomainApi(solar_signal, unconstrained=unconstrained, start=start_date, end=end_date,
+                                      scale=SOLAR_SIZE)
 
     print("Load client load data...")
     clients_time_series = _load_client_time_series_api(start_date, end_date, client_sizes, power_domain_api.zones, forecast_error,
@@ -89,25 +97,42 @@ def _load_client_time_series_api(start_date: datetime, end_date: datetime,
 
         clients.append(Client(name=client_names[i], zone=zone,
                               batches_per_timestep=client_sizes[client["size"]]["batches_per_timestep"] * capacity_factor,
-                              energy_per_batch=client_sizes[client["size"]]["energy_per_batch"]))
+                              energy_per_batch=client_sizes[client["size"]]["energy_per_batch"],
+                              size=client["size"], fairness_group=client["fairness_group"]))
 
     # Load actual data
     index = pd.date_range(start_date, end_date, freq=f"{TIMESTEP_IN_MIN}min")
-    client_load = pd.read_csv("data/client_load_gpu_used.csv", nrows=len(index)) / 100
-    client_load.set_index(index, inplace=True)
+    client_load = _read_client_load(_CLIENT_LOAD_USED_CSV, index) / 100
     client_load = client_load.set_axis(client_names, axis=1)
     
     # Load forecast data
     if forecast_error == "no_error":
         client_load_reserved = None
     else:
-        client_load_reserved = (pd.read_csv("data/client_load_gpu_reserved.csv", nrows=len(index)) / 100)
-        client_load_reserved.set_index(index, inplace=True)
+        client_load_reserved = _read_client_load(_CLIENT_LOAD_RESERVED_CSV, index) / 100
         client_load_reserved = client_load_reserved.set_axis(client_names, axis=1)
         if forecast_error == "error_no_load_fc":
             client_load_reserved[:] = 0
 
-    return ClientLoadApi(clients, HistoricalSignal(client_load, client_load_reserved, fill_method="bfill"), unconstrained=unconstrained)
+    return ClientLoadApi(clients, HistoricalSignal(client_load, client_load_reserved, fill_method="bfill"),
+                         unconstrained=unconstrained, start=start_date)
+
+
+def _read_client_load(csv_path: str, index: pd.DatetimeIndex) -> pd.DataFrame:
+    client_load = data_cache.load_client_load(csv_path, index)
+    if client_load is None:
+        client_load = pd.read_csv(csv_path, nrows=len(index))
+        client_load.set_index(index, inplace=True)
+    return client_load
+
+
+def convert_scenario_data(solar_scenario: str) -> None:
+    """Converts the solar and client load data used by a scenario to the binary cache `get_scenario` loads from."""
+    start_date, end_date = _load_start_end_date(solar_scenario)
+    data_cache.convert_solar_signal(f"solcast2022_{solar_scenario}", start_date, end_date)
+    index = pd.date_range(start_date, end_date, freq=f"{TIMESTEP_IN_MIN}min")
+    data_cache.convert_client_load(_CLIENT_LOAD_USED_CSV, index)
+    data_cache.convert_client_load(_CLIENT_LOAD_RESERVED_CSV, index)
 
 
 def _load_start_end_date(dataset: str):
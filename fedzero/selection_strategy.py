@@ -1,16 +1,25 @@
+import math
+import os
+import time
 from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Set
+from collections import Counter
+from typing import List, Optional, Dict, Set, Tuple
 from warnings import warn
 
 import gurobipy as grb
 import numpy as np
 import pandas as pd
 
-from fedzero.config import TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, GUROBI_ENV, MIN_LOCAL_EPOCHS
-from fedzero.config import ENABLE_BROWN_CLIENTS, TIME_WINDOW_LOWER_BOUND, TIME_WINDOW_UPPER_BOUND, BROWN_CLIENTS_BUDGET_PERCENTAGE, BROWN_CLIENTS_NUMBER_PERCENTAGE, BROWN_EXCLUSION_UPDATE
-from fedzero.entities import PowerDomainApi, ClientLoadApi, Client
+from fedzero.config import TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, GUROBI_ENV, MIN_LOCAL_EPOCHS, RECORD_SELECTION_PROBLEMS, \
+    CANDIDATE_PRUNING_FACTOR, PARALLEL_DURATIONS, SELECTION_WARM_START, PLANNING_ROUNDS, \
+    REPLANNING_TOLERANCE
+from fedzero.config import ENABLE_BROWN_CLIENTS, TIME_WINDOW_LOWER_BOUND, TIME_WINDOW_UPPER_BOUND, BROWN_CLIENTS_BUDGET_PERCENTAGE, BROWN_CLIENTS_NUMBER_PERCENTAGE, BROWN_EXCLUSION_UPDATE, COMBINED_BROWN_SELECTION
+from fedzero.entities import PowerDomainApi, ClientLoadApi, Client, SelectionPlan, SimulationClock, planning_horizon
 from fedzero.oort import OortSelector
+from fedzero.parallel import RoundProblem, process_pool, solve_round
+from fedzero.solvers import CombinedSelectionProblem, MultiRoundSelectionProblem, SelectionProblem, SelectionSolution, \
+    SolverSettings, SolveStats, SELECTION_SETTINGS, EPSILON, get_solver, greedy_selection, gurobi_stats, \
+    optimize_from_start
 from fedzero.utility import UtilityJudge
 
 
@@ -27,22 +36,39 @@ class SelectionStrategy(ABC):
 
     @abstractmethod
     def select(
-        self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, round_number: int, now: datetime
-    ) -> Optional[pd.DataFrame]:
+        self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, round_number: int, now: int
+    ) -> Optional[SelectionPlan]:
         """Selects the participating clients for a FL training round and decides on the duration.
 
         Args:
             power_domain_api: Power domain time series api.
             client_load_api: Client load time series api.
             round_number: Index of current round (used for warming up the utility judges)
-            now: Current fedzero time
+            now: Current fedzero timestep
 
         Returns:
-            None if no solution could be found. Otherwise, a DataFrame with the expected batches where
-            - rows determine the participating clients
-            - columns determine the time slot
+            None if no solution could be found. Otherwise, the plan with the expected batches of the participating
+            clients in each timestep of the round.
         """
 
+    def next_feasible_time(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, now: int,
+                           until: int, step: int = 1) -> Optional[int]:
+        """Returns the first of the timesteps `now`, `now + step`, ... up to `until` at which `select` may succeed.
+
+        `select` fails at all skipped timesteps, but may also fail at the returned one. By default, at least
+        `clients_per_round` clients need excess capacity and energy.
+
+        Returns:
+            None if `select` fails at all timesteps up to `until`.
+        """
+        for t in range(now, until + 1, step):
+            if self._may_select(power_domain_api, client_load_api, t):
+                return t
+        return None
+
+    def _may_select(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, now: int) -> bool:
+        return _available(power_domain_api, client_load_api, now).sum() >= self.clients_per_round
+
 
 class RandomSelectionStrategy(SelectionStrategy):
     def __init__(self,
@@ -59,7 +85,7 @@ class RandomSelectionStrategy(SelectionStrategy):
         return f"random{'_fc' if self.use_forecasts else ''}"
 
     def select(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi,
-               round_number: int, now: datetime, allow_brown_clients=False) -> Optional[pd.DataFrame]:
+               round_number: int, now: int, allow_brown_clients=False) -> Optional[SelectionPlan]:
         """Selects <CLIENTS_PER_ROUND> randomly if they have energy and capacity
         """
         clients = _filterby_current_capacity_and_energy(power_domain_api, client_load_api, now)
@@ -70,7 +96,9 @@ class RandomSelectionStrategy(SelectionStrategy):
             return None
 
         selected_clients = self.rng.choice(clients, self.clients_per_round, replace=False)
-        return pd.DataFrame(1, index=selected_clients, columns=[now + timedelta(minutes=TIMESTEP_IN_MIN)])
+        return SelectionPlan.from_clients(selected_clients, client_load_api, power_domain_api,
+                                          start=now + 1,
+                                          batches=np.ones((self.clients_per_round, 1)))
 
 
 class FedZeroSelectionStrategy(SelectionStrategy):
@@ -81,7 +109,17 @@ class FedZeroSelectionStrategy(SelectionStrategy):
                  exclusion_factor: float,
                  min_epochs: float,
                  max_epochs: float,
-                 seed: Optional[int] = None):
+                 seed: Optional[int] = None,
+                 linear_duration_search: bool = True,
+                 model_builder: Optional[str] = None,
+                 solver: Optional[str] = None,
+                 solver_settings: Optional[SolverSettings] = None,
+                 pruning_factor: Optional[float] = CANDIDATE_PRUNING_FACTOR,
+                 parallel_durations: Optional[int] = PARALLEL_DURATIONS,
+                 combined_brown_selection: bool = COMBINED_BROWN_SELECTION,
+                 warm_start: bool = SELECTION_WARM_START,
+                 planning_rounds: Optional[int] = PLANNING_ROUNDS,
+                 replanning_tolerance: float = REPLANNING_TOLERANCE):
         super().__init__(clients_per_round)
         self.utility_judge = utility_judge
         self.alpha = alpha
@@ -93,9 +131,51 @@ class FedZeroSelectionStrategy(SelectionStrategy):
 
         self.excluded_clients: Set[Client] = set()
         self.cycle_active_clients: Set[Client] = set()
-        self.cycle_start: Optional[datetime] = None
+        self.cycle_start: Optional[int] = None
         self.cycle_participation_mean = 0
 
+        # Try every round duration in order (with model_builder="per_variable", exactly reproduces old runs). Otherwise
+        # `_search_duration` probes durations in growing steps, which needs fewer but longer solves and took more
+        # solver time in benchmarks. Durations in the brown time window are always tried in order, unless brown
+        # clients are selected in a combined MIP.
+        self.linear_duration_search = linear_duration_search
+        self.solve_counts: Dict[int, int] = {}  # round number -> number of MIP solves
+        self.solve_stats: Dict[int, List[SolveStats]] = {}  # round number -> statistics of each MIP solve
+        self._solves = 0
+        self._stats: List[SolveStats] = []
+        self.solver = get_solver(solver)
+        self.solver_settings = SELECTION_SETTINGS if solver_settings is None else solver_settings
+        # "incremental" keeps one model per select() call and extends it for longer durations, "matrix" builds
+        # each model as SelectionProblem arrays for the solver backend and "per_variable" is FedZero's original
+        # model construction. Only "matrix" is supported by non-Gurobi backends.
+        if model_builder is None:
+            model_builder = "incremental" if str(self.solver) == "gurobi" and not parallel_durations else "matrix"
+        assert model_builder in ["incremental", "matrix", "per_variable"], f"Unknown model builder: {model_builder}"
+        if model_builder != "matrix" and str(self.solver) != "gurobi":
+            raise ValueError(f"Model builder '{model_builder}' requires the gurobi solver backend, got '{self.solver}'")
+        if parallel_durations and model_builder != "matrix":
+            raise ValueError(f"Parallel duration search requires the 'matrix' model builder, got '{model_builder}'")
+        self.model_builder = model_builder
+        # Number of round durations solved at once in worker processes, see `_search_durations_parallel`
+        self.parallel_durations = parallel_durations
+        # Brown clients are selected together with the green clients, see `_combined_selection`
+        self.combined_brown_selection = combined_brown_selection
+        # Green selection MIPs start from the previous round's green participants, see `_warm_start`
+        self.warm_start = warm_start
+        self._previous_participants: List[Client] = []
+        # Rounds are planned ahead in a single MIP, see `_plan_rounds` and `_next_planned_round`
+        self.planning_rounds = planning_rounds
+        self.replanning_tolerance = replanning_tolerance
+        self._planned_rounds: List[Tuple[int, pd.DataFrame]] = []  # (round number, solution) of upcoming rounds
+        self._planned_forecasts: Optional[Tuple[int, np.ndarray, np.ndarray]] = None  # (now, capacity, energy)
+        self._last_planned: Optional[pd.DataFrame] = None  # solution of the last round taken from a plan
+        self._green_model: Optional[IncrementalSelectionModel] = None
+        self._brown_model: Optional[IncrementalSelectionModel] = None
+        self._max_duration = int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN)
+        # Dominated candidates are dropped before building the green selection model, see `_prune_candidates`
+        self.pruning_factor = pruning_factor
+        self._kept_from: Optional[Dict[Client, int]] = None  # shortest duration from which on a candidate is kept
+
     @property
     def exclusion_factor(self):
         if ENABLE_BROWN_CLIENTS and BROWN_EXCLUSION_UPDATE \
@@ -114,22 +194,38 @@ class FedZeroSelectionStrategy(SelectionStrategy):
     def __repr__(self):
         return f"fedzero_a{self.alpha}_e{self.exclusion_factor}"
 
+    def _may_select(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, now: int) -> bool:
+        """Additionally requires the forecast filters of `select` to pass for some round duration.
+
+        Excluded clients are counted, as exclusion may change with every `select`.
+        """
+        available = _available(power_domain_api, client_load_api, now)
+        if available.sum() < self.clients_per_round:
+            return False
+        clients = client_load_api.get_clients()
+        feasibility = FeasibilityIndex(power_domain_api, client_load_api, now, int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN))
+        green_candidates = feasibility.feasible([c for c, ok in zip(clients, available) if ok], self.min_epochs)
+        brown_candidates = feasibility.feasible(_filterby_current_capacity(client_load_api, now, verbose=False),
+                                                self.min_epochs, with_energy=False)
+        return bool(((green_candidates.sum(axis=1) >= self.clients_per_round)
+                     & (brown_candidates.sum(axis=1) >= 1)).any())
+
     def select(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi,
-               round_number: int, now: datetime) -> Optional[pd.DataFrame]:
+               round_number: int, now: int) -> Optional[SelectionPlan]:
         TRANSITION_PERIOD_H = 12
         wallah = self.cycle_participation_mean
         if self.cycle_start is None:
             self.cycle_start = now
-        elif self.cycle_start + timedelta(hours=24) <= now:
+        elif self.cycle_start + SimulationClock.timesteps(hours=24) <= now:
             self.cycle_start = now
             self.cycle_participation_mean = np.mean([c.participated_rounds for c in self.cycle_active_clients])
             self.cycle_active_clients = set()
             print("############################################################")
             print(f"### NEW CYCLE! MEAN: {self.cycle_participation_mean} ###")
             print("############################################################")
-        elif self.cycle_start + timedelta(hours=24 - TRANSITION_PERIOD_H) <= now:
+        elif self.cycle_start + SimulationClock.timesteps(hours=24 - TRANSITION_PERIOD_H) <= now:
             current_mean = np.mean([c.participated_rounds for c in self.cycle_active_clients])
-            factor = (now - (self.cycle_start + timedelta(hours=24 - TRANSITION_PERIOD_H))).seconds / 3600 / TRANSITION_PERIOD_H
+            factor = (now - (self.cycle_start + SimulationClock.timesteps(hours=24 - TRANSITION_PERIOD_H))) * TIMESTEP_IN_MIN / 60 / TRANSITION_PERIOD_H
             wallah = self.cycle_participation_mean + (current_mean - self.cycle_participation_mean) * factor
             print(f"Cycle mean: {self.cycle_participation_mean:.2f}, Current mean: {current_mean:.2f} factor: {factor}, result: {wallah} ###")
 
@@ -143,96 +239,491 @@ class FedZeroSelectionStrategy(SelectionStrategy):
         # when alpha is set to true, the list of clients that are excluded is updated based on the clients
         # statistical utility and number of rounds they have participated in
         if self.alpha:
-            self._update_excluded_clients(clients, round_number, wallah)
+            self._update_excluded_clients(client_load_api, clients, round_number, wallah)
 
             # filter out clients that are in the excluded clients list
             clients = [client for client in clients if client not in self.excluded_clients]
 
+        planned = self._next_planned_round(power_domain_api, client_load_api, clients, round_number, now)
+        if planned is not None:
+            self.solve_counts[round_number] = self.solve_counts.get(round_number, 0)
+            self._previous_participants = list(planned.index)
+            return SelectionPlan.from_dataframe(planned, client_load_api, power_domain_api)
+
         utility = self.utility_judge.utility()
-        for d in range(1, int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN) + 1):
+        # Candidate sets for all round durations are derived from one pass over the forecasts
+        feasibility = FeasibilityIndex(power_domain_api, client_load_api, now, int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN))
+        green_candidates = feasibility.feasible(clients, self.min_epochs)
+        brown_candidates = feasibility.feasible(brown_clients, self.min_epochs, with_energy=False)
+
+        def candidates(d: int) -> Tuple[List[Client], List[Client]]:
             # Potential Green Clients
-            filtered_clients = _filterby_forecasted_capacity_and_energy(power_domain_api, client_load_api, clients, now, d, self.min_epochs)
+            filtered_clients = [c for c, ok in zip(clients, green_candidates[d - 1]) if ok]
             # Potential Brown Clients - possibly including potential green clients
-            filtered_brown_clients = _filterby_forecasted_capacity(client_load_api, brown_clients, now, d, self.min_epochs)
+            filtered_brown_clients = [c for c, ok in zip(brown_clients, brown_candidates[d - 1]) if ok]
+            return filtered_clients, filtered_brown_clients
+
+        def solve(d: int) -> Optional[Tuple[pd.DataFrame, Optional[pd.DataFrame]]]:
+            return self._select_for_duration(power_domain_api, client_load_api, *candidates(d), utility, d, now,
+                                             round_number)
+
+        def solve_batch(durations: List[int]) -> List[Optional[Tuple[pd.DataFrame, Optional[pd.DataFrame]]]]:
+            return self._select_for_durations(power_domain_api, client_load_api, [candidates(d) for d in durations],
+                                              utility, durations, now, round_number)
+
+        self._solves = 0
+        self._stats = []
+        self._planned_rounds, self._last_planned = [], None
+        # Models are only valid for the forecasts at `now`
+        self._green_model = self._brown_model = None
+        self._max_duration = feasibility.max_duration
+        self._kept_from = self._prune_candidates(feasibility, clients, green_candidates, utility)
+        # Durations at which enough clients pass the forecast filters
+        passes_filters = ((green_candidates.sum(axis=1) >= self.clients_per_round)
+                          & (brown_candidates.sum(axis=1) >= 1))
+        # Feasibility of the two-stage brown selection is not monotonic in the duration, see `_search_duration`
+        with_brown = ENABLE_BROWN_CLIENTS and TIME_WINDOW_LOWER_BOUND <= round_number <= TIME_WINDOW_UPPER_BOUND
+        linear = self.linear_duration_search or (with_brown and not self.combined_brown_selection)
+        if self.parallel_durations:
+            result = self._search_durations_parallel(solve_batch, passes_filters, linear)
+        elif linear:
+            result = self._scan_durations(solve, passes_filters)
+        else:
+            result = self._search_duration(solve, passes_filters)
+        if result is not None and result[1] is None and self.planning_rounds and self.planning_rounds > 1:
+            result = self._plan_rounds(power_domain_api, client_load_api, clients, utility, result[0], round_number,
+                                       now), None
+        self.solve_counts[round_number] = self.solve_counts.get(round_number, 0) + self._solves
+        self.solve_stats[round_number] = self.solve_stats.get(round_number, []) + self._stats
+        print(f"Selection in round {round_number} took {self._solves} solves "
+              f"({self.solve_counts[round_number]} in this round), "
+              f"{sum(s.runtime for s in self._stats):.2f} s in the solver.")
+        warm_starts = [s.warm_start for s in self._stats if s.warm_start is not None]
+        if warm_starts:
+            print(f"Warm start accepted in {sum(warm_starts)} of {len(warm_starts)} solves.")
+
+        if result is None:
+            return None  # if no solution found before max round duration
+        solution, brown_solution = result
+        self._previous_participants = list(solution.index)
+        plan = SelectionPlan.from_dataframe(solution, client_load_api, power_domain_api)
+        if brown_solution is not None:
+            # Merge green and brown solutions
+            plan = plan.concat(SelectionPlan.from_dataframe(brown_solution, client_load_api, power_domain_api,
+                                                            is_brown=True))
+        return plan
+
+    @staticmethod
+    def _scan_durations(solve, passes_filters: np.ndarray):
+        """Returns the solution for the smallest feasible duration by solving all durations that pass the forecast
+        filters in order."""
+        for d in np.flatnonzero(passes_filters) + 1:
+            result = solve(int(d))
+            if result is not None:
+                return result
+        return None
+
+    @staticmethod
+    def _search_duration(solve, passes_filters: np.ndarray):
+        """Returns the solution for the smallest feasible duration, assuming feasibility to be monotonic.
+
+        Since the forecast windows of longer durations contain those of shorter ones, any green selection feasible
+        for d is also feasible for d + 1. This does not hold if brown clients are selected after the green ones:
+        their budget is derived from the green optimum at d and their candidates change with d, so the caller scans
+        durations linearly instead.
+
+        Like `_search_durations_parallel`, the durations that pass the forecast filters are probed in growing steps
+        from the shortest one (lo, lo + 1, lo + 3, lo + 7, ...), as short rounds are both more likely and faster to
+        solve. Only the durations between the last infeasible and the first feasible probe are bisected. This takes
+        as many solves as `_scan_durations` if one of the two shortest durations is feasible and at most one more
+        for any other, but only about 2 * log2(n) instead of n solves if the n-th duration is the first feasible.
+        """
+        durations = np.flatnonzero(passes_filters) + 1
+        lo, probe = 0, 0  # positions in `durations`, all durations below lo are infeasible
+        while True:
+            if lo == len(durations):
+                return None
+            probe = min(probe, len(durations) - 1)
+            best = solve(int(durations[probe]))
+            if best is not None:
+                break
+            lo, probe = probe + 1, 2 * probe + 1
+        hi = probe  # feasible
+        while lo < hi:
+            mid = (lo + hi) // 2
+            result = solve(int(durations[mid]))
+            if result is None:
+                lo = mid + 1
+            else:
+                hi, best = mid, result
+        return best
 
-            if len(filtered_clients) < self.clients_per_round or len(filtered_brown_clients) < 1:
+    def _search_durations_parallel(self, solve_batch, passes_filters: np.ndarray, linear: bool):
+        """Returns the solution for the smallest feasible duration, solving `parallel_durations` durations at once.
+
+        If `linear`, consecutive durations that pass the forecast filters are solved batch by
+        batch. Otherwise, the search assumes feasibility to be monotonic like `_search_duration`: Until a feasible
+        duration is found, batches grow exponentially from the shortest duration not ruled out (lo, lo + 1,
+        lo + 3, lo + 7, ...), as short rounds are both more likely and faster to solve. Afterwards, each batch
+        spreads evenly over the remaining durations below the shortest feasible one.
+        """
+        if not passes_filters.any():
+            return None
+        if linear:
+            durations = np.flatnonzero(passes_filters) + 1
+            for start in range(0, len(durations), self.parallel_durations):
+                for result in solve_batch(durations[start:start + self.parallel_durations].tolist()):
+                    if result is not None:
+                        return result
+            return None
+
+        lo, hi, best = int(np.argmax(passes_filters)) + 1, len(passes_filters) + 1, None
+        # Invariant: infeasible below lo, feasible at hi (unless hi is beyond the longest duration)
+        while lo < hi:
+            if best is None:
+                durations = np.unique(np.minimum(lo + 2 ** np.arange(self.parallel_durations) - 1, hi - 1))
+            else:
+                n = min(self.parallel_durations, hi - lo)
+                durations = np.unique(np.linspace(lo, hi - 1, n).round().astype(int))
+            results = solve_batch(durations.tolist())
+            feasible = [i for i, result in enumerate(results) if result is not None]
+            if not feasible:
+                lo = int(durations[-1]) + 1
+                continue
+            i = feasible[0]
+            hi, best = int(durations[i]), results[i]
+            if i > 0:
+                lo = int(durations[i - 1]) + 1
+        return best
+
+    def _plan_rounds(self,
+                     power_domain_api: PowerDomainApi,
+                     client_load_api: ClientLoadApi,
+                     clients: List[Client],
+                     utility: Dict[Client, float],
+                     solution: pd.DataFrame,
+                     round_number: int,
+                     now: int) -> pd.DataFrame:
+        """Plans up to `planning_rounds` back-to-back rounds of the duration of `solution` in a single MIP.
+
+        Rounds are planned as far as the forecasts at `now` reach and, with brown clients enabled, not into the
+        brown time window. For fairness, each client is selected in at most as many rounds as if the participation
+        was spread evenly over all candidates. If the rounds cannot be planned, they are planned without this limit
+        and then with one round less.
+
+        Returns:
+            The solution of the first round, `solution` if no two rounds could be planned. The solutions of the
+            other rounds are kept for the next `select()` calls, see `_next_planned_round`.
+
+        Raises:
+            ValueError: If the time series stores do not keep forecasts for `planning_rounds` rounds of the longest
+                duration, see `ClientLoadApi(planning_rounds=...)` and `PowerDomainApi(planning_rounds=...)`.
+        """
+        stored = min(client_load_api.horizon_in_timesteps, power_domain_api.horizon_in_timesteps)
+        if stored < planning_horizon(self.planning_rounds):
+            raise ValueError(f"Planning {self.planning_rounds} rounds needs forecasts for "
+                             f"{planning_horizon(self.planning_rounds)} timesteps, but only {stored} are stored. "
+                             f"Pass planning_rounds={self.planning_rounds} to ClientLoadApi and PowerDomainApi.")
+        d = solution.shape[1]
+        horizon = min(client_load_api.forecast_horizon(now), power_domain_api.forecast_horizon(now))
+        n_rounds = min(self.planning_rounds, horizon // d)
+        if ENABLE_BROWN_CLIENTS and round_number < TIME_WINDOW_LOWER_BOUND:
+            n_rounds = min(n_rounds, TIME_WINDOW_LOWER_BOUND - round_number)
+        attempts = [(n, max_rounds) for n in range(n_rounds, 1, -1)
+                    for max_rounds in sorted({math.ceil(n * self.clients_per_round / len(clients)), n})]
+        for n, max_rounds in attempts:
+            problem = MultiRoundSelectionProblem.from_horizon(
+                self._selection_problem(client_load_api, clients, utility, n * d, now,
+                                        n_clients=self.clients_per_round, power_domain_api=power_domain_api),
+                n_rounds=n, max_rounds_per_client=max_rounds)
+            self._solves += 1
+            multi_round, stats = self.solver.solve_selection_with_stats(problem, "Multi-Round Selection Model",
+                                                                        self.solver_settings)
+            if self._no_incumbent(stats):
+                break
+            if multi_round is None:
                 continue
-            
-            # Find optimal selection of green clients
-            solution = self._optimal_selection(power_domain_api, client_load_api, filtered_clients, utility, d=d, now=now)
+            rounds = [_solution_df_from_arrays(s, clients, now + r * d)
+                      for r, s in enumerate(problem.split(multi_round))]
+            print(f"Planned rounds {round_number} to {round_number + n - 1} of {d * TIMESTEP_IN_MIN} min each.")
+            self._planned_rounds = [(round_number + r, rounds[r]) for r in range(1, n)]
+            self._planned_forecasts = (now, client_load_api.forecast_all(now, n * d),
+                                       power_domain_api.forecast_all(now, n * d))
+            self._last_planned = rounds[0]
+            return rounds[0]
+        return solution
+
+    def _next_planned_round(self,
+                            power_domain_api: PowerDomainApi,
+                            client_load_api: ClientLoadApi,
+                            clients: List[Client],
+                            round_number: int,
+                            now: int) -> Optional[pd.DataFrame]:
+        """Returns the solution planned for this round by `_plan_rounds`, shifted to start at `now`.
+
+        Rounds rarely end exactly as planned, so the next planned round starts earlier or later than planned. All
+        planned rounds are discarded, and None is returned, if
+        - the round number does not match the plan, e.g. because a selection in between has failed,
+        - a planned client is not available now or has been excluded,
+        - over the timesteps of the last round taken from the plan, the actual capacity of its clients or the
+          actual energy of their power domains deviated from the forecasts by more than `replanning_tolerance`, or
+        - more than `replanning_tolerance` of the planned batches or their energy exceed the forecasts at `now`.
+        """
+        if not self._planned_rounds:
+            return None
+        planned_round, solution = self._planned_rounds[0]
+        d = solution.shape[1]
+        solution = solution.copy()
+        solution.columns = pd.RangeIndex(now + 1, now + 1 + d)
+        reason = None
+        if planned_round != round_number:
+            reason = f"round {round_number} instead of {planned_round}"
+        elif not set(solution.index) <= set(clients):
+            reason = "planned clients are unavailable or excluded"
+        elif min(client_load_api.forecast_horizon(now), power_domain_api.forecast_horizon(now)) < d:
+            reason = "no forecasts for the whole round"
+        else:
+            deviation = self._forecast_deviation(power_domain_api, client_load_api, now)
+            excess = _forecast_excess(power_domain_api, client_load_api, solution, now)
+            if deviation > self.replanning_tolerance:
+                reason = f"actual capacity or energy deviated {deviation:.1%} from the forecasts"
+            elif excess > self.replanning_tolerance:
+                reason = f"{excess:.1%} of the planned batches or energy exceed the forecasts"
+        if reason is not None:
+            print(f"Discarding {len(self._planned_rounds)} planned rounds, {reason}.")
+            self._planned_rounds, self._last_planned = [], None
+            return None
+
+        print(f"Using the planned selection of round {round_number} ({deviation:.1%} deviation from the forecasts, "
+              f"{excess:.1%} of the plan exceeding them).")
+        self._planned_rounds.pop(0)
+        self._last_planned = solution
+        return solution
+
+    def _forecast_deviation(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, now: int) -> float:
+        """Returns the relative deviation of the actual from the planned capacity and energy of the last planned round.
+
+        Considers the capacity of the round's clients and the energy of their power domains, each summed over the
+        timesteps of the round up to `now`.
+        """
+        if self._last_planned is None:
+            return 0.0
+        planned_at, capacity, energy = self._planned_forecasts
+        timesteps = self._last_planned.columns.to_numpy()
+        timesteps = timesteps[(timesteps <= now) & (timesteps - planned_at - 1 < len(capacity))]
+        if len(timesteps) == 0:
+            return 0.0
+        rows = timesteps - planned_at - 1
+        client_index = client_load_api.column_index(list(self._last_planned.index))
+        zone_index = power_domain_api.zone_index(sorted(set(c.zone for c in self._last_planned.index)))
+        deviations = []
+        for forecast, actual in [(capacity[rows][:, client_index].sum(),
+                                  sum(client_load_api.actual_all(t)[client_index].sum() for t in timesteps)),
+                                 (energy[rows][:, zone_index].sum(),
+                                  sum(power_domain_api.actual_all(t)[zone_index].sum() for t in timesteps))]:
+            deviations.append(abs(actual - forecast) / forecast if forecast > 0 else 0.0)
+        return max(deviations)
+
+    def _select_for_durations(self,
+                              power_domain_api: PowerDomainApi,
+                              client_load_api: ClientLoadApi,
+                              candidates: List[Tuple[List[Client], List[Client]]],
+                              utility: Dict[Client, float],
+                              durations: List[int],
+                              now: int,
+                              round_number: int) -> List[Optional[Tuple[pd.DataFrame, Optional[pd.DataFrame]]]]:
+        """Solves the selection for several round durations at once in worker processes, see `parallel.solve_round`.
+
+        Args:
+            candidates: Green and brown candidates for each duration.
 
-            if solution is None: # Increase duration, if no solution with green clients has been found
+        Returns:
+            For each duration, the same as `_select_for_duration`
+        """
+        with_brown = ENABLE_BROWN_CLIENTS and TIME_WINDOW_LOWER_BOUND <= round_number <= TIME_WINDOW_UPPER_BOUND
+        pending = []
+        for d, (filtered_clients, filtered_brown_clients) in zip(durations, candidates):
+            if len(filtered_clients) < self.clients_per_round or len(filtered_brown_clients) < 1:
+                pending.append(None)
+                continue
+            green_clients = self._kept_candidates(filtered_clients, d)
+            problem = RoundProblem(self._selection_problem(client_load_api, green_clients, utility, d, now,
+                                                           n_clients=self.clients_per_round,
+                                                           power_domain_api=power_domain_api))
+            brown_clients = []
+            if with_brown:
+                # Green clients that are not selected are brown candidates as well
+                multiplicity = Counter(c for c in filtered_brown_clients + filtered_clients
+                                       if c not in self.excluded_clients)
+                brown_clients = list(multiplicity)
+                green_index = {c: i for i, c in enumerate(green_clients)}
+                problem.brown = self._selection_problem(client_load_api, brown_clients, utility, d, now, n_clients=1,
+                                                        exact_n_clients=False, min_batches_offset=1)
+                problem.brown_green_index = np.array([green_index.get(c, -1) for c in brown_clients], dtype=int)
+                problem.brown_multiplicity = np.array([multiplicity[c] for c in brown_clients], dtype=int)
+                if self.combined_brown_selection:
+                    problem.combined = self._combined_problem(power_domain_api, client_load_api, green_clients,
+                                                              brown_clients, utility, d, now)
+            future = process_pool().submit(solve_round, problem, str(self.solver), self.solver_settings)
+            pending.append((future, green_clients, brown_clients))
+
+        results = []
+        for item in pending:
+            if item is None:
+                results.append(None)
                 continue
+            future, green_clients, brown_clients = item
+            result, stats = future.result()
+            self._solves += len(stats)
+            self._stats += stats
+            if result is None:
+                results.append(None)
+                continue
+            green, brown = result
+            results.append((_solution_df_from_arrays(green, green_clients, now),
+                            None if brown is None else _solution_df_from_arrays(brown, brown_clients, now)))
+        return results
+
+    def _select_for_duration(self,
+                             power_domain_api: PowerDomainApi,
+                             client_load_api: ClientLoadApi,
+                             filtered_clients: List[Client],
+                             filtered_brown_clients: List[Client],
+                             utility: Dict[Client, float],
+                             d: int,
+                             now: int,
+                             round_number: int) -> Optional[Tuple[pd.DataFrame, Optional[pd.DataFrame]]]:
+        """Solves the selection for a fixed round duration.
+
+        Returns:
+            None if no solution could be found. Otherwise, the green and (if enabled) brown solution.
+        """
+        if len(filtered_clients) < self.clients_per_round or len(filtered_brown_clients) < 1:
+            return None
+
+        with_brown = ENABLE_BROWN_CLIENTS and TIME_WINDOW_LOWER_BOUND <= round_number <= TIME_WINDOW_UPPER_BOUND
+        if with_brown and self.combined_brown_selection:
+            solved, result = self._combined_selection(power_domain_api, client_load_api, filtered_clients,
+                                                      filtered_brown_clients, utility, d, now)
+            if solved:
+                return result
+
+        # Find optimal selection of green clients
+        solution = self._optimal_selection(power_domain_api, client_load_api, filtered_clients, utility, d=d, now=now)
 
-            # Add not selected green clients to possible brown clients
-            filtered_brown_clients.extend(
-                [_client for _client in filtered_clients if _client not in solution.index]
-            )
-
-            if ENABLE_BROWN_CLIENTS and TIME_WINDOW_LOWER_BOUND <= round_number <= TIME_WINDOW_UPPER_BOUND: # Check if in Timewindow and Brown Clients are enabled
-                # Sum up the expected number of batches for each client
-                batches = solution.sum(axis=1)
-                energy = pd.Series()
-
-                # Multiply number of batches with the energy used per batch
-                for index, item in batches.items():
-                    index: Client
-                    energy[index] = item * index.energy_per_batch
-
-                # Define brown energy budget
-                limit = round(energy.sum() * BROWN_CLIENTS_BUDGET_PERCENTAGE)
-
-                # Update filtered brown clients; remove excluded clients and clients in solution
-                filtered_brown_clients = [
-                                 _client for _client in filtered_brown_clients if
-                                 (_client not in self.excluded_clients)
-                                 and (_client not in solution.index)
-                                ]
-                
-                # Define minimum number of brown clients
-                # min of all brown clients or percentage of green clients per round
-                min_brown_clients = min(len(filtered_brown_clients), max(1, self.clients_per_round * BROWN_CLIENTS_NUMBER_PERCENTAGE))
-
-                # Find optimal selection of brown clients
-                brown_solution = self._brown_selection(client_load_api, list(set(filtered_brown_clients)), utility, d=d, l=limit, min_clients=min_brown_clients, now=now)
-
-                # If brown solution is not found, increase duration
-                if brown_solution is None or len(brown_solution.index) < min_brown_clients:
-                    continue
-
-                # Sum up the expected number of batches for each brown client
-                brown_batches = brown_solution.sum(axis=1)
-                brown_energy = pd.Series()
-
-                # Multiply number of batches with the energy used per batch
-                for index, item in brown_batches.items():
-                    index: Client
-                    index.is_brown = True
-                    brown_energy[index] = item * index.energy_per_batch
-                
-                # Check if brown energy limit has not been exceeded
-                brown_energy_sum = brown_energy.sum()
-                if not (int(brown_energy_sum) <= limit * 1.01):
-                    raise RuntimeWarning(f"Brown Energy Limit Exceeded with {int(brown_energy_sum)} of {limit * 1.01}")
-                
-                # Merge green and brown solutions
-                solution = pd.concat([solution, brown_solution])
-
-            if solution is not None:
-                return solution
-        return None  # if no solution found before max round durationself.round_prefer_duration
-
-    def _update_excluded_clients(self, clients: List[Client], round_number: int, wallah) -> None:
+        if solution is None: # Increase duration, if no solution with green clients has been found
+            return None
+
+        # Add not selected green clients to possible brown clients
+        filtered_brown_clients = filtered_brown_clients + [_client for _client in filtered_clients
+                                                           if _client not in solution.index]
+
+        if with_brown: # Check if in Timewindow and Brown Clients are enabled
+            # Define brown energy budget
+            limit = round(_planned_energy(client_load_api, solution) * BROWN_CLIENTS_BUDGET_PERCENTAGE)
+
+            # Update filtered brown clients; remove excluded clients and clients in solution
+            filtered_brown_clients = [
+                             _client for _client in filtered_brown_clients if
+                             (_client not in self.excluded_clients)
+                             and (_client not in solution.index)
+                            ]
+
+            # Define minimum number of brown clients
+            # min of all brown clients or percentage of green clients per round
+            min_brown_clients = min(len(filtered_brown_clients), max(1, self.clients_per_round * BROWN_CLIENTS_NUMBER_PERCENTAGE))
+
+            # Find optimal selection of brown clients
+            brown_solution = self._brown_selection(client_load_api, list(set(filtered_brown_clients)), utility, d=d, l=limit, min_clients=min_brown_clients, now=now)
+
+            # If brown solution is not found, increase duration
+            if brown_solution is None or len(brown_solution.index) < min_brown_clients:
+                return None
+
+            # Check if brown energy limit has not been exceeded
+            brown_energy_sum = _planned_energy(client_load_api, brown_solution)
+            if not (int(brown_energy_sum) <= limit * 1.01):
+                raise RuntimeWarning(f"Brown Energy Limit Exceeded with {int(brown_energy_sum)} of {limit * 1.01}")
+
+            return solution, brown_solution
+        return solution, None
+
+    def _combined_selection(self,
+                            power_domain_api: PowerDomainApi,
+                            client_load_api: ClientLoadApi,
+                            filtered_clients: List[Client],
+                            filtered_brown_clients: List[Client],
+                            utility: Dict[Client, float],
+                            d: int,
+                            now: int) -> Tuple[bool, Optional[Tuple[pd.DataFrame, Optional[pd.DataFrame]]]]:
+        """Selects green and brown clients in a single MIP, see `CombinedSelectionProblem`.
+
+        Returns:
+            Whether the MIP was solved (not if it hit the time limit without any solution, or if there are no brown
+            candidates) and the green and brown solution, None if infeasible.
+        """
+        # Green clients that are not selected are brown candidates as well
+        brown_clients = [c for c in dict.fromkeys(filtered_brown_clients + filtered_clients)
+                         if c not in self.excluded_clients]
+        if not brown_clients:
+            return False, None
+        green_clients = self._kept_candidates(filtered_clients, d)
+        problem = self._combined_problem(power_domain_api, client_load_api, green_clients, brown_clients, utility,
+                                         d, now)
+        self._solves += 1
+        solution, stats = self.solver.solve_selection_with_stats(problem, "Combined Selection Model",
+                                                                 self.solver_settings)
+        if self._no_incumbent(stats):
+            print(f"Combined Selection Model: no solution within {self.solver_settings.time_limit} s, "
+                  f"selecting green and brown clients one after another.")
+            return False, None
+        if solution is None:
+            return True, None
+        green, brown = problem.split(solution)
+        return True, (_solution_df_from_arrays(green, green_clients, now),
+                      _solution_df_from_arrays(brown, brown_clients, now))
+
+    def _combined_problem(self,
+                          power_domain_api: PowerDomainApi,
+                          client_load_api: ClientLoadApi,
+                          green_clients: List[Client],
+                          brown_clients: List[Client],
+                          utility: Dict[Client, float],
+                          d: int,
+                          now: int) -> CombinedSelectionProblem:
+        """Returns the selection problem of green and brown clients in a single MIP.
+
+        As in `_select_for_duration`, at least `clients_per_round · BROWN_CLIENTS_NUMBER_PERCENTAGE` brown
+        clients are selected, but no more than there are brown candidates besides the green clients.
+        """
+        green_index = {c: i for i, c in enumerate(green_clients)}
+        brown_green_index = np.array([green_index.get(c, -1) for c in brown_clients], dtype=int)
+        available = len(brown_clients) - min(self.clients_per_round, int((brown_green_index >= 0).sum()))
+        min_brown_clients = min(available, max(1, self.clients_per_round * BROWN_CLIENTS_NUMBER_PERCENTAGE))
+        return CombinedSelectionProblem(
+            green=self._selection_problem(client_load_api, green_clients, utility, d, now,
+                                          n_clients=self.clients_per_round, power_domain_api=power_domain_api),
+            brown=self._selection_problem(client_load_api, brown_clients, utility, d, now,
+                                          n_clients=min_brown_clients, exact_n_clients=False, min_batches_offset=1),
+            brown_green_index=brown_green_index,
+            budget_share=BROWN_CLIENTS_BUDGET_PERCENTAGE,
+        )
+
+    def _update_excluded_clients(self, client_load_api: ClientLoadApi, clients: List[Client], round_number: int,
+                                 wallah) -> None:
         self.current_round = round_number
-        participants = {client for client in clients if client.participated_in_last_round(round_number)}
-        if not participants:
+        positions = client_load_api.column_index(clients)
+        participated = client_load_api.catalog.participated_in_last_round(round_number)[positions]
+        if not participated.any():
             return
+        statistical_utilities = dict(zip(clients, client_load_api.catalog.statistical_utilities()[positions].tolist()))
+        participants = {client for client, p in zip(clients, participated) if p}
 
         print("--- FedZero Exclusion ------------------------")
-        utility_threshold = np.quantile([client.statistical_utility() for client in participants], self.exclusion_factor)
+        utility_threshold = np.quantile([statistical_utilities[client] for client in participants], self.exclusion_factor)
         print(f"| Excluding {int(len(participants) * self.exclusion_factor)} clients below statistical utility {utility_threshold:.12}.")
         for client in participants:
-            if client.statistical_utility() <= utility_threshold:
+            if statistical_utilities[client] <= utility_threshold:
                 if client in self.excluded_clients:
                     warn(f"Client {client} is already in excluded clients set!!!")
                 self.excluded_clients.add(client)
@@ -265,10 +756,48 @@ class FedZeroSelectionStrategy(SelectionStrategy):
                          d: int,
                          l: int,
                          min_clients: int,
-                         now: datetime):
+                         now: int):
+        self._solves += 1
+        if self.model_builder == "incremental":
+            if self._brown_model is None:
+                self._brown_model = IncrementalSelectionModel(
+                    "Brown Client Selection Model", client_load_api, now, utility, self.min_epochs, self.max_epochs,
+                    max_duration=self._max_duration, min_batches_offset=1, settings=self.solver_settings)
+            solution = self._brown_model.solve(clients, d, n_clients=min_clients, exact_n_clients=False, energy_budget=l)
+            if self._no_incumbent(self._brown_model.stats):
+                return self._greedy_fallback_df(client_load_api, clients, utility, d, now,
+                                                "Brown Client Selection Model", n_clients=min_clients,
+                                                exact_n_clients=False, min_batches_offset=1, energy_budget=l)
+            return solution
+        if self.model_builder == "matrix":
+            problem = self._selection_problem(client_load_api, clients, utility, d, now, n_clients=min_clients,
+                                              exact_n_clients=False, min_batches_offset=1, energy_budget=l)
+            return _solution_df_from_arrays(self._solve_selection(problem, "Brown Client Selection Model"),
+                                            clients, now)
+
+        model, m_alloc, b = self._build_brown_selection_model(client_load_api, clients, utility, d, l, min_clients, now)
+        self.solver_settings.apply(model)
+        model.optimize()
+
+        if self._no_incumbent(gurobi_stats(model, model.ModelName)):
+            return self._greedy_fallback_df(client_load_api, clients, utility, d, now,
+                                            "Brown Client Selection Model", n_clients=min_clients,
+                                            exact_n_clients=False, min_batches_offset=1, energy_budget=l)
+        if model.SolCount == 0:
+            return None
+        return _solution_df(m_alloc, b, d, now)
+
+    def _build_brown_selection_model(self,
+                                     client_load_api: ClientLoadApi,
+                                     clients: List[Client],
+                                     utility: Dict[Client, float],
+                                     d: int,
+                                     l: int,
+                                     min_clients: int,
+                                     now: int):
         model = grb.Model(name="Brown Client Selection Model", env=GUROBI_ENV)
 
-        m_alloc = {(c, t): model.addVar(lb=0, ub=client_load_api.forecast(now + timedelta(minutes=TIMESTEP_IN_MIN * t), duration_in_timesteps=1, client_name=c.name).iloc[0]) for c in clients for t in range(d)}
+        m_alloc = {(c, t): model.addVar(lb=0, ub=client_load_api.forecast(now + t, duration_in_timesteps=1, client_name=c.name).iloc[0]) for c in clients for t in range(d)}
         b = {c: model.addVar(vtype=grb.GRB.BINARY) for c in clients}
 
         # Limit all used energy to the brown energy budget (l)
@@ -286,18 +815,7 @@ class FedZeroSelectionStrategy(SelectionStrategy):
 
         model.ModelSense = grb.GRB.MAXIMIZE
         model.setObjective(_sum(b[c] * utility[c] * m_alloc[c, t] for c in clients for t in range(d)))
-        model.optimize()
-
-        if model.Status == grb.GRB.INFEASIBLE:
-            return None
-
-        df = pd.DataFrame([var.X for var in m_alloc.values()], index=pd.MultiIndex.from_tuples(m_alloc.keys()))
-        df = df.unstack(level=1)
-        selected_clients = pd.Series([var.X for var in b.values()], index=b.keys()).sort_index()
-        df = df[np.isclose(selected_clients, 1)]
-
-        df.columns = pd.date_range(start=now + pd.DateOffset(minutes=TIMESTEP_IN_MIN), periods=d, freq=f"{TIMESTEP_IN_MIN}min")
-        return df.sort_index()
+        return model, m_alloc, b
 
     def _optimal_selection(self,
                            power_domain_api: PowerDomainApi,
@@ -305,14 +823,114 @@ class FedZeroSelectionStrategy(SelectionStrategy):
                            clients: List[Client],
                            utility: Dict[Client, float],
                            d: int,
-                           now: datetime):
+                           now: int):
+        self._solves += 1
+        clients = self._kept_candidates(clients, d)
+        if self.model_builder == "incremental":
+            if self._green_model is None:
+                self._green_model = IncrementalSelectionModel(
+                    "MIP Model", client_load_api, now, utility, self.min_epochs, self.max_epochs,
+                    max_duration=self._max_duration, power_domain_api=power_domain_api,
+                    settings=self.solver_settings)
+            solution = self._green_model.solve(clients, d, n_clients=self.clients_per_round,
+                                               start=self._warm_start(clients, utility))
+            if self._no_incumbent(self._green_model.stats):
+                return self._greedy_fallback_df(client_load_api, clients, utility, d, now, "MIP Model",
+                                                n_clients=self.clients_per_round, power_domain_api=power_domain_api)
+            return solution
+        if self.model_builder == "matrix":
+            problem = self._selection_problem(client_load_api, clients, utility, d, now,
+                                              n_clients=self.clients_per_round, power_domain_api=power_domain_api)
+            return _solution_df_from_arrays(self._solve_selection(problem, "MIP Model"), clients, now)
+
+        model, m_alloc, b = self._build_optimal_selection_model(power_domain_api, client_load_api, clients, utility, d, now)
+        self.solver_settings.apply(model)
+        warm_start = optimize_from_start(model, [b[c] for c in clients], self._warm_start(clients, utility))
+
+        if self._no_incumbent(gurobi_stats(model, model.ModelName, warm_start=warm_start)):
+            return self._greedy_fallback_df(client_load_api, clients, utility, d, now, "MIP Model",
+                                            n_clients=self.clients_per_round, power_domain_api=power_domain_api)
+        if model.SolCount == 0:
+            return None
+        return _solution_df(m_alloc, b, d, now)
+
+    def _warm_start(self, clients: List[Client], utility: Dict[Client, float]) -> Optional[np.ndarray]:
+        """Returns which `clients` are selected in the MIP start of the green selection, None without warm start.
+
+        The start selects the previous round's green participants. Participants that are no candidates anymore
+        are replaced by the candidate with the highest utility in their zone, if any.
+        """
+        if not self.warm_start or not self._previous_participants:
+            return None
+        index = {c: i for i, c in enumerate(clients)}
+        start = np.zeros(len(clients), dtype=bool)
+        start[[index[c] for c in self._previous_participants if c in index]] = True
+        for participant in self._previous_participants:
+            if participant not in index:
+                replacements = [i for i, c in enumerate(clients) if c.zone == participant.zone and not start[i]]
+                if replacements:
+                    start[max(replacements, key=lambda i: utility[clients[i]])] = True
+        return start
+
+    def _prune_candidates(self, feasibility: "FeasibilityIndex", clients: List[Client], green_candidates: np.ndarray,
+                          utility: Dict[Client, float]) -> Optional[Dict[Client, int]]:
+        """Keeps the green candidates with the highest `utility × achievable batches` in each zone.
+
+        Achievable batches are the forecasted batches of a client with its zone's energy to itself within the
+        longest round, capped at `max_epochs`. As this score does not depend on the duration, the kept clients only
+        change where candidates are added for longer durations. For each duration, each zone keeps
+        `k = ceil(pruning_factor · clients_per_round / zones)` of its candidates. Zones with fewer candidates pass
+        their unused quota on to the others, so that at least `max(k · zones, clients_per_round)` candidates are
+        kept in total, if there are as many. A client kept for duration d is kept for all longer durations, so
+        pruning keeps a selection feasible for d feasible for d + 1 (see `_search_duration`).
+
+        Returns:
+            The shortest duration from which on each kept client is kept, None if pruning is disabled.
+        """
+        if self.pruning_factor is None:
+            return None
+        achievable = np.minimum(feasibility.batches(clients, feasibility.max_duration),
+                                [c.batches_per_epoch * self.max_epochs for c in clients])
+        score = np.array([utility[c] for c in clients]) * achievable
+        by_score = np.argsort(-score, kind="stable")
+        zones = np.array([c.zone for c in clients])
+        kept_from = {}
+        for d, candidates in enumerate(green_candidates, start=1):
+            members = [by_score[candidates[by_score] & (zones[by_score] == zone)] for zone in np.unique(zones)]
+            members = [m for m in members if len(m) > 0]
+            if not members:
+                continue
+            k = math.ceil(self.pruning_factor * self.clients_per_round / len(members))
+            n_keep = min(max(k * len(members), self.clients_per_round), int(candidates.sum()))
+            sizes = np.array([len(m) for m in members])
+            # Smallest number kept per zone that keeps n_keep clients in total when passing on unused quota
+            while np.minimum(sizes, k).sum() < n_keep:
+                k += 1
+            for m in members:
+                for i in m[:k]:
+                    kept_from.setdefault(clients[i], d)
+        return kept_from
+
+    def _kept_candidates(self, clients: List[Client], d: int) -> List[Client]:
+        """Returns the clients kept by `_prune_candidates` for duration `d`."""
+        if self._kept_from is None:
+            return clients
+        return [c for c in clients if self._kept_from.get(c, d + 1) <= d]
+
+    def _build_optimal_selection_model(self,
+                                       power_domain_api: PowerDomainApi,
+                                       client_load_api: ClientLoadApi,
+                                       clients: List[Client],
+                                       utility: Dict[Client, float],
+                                       d: int,
+                                       now: int):
         model = grb.Model(name="MIP Model", env=GUROBI_ENV)
 
         # defining the decision variables for a Gurobi optimization model, which will be used to allocate resources
         # to clients over time in an optimal way
         m_alloc = {(c, t): model.addVar(
             lb=0,  # lower bound
-            ub=client_load_api.forecast(now + timedelta(minutes=TIMESTEP_IN_MIN * t),  # upper bound
+            ub=client_load_api.forecast(now + t,  # upper bound
                                         duration_in_timesteps=1,
                                         client_name=c.name)
             .iloc[0]) for c in clients for t in range(d)}
@@ -344,18 +962,307 @@ class FedZeroSelectionStrategy(SelectionStrategy):
 
         model.ModelSense = grb.GRB.MAXIMIZE
         model.setObjective(_sum(b[c] * utility[c] * m_alloc[c, t] for c in clients for t in range(d)))
-        model.optimize()
+        return model, m_alloc, b
 
-        if model.Status == grb.GRB.INFEASIBLE:
-            return None
+    def _solve_selection(self, problem: SelectionProblem, name: str) -> Optional[SelectionSolution]:
+        solution, stats = self.solver.solve_selection_with_stats(problem, name, self.solver_settings)
+        if self._no_incumbent(stats):
+            return self._greedy_fallback(problem, name)
+        return solution
+
+    def _no_incumbent(self, stats: SolveStats) -> bool:
+        """Records the statistics of a solve and returns whether it hit the time limit without any solution."""
+        self._stats.append(stats)
+        return stats.status == "TIME_LIMIT" and not stats.has_solution
+
+    def _greedy_fallback(self, problem: SelectionProblem, name: str) -> Optional[SelectionSolution]:
+        print(f"{name}: no solution within {self.solver_settings.time_limit} s, using the greedy heuristic.")
+        return greedy_selection(problem)
+
+    def _greedy_fallback_df(self, client_load_api: ClientLoadApi, clients: List[Client], utility: Dict[Client, float],
+                            d: int, now: int, name: str, **kwargs) -> Optional[pd.DataFrame]:
+        problem = self._selection_problem(client_load_api, clients, utility, d, now, **kwargs)
+        return _solution_df_from_arrays(self._greedy_fallback(problem, name), clients, now)
+
+    def _selection_problem(self,
+                           client_load_api: ClientLoadApi,
+                           clients: List[Client],
+                           utility: Dict[Client, float],
+                           d: int,
+                           now: int,
+                           n_clients: int,
+                           exact_n_clients: bool = True,
+                           min_batches_offset: int = 0,
+                           power_domain_api: Optional[PowerDomainApi] = None,
+                           energy_budget: Optional[float] = None) -> SelectionProblem:
+        batches_per_epoch = np.array([c.batches_per_epoch for c in clients], dtype=float)
+        zones = sorted(set(c.zone for c in clients))
+        problem = SelectionProblem(
+            capacity=client_load_api.forecast_all(now, d)[:, client_load_api.column_index(clients)].T,
+            energy_per_batch=np.array([c.energy_per_batch for c in clients], dtype=float),
+            min_batches=batches_per_epoch * self.min_epochs + min_batches_offset,
+            max_batches=batches_per_epoch * self.max_epochs,
+            utility=np.array([utility[c] for c in clients], dtype=float),
+            n_clients=n_clients,
+            exact_n_clients=exact_n_clients,
+            energy_budget=energy_budget,
+        )
+        if power_domain_api is not None:
+            problem.start = self._warm_start(clients, utility)
+            problem.zone_ids = np.array([zones.index(c.zone) for c in clients], dtype=int)
+            problem.zone_energy = power_domain_api.forecast_all(now, d)[:, power_domain_api.zone_index(zones)].T
+        if RECORD_SELECTION_PROBLEMS is not None:
+            os.makedirs(RECORD_SELECTION_PROBLEMS, exist_ok=True)
+            problem.save(os.path.join(RECORD_SELECTION_PROBLEMS,
+                                      f"t{now}_{'green' if power_domain_api else 'brown'}_d{d}.npz"))
+        return problem
+
+
+class HeuristicSelectionStrategy(FedZeroSelectionStrategy):
+    """FedZero's selection that solves each selection problem with `greedy_selection` instead of the MIP.
+
+    Utility, exclusion, forecast filters and the duration search are the same as in FedZero.
+
+    Args:
+        report_gap: Additionally solve each problem as MIP and log the relative objective gap of the heuristic
+            at the selected round duration (the MIP might have found a shorter round).
+    """
+
+    def __init__(self,
+                 clients_per_round: int,
+                 utility_judge: UtilityJudge,
+                 alpha: float,
+                 exclusion_factor: float,
+                 min_epochs: float,
+                 max_epochs: float,
+                 seed: Optional[int] = None,
+                 solver: Optional[str] = None,
+                 report_gap: bool = False):
+        super().__init__(clients_per_round, utility_judge, alpha, exclusion_factor, min_epochs, max_epochs,
+                         seed=seed, model_builder="matrix", solver=solver, parallel_durations=None,
+                         combined_brown_selection=False, planning_rounds=None)
+        self.report_gap = report_gap
+        self.gaps: Dict[int, float] = {}  # round number -> relative objective gap of the green selection
+        self._gaps: Dict[Tuple[str, int], float] = {}  # (model name, duration) -> gap within the current select()
+
+    def __repr__(self):
+        return f"fedzero_greedy_a{self.alpha}_e{self.exclusion_factor}"
+
+    def select(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi,
+               round_number: int, now: int) -> Optional[SelectionPlan]:
+        self._gaps = {}
+        plan = super().select(power_domain_api, client_load_api, round_number, now)
+        if self.report_gap and plan is not None:
+            self.gaps[round_number] = self._gaps.get(("MIP Model", plan.duration), np.nan)
+            print(f"Heuristic selection in round {round_number} is {self.gaps[round_number]:.2%} below the optimum.")
+        return plan
+
+    def _solve_selection(self, problem: SelectionProblem, name: str) -> Optional[SelectionSolution]:
+        start = time.perf_counter()
+        solution = greedy_selection(problem)
+        if self.report_gap:
+            heuristic_runtime = time.perf_counter() - start
+            start = time.perf_counter()
+            optimal, stats = self.solver.solve_selection_with_stats(problem, name, self.solver_settings)
+            self._stats.append(stats)
+            if optimal is not None:
+                objective = 0 if solution is None else solution.objective
+                gap = (optimal.objective - objective) / abs(optimal.objective) if optimal.objective != 0 else 0
+                self._gaps[name, problem.capacity.shape[1]] = gap
+                print(f"{name} (d={problem.capacity.shape[1]}): heuristic {objective:.2f} in "
+                      f"{heuristic_runtime * 1000:.1f} ms, optimum {optimal.objective:.2f} in "
+                      f"{(time.perf_counter() - start) * 1000:.1f} ms")
+        return solution
+
+
+def _planned_energy(client_load_api: ClientLoadApi, solution: pd.DataFrame) -> float:
+    """Returns the energy of all batches planned in `solution`."""
+    energy_per_batch = client_load_api.catalog.energy_per_batch[client_load_api.column_index(list(solution.index))]
+    return float(solution.to_numpy().sum(axis=1) @ energy_per_batch)
+
+
+def _forecast_excess(power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, solution: pd.DataFrame,
+                     now: int) -> float:
+    """Returns the share of the planned batches that exceed the forecasted capacity at `now`.
+
+    If higher, returns the share of the planned energy that exceeds the forecasted energy of each power domain and
+    timestep instead.
+    """
+    clients = list(solution.index)
+    d = solution.shape[1]
+    allocation = solution.to_numpy()
+    capacity = client_load_api.forecast_all(now, d)[:, client_load_api.column_index(clients)].T
+    zones = sorted(set(c.zone for c in clients))
+    zone_of = np.array([zones.index(c.zone) for c in clients])
+    energy = client_load_api.catalog.energy_per_batch[client_load_api.column_index(clients)][:, None] * allocation
+    zone_energy = np.stack([energy[zone_of == z].sum(axis=0) for z in range(len(zones))])
+    available = power_domain_api.forecast_all(now, d)[:, power_domain_api.zone_index(zones)].T
+    return max(np.maximum(allocation - capacity, 0).sum() / max(allocation.sum(), EPSILON),
+               np.maximum(zone_energy - available, 0).sum() / max(zone_energy.sum(), EPSILON))
+
+
+def _solution_df_from_arrays(solution: Optional[SelectionSolution], clients: List[Client],
+                             now: int) -> Optional[pd.DataFrame]:
+    if solution is None:
+        return None
+    index = [c for c, s in zip(clients, solution.selected) if s]
+    df = pd.DataFrame(solution.allocation[solution.selected], index=index)
+    df.columns = pd.RangeIndex(now + 1, now + 1 + solution.allocation.shape[1])
+    return df.sort_index()
+
+
+def _solution_df(m_alloc: Dict, b: Dict, d: int, now: int) -> pd.DataFrame:
+    df = pd.DataFrame([var.X for var in m_alloc.values()], index=pd.MultiIndex.from_tuples(m_alloc.keys()))
+    df = df.unstack(level=1)
+    selected_clients = pd.Series([var.X for var in b.values()], index=b.keys()).sort_index()
+    df = df[np.isclose(selected_clients, 1)]
+
+    df.columns = pd.RangeIndex(now + 1, now + 1 + d)
+    return df.sort_index()
+
+
+class IncrementalSelectionModel:
+    """Selection MIP that is built once per `select()` call and reused across round durations.
+
+    Allocation variables are only added for clients and timesteps that have not been part of any previous
+    solve. Solving for a duration d then only fixes the allocations of later timesteps and of clients that
+    are no candidates at d to zero and starts from the previous solution. Each client's batches are collected
+    in an auxiliary variable, so extending the horizon only appends coefficients instead of replacing the
+    indicator constraints. Because a deselected client cannot compute any batches, the objective
+    `sum(b * utility * m_alloc)` is expressed linearly over these totals.
+
+    Args:
+        name: Name of the Gurobi model.
+        client_load_api: Client load time series api.
+        now: Current fedzero timestep
+        utility: Utility of each client.
+        min_epochs: Minimum epochs of selected clients.
+        max_epochs: Maximum epochs of selected clients.
+        max_duration: Maximum round duration in timesteps.
+        power_domain_api: If set, allocations are limited by the energy forecasts of each power domain.
+        min_batches_offset: Added to the minimum batches of selected clients.
+        settings: Limits of each solve.
+    """
+
+    def __init__(self,
+                 name: str,
+                 client_load_api: ClientLoadApi,
+                 now: int,
+                 utility: Dict[Client, float],
+                 min_epochs: float,
+                 max_epochs: float,
+                 max_duration: int,
+                 power_domain_api: Optional[PowerDomainApi] = None,
+                 min_batches_offset: int = 0,
+                 settings: SolverSettings = SELECTION_SETTINGS):
+        self.model = grb.Model(name=name, env=GUROBI_ENV)
+        self.model.ModelSense = grb.GRB.MAXIMIZE
+        settings.apply(self.model)
+        self.stats: Optional[SolveStats] = None  # of the last solve
+        self.client_load_api = client_load_api
+        self.now = now
+        self.utility = utility
+        self.min_epochs = min_epochs
+        self.max_epochs = max_epochs
+        self.min_batches_offset = min_batches_offset
+        self._capacity = client_load_api.forecast_all(now, max_duration)
+        self._zone_energy = None
+        if power_domain_api is not None:
+            self._zone_energy = power_domain_api.forecast_all(now, max_duration)
+            self._zone_index = {zone: i for zone, i in zip(power_domain_api.zones,
+                                                           power_domain_api.zone_index(power_domain_api.zones))}
+
+        self.duration = 0
+        self.clients: List[Client] = []
+        self.m_alloc: Dict = {}
+        self.b: Dict[Client, grb.Var] = {}
+        self._batches: Dict[Client, grb.Var] = {}
+        self._batches_constr: Dict[Client, grb.Constr] = {}
+        self._zone_constrs: Dict = {}
+        # Right-hand sides are set on each solve
+        self._cardinality = self.model.addConstr(grb.LinExpr() == 0)
+        self._budget = self.model.addConstr(grb.LinExpr() <= grb.GRB.INFINITY)
+        self._start = None
+
+    def solve(self, clients: List[Client], d: int, n_clients: int, exact_n_clients: bool = True,
+              energy_budget: Optional[float] = None, start: Optional[np.ndarray] = None) -> Optional[pd.DataFrame]:
+        """Selects `n_clients` (or at least `n_clients`) out of `clients` for a round of `d` timesteps.
 
-        df = pd.DataFrame([var.X for var in m_alloc.values()], index=pd.MultiIndex.from_tuples(m_alloc.keys()))
-        df = df.unstack(level=1)
-        selected_clients = pd.Series([var.X for var in b.values()], index=b.keys()).sort_index()
-        df = df[np.isclose(selected_clients, 1)]
+        Args:
+            start: Which `clients` are selected in a partial MIP start. Only used for the first solve, later
+                solves start from the last solution.
 
-        df.columns = pd.date_range(start=now + pd.DateOffset(minutes=TIMESTEP_IN_MIN), periods=d, freq=f"{TIMESTEP_IN_MIN}min")
-        return df.sort_index()
+        Returns:
+            None if no solution has been found. Otherwise, a DataFrame with the expected batches of the selected
+            clients.
+        """
+        for t in range(self.duration, d):
+            self._add_timestep(t)
+        candidates = set(clients)
+        for client in clients:
+            if client not in self.b:
+                self._add_client(client)
+
+        # Deactivate clients that are no candidates and all timesteps after d
+        is_candidate = np.array([c in candidates for c in self.clients])
+        ub = self._capacity[:self.duration, self.client_load_api.column_index(self.clients)].copy()
+        ub[d:] = 0
+        ub[:, ~is_candidate] = 0
+        self.model.setAttr("UB", list(self.b.values()), is_candidate.astype(float).tolist())
+        self.model.setAttr("UB", [self.m_alloc[c, t] for t in range(self.duration) for c in self.clients],
+                           ub.ravel().tolist())
+        self._cardinality.Sense = grb.GRB.EQUAL if exact_n_clients else grb.GRB.GREATER_EQUAL
+        self._cardinality.RHS = n_clients
+        self._budget.RHS = grb.GRB.INFINITY if energy_budget is None else energy_budget
+        if self._start is not None:
+            # Warm start from the last solution, new variables are left undefined
+            variables, values = self._start
+            self.model.setAttr("Start", variables, values)
+            start = None
+        warm_start = optimize_from_start(self.model, [self.b[c] for c in clients], start)
+        self.stats = gurobi_stats(self.model, self.model.ModelName, warm_start=warm_start)
+
+        if not self.stats.has_solution:
+            return None
+        variables = self.model.getVars()
+        self._start = (variables, self.model.getAttr("X", variables))
+
+        selected = [c for c in sorted(clients) if np.isclose(self.b[c].X, 1)]
+        df = pd.DataFrame([[self.m_alloc[c, t].X for t in range(d)] for c in selected], index=selected)
+        df.columns = pd.RangeIndex(self.now + 1, self.now + 1 + d)
+        return df
+
+    def _add_timestep(self, t: int):
+        for c in self.clients:
+            self._add_allocation(c, t)
+        self.duration = t + 1
+
+    def _add_client(self, client: Client):
+        self.clients.append(client)
+        self.b[client] = self.model.addVar(vtype=grb.GRB.BINARY)
+        self._batches[client] = self.model.addVar(lb=0, obj=self.utility[client])
+        self._batches_constr[client] = self.model.addConstr(self._batches[client] == 0)
+        self.model.chgCoeff(self._cardinality, self.b[client], 1)
+        for t in range(self.duration):
+            self._add_allocation(client, t)
+
+        min_batches = client.batches_per_epoch * self.min_epochs + self.min_batches_offset
+        max_batches = client.batches_per_epoch * self.max_epochs
+        self.model.addGenConstrIndicator(self.b[client], True, self._batches[client] >= min_batches)
+        self.model.addGenConstrIndicator(self.b[client], True, self._batches[client] <= max_batches)
+        self.model.addGenConstrIndicator(self.b[client], False, self._batches[client] <= 0)
+
+    def _add_allocation(self, client: Client, t: int):
+        m = self.model.addVar(lb=0, ub=0)
+        self.m_alloc[client, t] = m
+        self.model.chgCoeff(self._batches_constr[client], m, -1)
+        self.model.chgCoeff(self._budget, m, client.energy_per_batch)
+        if self._zone_energy is not None:
+            if (client.zone, t) in self._zone_constrs:
+                self.model.chgCoeff(self._zone_constrs[client.zone, t], m, client.energy_per_batch)
+            else:
+                self._zone_constrs[client.zone, t] = self.model.addConstr(
+                    m * client.energy_per_batch <= self._zone_energy[t, self._zone_index[client.zone]])
 
 
 class OortSelectionStrategy(SelectionStrategy):
@@ -368,7 +1275,7 @@ class OortSelectionStrategy(SelectionStrategy):
         return f"oort{'_fc' if self.use_forecasts else ''}"
 
     def select(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi,
-               round_number: int, now: datetime) -> Optional[pd.DataFrame]:
+               round_number: int, now: int) -> Optional[SelectionPlan]:
         # register clients
         if len(self.oort_selector.totalArms) == 0:
             for client in client_load_api.get_clients():
@@ -407,7 +1314,52 @@ class OortSelectionStrategy(SelectionStrategy):
                                                                       feasible_clients=[client.name for client in
                                                                                         clients])
         index = [c for c in client_load_api.get_clients() if c.name in selected_client_names]
-        return pd.DataFrame(1, index=index, columns=[now + timedelta(minutes=TIMESTEP_IN_MIN)])
+        return SelectionPlan.from_clients(index, client_load_api, power_domain_api,
+                                          start=now + 1,
+                                          batches=np.ones((len(index), 1)))
+
+
+class FeasibilityIndex:
+    """Prefix sums over the forecasted batches of all clients for round durations starting at `now`.
+
+    For each client, the batches it can compute in the next d timesteps are the cumulative sum over
+    `min(capacity, energy / energy_per_batch)` (or only capacity), so each lookup is O(1).
+
+    Args:
+        power_domain_api: Power domain time series api.
+        client_load_api: Client load time series api.
+        now: Current fedzero timestep
+        max_duration: Maximum round duration in timesteps, capped by the available forecasts.
+    """
+
+    def __init__(self, power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, now: int,
+                 max_duration: int):
+        self.client_load_api = client_load_api
+        self.max_duration = min(max_duration,
+                                client_load_api.forecast_horizon(now),
+                                power_domain_api.forecast_horizon(now))
+        clients = client_load_api.get_clients()
+        capacity = client_load_api.forecast_all(now, self.max_duration)
+        zone_energy = power_domain_api.forecast_all(now, self.max_duration)
+        ree_powered_batches = (zone_energy[:, power_domain_api.zone_index([c.zone for c in clients])]
+                               / np.array([c.energy_per_batch for c in clients]))
+        self._capacity = np.cumsum(capacity, axis=0)
+        self._capacity_and_energy = np.cumsum(np.minimum(capacity, ree_powered_batches), axis=0)
+
+    def max_batches(self, client: Client, d: int, with_energy: bool = True) -> float:
+        """Returns the forecasted amount of batches the client can compute in the next `d` timesteps."""
+        return self.batches([client], d, with_energy)[0]
+
+    def batches(self, clients: List[Client], d: int, with_energy: bool = True) -> np.ndarray:
+        """Returns the forecasted amount of batches each client can compute in the next `d` timesteps."""
+        cumulated = self._capacity_and_energy if with_energy else self._capacity
+        return cumulated[d - 1, self.client_load_api.column_index(clients)]
+
+    def feasible(self, clients: List[Client], min_epochs: float, with_energy: bool = True) -> np.ndarray:
+        """Returns a (max_duration × clients) mask of which clients can reach `min_epochs` within d timesteps."""
+        cumulated = self._capacity_and_energy if with_energy else self._capacity
+        required_batches = np.array([client.batches_per_epoch * min_epochs for client in clients])
+        return cumulated[:, self.client_load_api.column_index(clients)] >= required_batches
 
 
 def _estimate_duration_based_on_forecast(required_batches, fc):
@@ -416,58 +1368,45 @@ def _estimate_duration_based_on_forecast(required_batches, fc):
         remaining_batches -= batches_in_timestep
         if remaining_batches <= 0:
             return i + remaining_batches / required_batches
-    return required_batches / fc[0]
+    return required_batches / fc.iloc[0]
 
 def _filterby_current_capacity(client_load_api: ClientLoadApi,
-                                now: datetime) -> List[Client]:
-    clients = [client for client in client_load_api.get_clients() if
-               client_load_api.actual(now, client.name) > 0.0]
-    print(f"There are {len(clients)} potential brown clients available.")
+                                now: int,
+                                verbose: bool = True) -> List[Client]:
+    capacity = client_load_api.actual_all(now)
+    clients = [client for client, c in zip(client_load_api.get_clients(), capacity) if c > 0.0]
+    if verbose:
+        print(f"There are {len(clients)} potential brown clients available.")
     return clients
 
+
+def _available(power_domain_api: PowerDomainApi, client_load_api: ClientLoadApi, now: int) -> np.ndarray:
+    """Returns which clients of `client_load_api.get_clients()` have excess capacity and energy at `now`."""
+    zones = power_domain_api.zone_index([c.zone for c in client_load_api.get_clients()])
+    return (client_load_api.actual_all(now) > 0.0) & (power_domain_api.actual_all(now)[zones] > 0.0)
+
 def _filterby_current_capacity_and_energy(power_domain_api: PowerDomainApi,
                                           client_load_api: ClientLoadApi,
-                                          now: datetime) -> List[Client]:
-    zones_with_energy = [zone for zone in power_domain_api.zones if power_domain_api.actual(now, zone) > 0.0]
-    clients = [client for client in client_load_api.get_clients(zones_with_energy) if
-               client_load_api.actual(now, client.name) > 0.0]
+                                          now: int) -> List[Client]:
+    zones_with_energy = [zone for zone, e in zip(power_domain_api.zones, power_domain_api.actual_all(now)) if e > 0.0]
+    clients = client_load_api.get_clients(zones_with_energy)
+    capacity = client_load_api.actual_all(now)[client_load_api.column_index(clients)]
+    clients = [client for client, c in zip(clients, capacity) if c > 0.0]
     print(f"There are {len(clients)} clients available across {len(zones_with_energy)} power domains.")
     return clients
 
 
-def _filterby_forecasted_capacity(client_load_api: ClientLoadApi,
-                                clients: List[Client],
-                                now: datetime,
-                                d: int,
-                                min_epochs: float) -> List[Client]:
-    # # Fetch all clients without filtering by energy availability
-    # clients = [client for client in client_load_api.get_clients() if client_load_api.actual(now, client.name) > 0.0]
-    # print(f"There are {len(clients)} clients available based on current capacity.")
-    # return clients
-
-    filtered_clients: List[Client] = []
-    for client in clients:
-        possible_batches = client_load_api.forecast(now, duration_in_timesteps=d, client_name=client.name)
-        # Significantly faster than pandas
-        total_max_batches = possible_batches.values.sum()
-        if total_max_batches >= client.batches_per_epoch * min_epochs:
-            filtered_clients.append(client)
-    return filtered_clients
-
-
 def _filterby_forecasted_capacity_and_energy(power_domain_api: PowerDomainApi,
                                              client_load_api: ClientLoadApi,
                                              clients: List[Client],
-                                             now: datetime,
+                                             now: int,
                                              d: int,
                                              min_epochs: float) -> List[Client]:
-    filtered_clients: List[Client] = []
-    for client in clients:
-        possible_batches = client_load_api.forecast(now, duration_in_timesteps=d, client_name=client.name)
-        ree_powered_batches = power_domain_api.forecast(now, duration_in_timesteps=d,
-                                                        zone=client.zone) / client.energy_per_batch
-        # Significantly faster than pandas
-        total_max_batches = np.minimum(possible_batches.values, ree_powered_batches.values).sum()
-        if total_max_batches >= client.batches_per_epoch * min_epochs:
-            filtered_clients.append(client)
-    return filtered_clients
+    if not clients:
+        return []
+    possible_batches = client_load_api.forecast_all(now, d)[:, client_load_api.column_index(clients)]
+    zone_energy = power_domain_api.forecast_all(now, d)[:, power_domain_api.zone_index([c.zone for c in clients])]
+    ree_powered_batches = zone_energy / np.array([client.energy_per_batch for client in clients])
+    total_max_batches = np.minimum(possible_batches, ree_powered_batches).sum(axis=0)
+    required_batches = np.array([client.batches_per_epoch * min_epochs for client in clients])
+    return [client for client, ok in zip(clients, total_max_batches >= required_batches) if ok]
@@ -0,0 +1,709 @@
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict, replace
+from typing import Dict, List, Optional, Tuple
+
+import gurobipy as grb
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from fedzero.config import GUROBI_ENV, SOLVER_BACKEND, SELECTION_TIME_LIMIT_S, SELECTION_MIP_GAP, \
+    ATTRIBUTION_TIME_LIMIT_S, ATTRIBUTION_MIP_GAP, SOLVER_THREADS
+
+EPSILON = 0.0001
+
+
+@dataclass
+class SelectionProblem:
+    """Array form of the client selection MIP for a fixed round duration.
+
+    Attributes:
+        capacity: (clients × timesteps) upper bounds of the batch allocation.
+        energy_per_batch: Ws per batch of each client.
+        min_batches: Minimum batches of each client if selected.
+        max_batches: Maximum batches of each client if selected.
+        utility: Utility of each client.
+        n_clients: Number of clients to select.
+        exact_n_clients: Whether to select exactly or at least `n_clients`.
+        zone_ids: Zone of each client as index into `zone_energy`.
+        zone_energy: (zones × timesteps) available energy, allocations are not limited by zones if None.
+        energy_budget: Energy available to all clients over the whole round, not limited if None.
+        start: Clients selected in a partial MIP start, e.g. the previous round's selection. Only used by the
+            gurobi backend.
+    """
+    capacity: np.ndarray
+    energy_per_batch: np.ndarray
+    min_batches: np.ndarray
+    max_batches: np.ndarray
+    utility: np.ndarray
+    n_clients: int
+    exact_n_clients: bool = True
+    zone_ids: Optional[np.ndarray] = None
+    zone_energy: Optional[np.ndarray] = None
+    energy_budget: Optional[float] = None
+    start: Optional[np.ndarray] = None
+
+    def save(self, path: str) -> None:
+        """Stores the problem as .npz file, e.g. to benchmark solvers on recorded problems."""
+        np.savez_compressed(path, **{k: np.asarray(v) for k, v in asdict(self).items() if v is not None})
+
+    @classmethod
+    def load(cls, path: str) -> "SelectionProblem":
+        with np.load(path) as data:
+            kwargs = {k: data[k] for k in data.files}
+        kwargs["n_clients"] = int(kwargs["n_clients"])
+        kwargs["exact_n_clients"] = bool(kwargs["exact_n_clients"])
+        if "energy_budget" in kwargs:
+            kwargs["energy_budget"] = float(kwargs["energy_budget"])
+        return cls(**kwargs)
+
+    def subset(self, clients: np.ndarray, **changes) -> "SelectionProblem":
+        """Returns the problem restricted to the clients at positions `clients`, with `changes` to other fields."""
+        per_client = {k: getattr(self, k)[clients]
+                      for k in ["capacity", "energy_per_batch", "min_batches", "max_batches", "utility", "zone_ids",
+                                "start"]
+                      if getattr(self, k) is not None}
+        return replace(self, **{**per_client, **changes})
+
+    def constraints(self) -> List[Tuple[sp.csr_matrix, str, np.ndarray]]:
+        """Returns all constraints as (A, sense, rhs) over the flattened allocations followed by the binaries.
+
+        The allocations of all clients are one flattened (clients · timesteps) vector. The indicator constraints
+        on each client's batches are exact as linear rows, `min_batches · b <= sum(m_alloc) <= max_batches · b`.
+        """
+        n, d = self.capacity.shape
+        # Each client's batches: sum_t m_alloc[c, t]
+        client_rows = sp.kron(sp.identity(n, format="csr"), np.ones((1, d)), format="csr")
+        no_binaries = sp.csr_matrix((1, n))
+        constraints = [
+            (sp.hstack([client_rows, -sp.diags(self.min_batches)], format="csr"), ">", np.zeros(n)),
+            (sp.hstack([client_rows, -sp.diags(self.max_batches)], format="csr"), "<", np.zeros(n)),
+            (sp.hstack([sp.csr_matrix((1, n * d)), np.ones((1, n))], format="csr"),
+             "=" if self.exact_n_clients else ">", np.array([self.n_clients])),
+        ]
+        if self.zone_energy is not None:
+            # One row per zone and timestep: sum_{c in zone} energy_per_batch[c] * m_alloc[c, t]
+            n_zones = self.zone_energy.shape[0]
+            zone_rows = sp.csr_matrix((self.energy_per_batch, (self.zone_ids, np.arange(n))), shape=(n_zones, n))
+            constraints.append((sp.hstack([sp.kron(zone_rows, sp.identity(d)), sp.csr_matrix((n_zones * d, n))],
+                                          format="csr"), "<", self.zone_energy.ravel()))
+        if self.energy_budget is not None:
+            constraints.append((sp.hstack([np.repeat(self.energy_per_batch, d)[None, :], no_binaries], format="csr"),
+                                "<", np.array([self.energy_budget])))
+        return constraints
+
+    def objective(self) -> np.ndarray:
+        """Objective coefficients of the flattened allocations and binaries (to be maximized).
+
+        As deselected clients cannot compute, `sum(b * utility * m_alloc)` is linear in the allocations.
+        """
+        d = self.capacity.shape[1]
+        return np.concatenate([np.repeat(self.utility, d), np.zeros(len(self.utility))])
+
+
+@dataclass
+class SelectionSolution:
+    """Solution of a `SelectionProblem`: the (clients × timesteps) allocation and which clients are selected."""
+    allocation: np.ndarray
+    selected: np.ndarray
+    objective: float
+
+
+@dataclass
+class CombinedSelectionProblem:
+    """Green and brown client selection for a fixed round duration as a single MIP.
+
+    The variables are the allocations of `green` and `brown` followed by their binaries, so the solver backends
+    solve it like a `SelectionProblem` over the clients of both. Besides the constraints of both problems, each
+    client is selected at most once and brown clients use at most `budget_share` times the energy of the green
+    clients.
+
+    Attributes:
+        green: Green selection problem.
+        brown: Brown selection problem without energy budget, selecting at least `brown.n_clients` clients.
+        brown_green_index: Position of each brown candidate in `green`, -1 if it is no green candidate.
+        budget_share: Brown energy budget relative to the energy of the green clients.
+        brown_weight: Weight of the brown objective relative to the green objective. It is small so that, like
+            in the two-stage selection, the green objective takes precedence. Unlike there, green selections
+            that leave no feasible brown selection are avoided.
+    """
+    green: SelectionProblem
+    brown: SelectionProblem
+    brown_green_index: np.ndarray
+    budget_share: float
+    brown_weight: float = 0.01
+
+    @property
+    def capacity(self) -> np.ndarray:
+        return np.vstack([self.green.capacity, self.brown.capacity])
+
+    @property
+    def start(self) -> Optional[np.ndarray]:
+        if self.green.start is None:
+            return None
+        return np.concatenate([self.green.start, np.zeros(len(self.brown.utility), dtype=bool)])
+
+    def constraints(self) -> List[Tuple[sp.csr_matrix, str, np.ndarray]]:
+        n_green, d = self.green.capacity.shape
+        n_brown = self.brown.capacity.shape[0]
+
+        def embed(A: sp.csr_matrix, green: bool) -> sp.csr_matrix:
+            """Maps the columns of a constraint of `green` or `brown` to the combined variables."""
+            n = n_green if green else n_brown
+            allocation, binaries = A[:, :n * d], A[:, n * d:]
+            zeros = lambda width: sp.csr_matrix((A.shape[0], width))
+            if green:
+                return sp.hstack([allocation, zeros(n_brown * d), binaries, zeros(n_brown)], format="csr")
+            return sp.hstack([zeros(n_green * d), allocation, zeros(n_green), binaries], format="csr")
+
+        constraints = [(embed(A, True), sense, rhs) for A, sense, rhs in self.green.constraints()]
+        constraints += [(embed(A, False), sense, rhs) for A, sense, rhs in self.brown.constraints()]
+        # brown energy <= budget_share * green energy
+        budget_row = np.concatenate([-self.budget_share * np.repeat(self.green.energy_per_batch, d),
+                                     np.repeat(self.brown.energy_per_batch, d), np.zeros(n_green + n_brown)])
+        constraints.append((sp.csr_matrix(budget_row[None, :]), "<", np.zeros(1)))
+        # b_green + b_brown <= 1 for clients that are candidates of both
+        both = np.flatnonzero(self.brown_green_index >= 0)
+        if len(both):
+            rows = np.arange(len(both))
+            exclusive = sp.csr_matrix((np.ones(2 * len(both)),
+                                       (np.concatenate([rows, rows]),
+                                        np.concatenate([self.brown_green_index[both], n_green + both]))),
+                                      shape=(len(both), n_green + n_brown))
+            constraints.append((sp.hstack([sp.csr_matrix((len(both), (n_green + n_brown) * d)), exclusive],
+                                          format="csr"), "<", np.ones(len(both))))
+        return constraints
+
+    def objective(self) -> np.ndarray:
+        n_green, d = self.green.capacity.shape
+        green, brown = self.green.objective(), self.brown_weight * self.brown.objective()
+        return np.concatenate([green[:n_green * d], brown[:-len(self.brown.utility)],
+                               green[n_green * d:], brown[-len(self.brown.utility):]])
+
+    def split(self, solution: SelectionSolution) -> Tuple[SelectionSolution, SelectionSolution]:
+        """Returns the green and brown part of a solution."""
+        n_green = self.green.capacity.shape[0]
+        parts = []
+        for problem, clients in [(self.green, slice(None, n_green)), (self.brown, slice(n_green, None))]:
+            allocation = solution.allocation[clients]
+            parts.append(SelectionSolution(allocation=allocation, selected=solution.selected[clients],
+                                           objective=float((problem.utility[:, None] * allocation).sum())))
+        return parts[0], parts[1]
+
+
+@dataclass
+class MultiRoundSelectionProblem:
+    """Client selection for several consecutive rounds of the same duration as a single MIP.
+
+    The variables are the allocations of all rounds followed by the binaries of all rounds, so the solver backends
+    solve it like a `SelectionProblem` over one copy of the clients per round. Besides the constraints of each
+    round, each client is selected in at most `max_rounds_per_client` rounds.
+
+    Attributes:
+        rounds: Selection problem of each round, all over the same clients and timesteps per round.
+        max_rounds_per_client: How often each client may be selected within all rounds.
+    """
+    rounds: List[SelectionProblem]
+    max_rounds_per_client: int
+
+    @classmethod
+    def from_horizon(cls, problem: SelectionProblem, n_rounds: int,
+                     max_rounds_per_client: int) -> "MultiRoundSelectionProblem":
+        """Splits a problem over `n_rounds · d` timesteps into `n_rounds` rounds of d timesteps.
+
+        Energy budgets apply to each round, only the first round keeps the MIP start.
+        """
+        d = problem.capacity.shape[1] // n_rounds
+        rounds = []
+        for r in range(n_rounds):
+            window = slice(r * d, (r + 1) * d)
+            rounds.append(replace(problem, capacity=problem.capacity[:, window],
+                                  zone_energy=None if problem.zone_energy is None else problem.zone_energy[:, window],
+                                  start=problem.start if r == 0 else None))
+        return cls(rounds=rounds, max_rounds_per_client=max_rounds_per_client)
+
+    @property
+    def capacity(self) -> np.ndarray:
+        return np.vstack([problem.capacity for problem in self.rounds])
+
+    @property
+    def start(self) -> Optional[np.ndarray]:
+        if all(problem.start is None for problem in self.rounds):
+            return None
+        return np.concatenate([np.zeros(len(problem.utility), dtype=bool) if problem.start is None else problem.start
+                               for problem in self.rounds])
+
+    def constraints(self) -> List[Tuple[sp.csr_matrix, str, np.ndarray]]:
+        n, d = self.rounds[0].capacity.shape
+        n_rounds = len(self.rounds)
+
+        def embed(A: sp.csr_matrix, r: int) -> sp.csr_matrix:
+            """Maps the columns of a constraint of round r to the variables of all rounds."""
+            allocation, binaries = A[:, :n * d], A[:, n * d:]
+            blocks = [sp.csr_matrix((A.shape[0], r * n * d)), allocation,
+                      sp.csr_matrix((A.shape[0], (n_rounds - r - 1) * n * d)),
+                      sp.csr_matrix((A.shape[0], r * n)), binaries, sp.csr_matrix((A.shape[0], (n_rounds - r - 1) * n))]
+            return sp.hstack([block for block in blocks if block.shape[1] > 0], format="csr")
+
+        constraints = [(embed(A, r), sense, rhs)
+                       for r, problem in enumerate(self.rounds) for A, sense, rhs in problem.constraints()]
+        # sum_r b[r, c] <= max_rounds_per_client
+        participation = sp.hstack([sp.identity(n, format="csr")] * n_rounds, format="csr")
+        constraints.append((sp.hstack([sp.csr_matrix((n, n_rounds * n * d)), participation], format="csr"),
+                            "<", np.full(n, self.max_rounds_per_client)))
+        return constraints
+
+    def objective(self) -> np.ndarray:
+        n, d = self.rounds[0].capacity.shape
+        objectives = [problem.objective() for problem in self.rounds]
+        return np.concatenate([c[:n * d] for c in objectives] + [c[n * d:] for c in objectives])
+
+    def split(self, solution: SelectionSolution) -> List[SelectionSolution]:
+        """Returns the part of a solution for each round."""
+        n = len(self.rounds[0].utility)
+        parts = []
+        for r, problem in enumerate(self.rounds):
+            allocation = solution.allocation[r * n:(r + 1) * n]
+            parts.append(SelectionSolution(allocation=allocation, selected=solution.selected[r * n:(r + 1) * n],
+                                           objective=float((problem.utility[:, None] * allocation).sum())))
+        return parts
+
+
+@dataclass
+class SolverSettings:
+    """Limits of a single solve, solver defaults if None."""
+    time_limit: Optional[float] = None  # seconds
+    mip_gap: Optional[float] = None  # relative
+    threads: Optional[int] = None
+
+    def apply(self, model: grb.Model) -> None:
+        """Sets the limits as parameters of a Gurobi model."""
+        if self.time_limit is not None:
+            model.Params.TimeLimit = self.time_limit
+        if self.mip_gap is not None:
+            model.Params.MIPGap = self.mip_gap
+        if self.threads is not None:
+            model.Params.Threads = self.threads
+
+
+SELECTION_SETTINGS = SolverSettings(SELECTION_TIME_LIMIT_S, SELECTION_MIP_GAP, SOLVER_THREADS)
+ATTRIBUTION_SETTINGS = SolverSettings(ATTRIBUTION_TIME_LIMIT_S, ATTRIBUTION_MIP_GAP, SOLVER_THREADS)
+
+
+@dataclass
+class SolveStats:
+    """Statistics of a single solve.
+
+    Attributes:
+        status: "OPTIMAL", "TIME_LIMIT" (with or without solution), "INFEASIBLE" or the solver's status.
+        has_solution: Whether a (possibly suboptimal) solution has been found.
+        runtime: Seconds spent in the solver.
+        node_count: Explored branch-and-bound nodes.
+        mip_gap: Relative gap of the returned solution, inf without solution.
+        warm_start: Whether the given MIP start was accepted, None if there was none.
+    """
+    name: str
+    status: str
+    has_solution: bool
+    runtime: float
+    node_count: float
+    mip_gap: float
+    n_vars: int
+    n_constrs: int
+    warm_start: Optional[bool] = None
+
+
+_GUROBI_STATUS = {grb.GRB.OPTIMAL: "OPTIMAL", grb.GRB.TIME_LIMIT: "TIME_LIMIT", grb.GRB.INFEASIBLE: "INFEASIBLE",
+                  grb.GRB.INF_OR_UNBD: "INFEASIBLE"}
+
+
+def gurobi_stats(model: grb.Model, name: str, warm_start: Optional[bool] = None) -> SolveStats:
+    """Returns the statistics of the last `optimize()` of a Gurobi model."""
+    has_solution = model.SolCount > 0
+    return SolveStats(name=name,
+                      status=_GUROBI_STATUS.get(model.Status, str(model.Status)),
+                      has_solution=has_solution,
+                      runtime=model.Runtime,
+                      node_count=model.NodeCount,
+                      mip_gap=model.MIPGap if has_solution and model.IsMIP else (0.0 if has_solution else np.inf),
+                      n_vars=model.NumVars,
+                      n_constrs=model.NumConstrs + model.NumGenConstrs,
+                      warm_start=warm_start)
+
+
+def optimize_from_start(model: grb.Model, b, start: Optional[np.ndarray]) -> Optional[bool]:
+    """Optimizes a selection model from a partial MIP start in which the clients `start` are selected.
+
+    All other variables are left undefined for Gurobi to complete the start.
+
+    Args:
+        b: Binary selection variables of the clients (list or MVar).
+        start: Whether each client is selected in the start, the model is optimized without start if None or if
+            no client is selected in it.
+
+    Returns:
+        Whether the start was accepted, i.e. the first incumbent selects all clients of the start. None without start.
+    """
+    if start is None or not start.any():
+        model.optimize()
+        return None
+    variables = b.tolist() if isinstance(b, grb.MVar) else list(b)
+    model.setAttr("Start", variables, np.where(start, 1.0, grb.GRB.UNDEFINED).tolist())
+    first_incumbent = []
+
+    def callback(m: grb.Model, where: int):
+        if where == grb.GRB.Callback.MIPSOL and not first_incumbent:
+            first_incumbent.append(np.array(m.cbGetSolution(variables)) > 0.5)
+
+    model.optimize(callback)
+    return bool(first_incumbent) and bool(first_incumbent[0][start].all())
+
+
+@dataclass
+class AttributionProblem:
+    """Array form of the runtime power attribution within a power domain for one timestep.
+
+    Each green client `c` computes `min(max_batches[c], x * weighting[c])` batches for the largest common `x`
+    within `available_energy`. Brown clients always compute their `max_batches`.
+    """
+    max_batches: np.ndarray
+    weighting: np.ndarray
+    energy_per_batch: np.ndarray
+    is_brown: np.ndarray
+    available_energy: float
+
+
+def water_filling(problem: AttributionProblem) -> np.ndarray:
+    """Solves the runtime power attribution in closed form instead of as MIP.
+
+    The batches of green clients `min(max_batches, x * weighting)` are piecewise linear in `x`, with breakpoints
+    where clients reach their `max_batches`. After sorting the breakpoints, the largest `x` within the energy
+    budget lies on the first segment whose end exceeds the budget, which is found with cumulative sums.
+
+    Returns:
+        The batches attributed to each client, identical to the solution of `SolverBackend.attribute_power`.
+    """
+    ub = problem.max_batches
+    if np.any(ub < 0):
+        raise RuntimeError("INFEASIBLE")
+    batches = ub.astype(float)  # For brown clients, always compute the expected batches
+    green = np.flatnonzero(~problem.is_brown)
+    if len(green) == 0:
+        return batches
+
+    w = problem.weighting[green]
+    energy = problem.energy_per_batch[green]
+    breakpoints = ub[green] / w
+    order = np.argsort(breakpoints)
+    breakpoints, w, energy, green_ub = breakpoints[order], w[order], energy[order], ub[green][order]
+
+    # Energy used at each breakpoint: clients up to it compute their max_batches, all others `x * weighting`
+    saturated_energy = np.concatenate([[0], np.cumsum(green_ub * energy)])
+    slope = np.concatenate([np.cumsum((w * energy)[::-1])[::-1], [0]])
+    energy_at_breakpoints = saturated_energy[1:] + breakpoints * slope[1:]
+    k = np.searchsorted(energy_at_breakpoints, problem.available_energy, side="right")
+    if k == len(breakpoints):
+        x = breakpoints[-1]
+    else:
+        x = (problem.available_energy - saturated_energy[k]) / slope[k]
+    x = min(max(x, 0), problem.available_energy / EPSILON)
+
+    batches[green] = np.minimum(ub[green], x * problem.weighting[green])
+    return batches
+
+
+def attribution_tolerance(problem: AttributionProblem) -> float:
+    """Returns the absolute tolerance up to which the MIP solutions of `attribute_power` match `water_filling`.
+
+    The MIPs keep `m == x * weighting` only up to the solvers' feasibility and integrality tolerances (1e-6), which
+    scale with the weighting.
+    """
+    return 1e-4 + 1e-6 * float(np.max(problem.weighting, initial=0))
+
+
+def greedy_selection(problem: SelectionProblem) -> Optional[SelectionSolution]:
+    """Solves the selection problem heuristically instead of as MIP.
+
+    Clients are selected one at a time by the objective they could reach on their own with the remaining
+    capacity, zone energy and energy budget, as long as their `min_batches` still fit. The minimum batches are
+    allocated at the timesteps with the most remaining energy in the client's zone. Afterwards, selected
+    clients are topped up to their `max_batches` by descending utility per Ws. If at least `n_clients` are
+    requested, further clients with positive utility are then selected and topped up in the same order.
+
+    Returns:
+        None if fewer than `n_clients` could be selected. Otherwise, a feasible but not necessarily optimal
+        solution.
+    """
+    n, d = problem.capacity.shape
+    capacity = np.clip(problem.capacity, 0, None)
+    epb = problem.energy_per_batch
+    if problem.zone_energy is None:
+        zone_ids, zone_energy = np.zeros(n, dtype=int), np.full((1, d), np.inf)
+    else:
+        zone_ids, zone_energy = problem.zone_ids, np.clip(problem.zone_energy, 0, None).astype(float)
+    budget = np.inf if problem.energy_budget is None else float(problem.energy_budget)
+    allocation = np.zeros((n, d))
+    selected = np.zeros(n, dtype=bool)
+
+    def allocate(c: int, batches: float, order: np.ndarray) -> np.ndarray:
+        """Allocates up to `batches` to client c in the order of timesteps; returns the allocation."""
+        per_timestep = np.clip(np.minimum(capacity[c, order] - allocation[c, order],
+                                          zone_energy[zone_ids[c], order] / epb[c]), 0, None)
+        cumulative = np.cumsum(per_timestep)
+        batches = min(batches, cumulative[-1], budget / epb[c])
+        result = np.zeros(d)
+        result[order] = np.clip(batches - (cumulative - per_timestep), 0, per_timestep)
+        return result
+
+    def commit(c: int, batches: np.ndarray) -> None:
+        nonlocal budget
+        allocation[c] += batches
+        zone_energy[zone_ids[c]] = np.clip(zone_energy[zone_ids[c]] - batches * epb[c], 0, None)
+        budget = max(budget - batches.sum() * epb[c], 0)
+
+    def try_select(c: int) -> bool:
+        batches = allocate(c, problem.min_batches[c], np.argsort(-zone_energy[zone_ids[c]], kind="stable"))
+        if batches.sum() < problem.min_batches[c] - EPSILON:
+            return False
+        commit(c, batches)
+        selected[c] = True
+        return True
+
+    def top_up(c: int) -> None:
+        commit(c, allocate(c, problem.max_batches[c] - allocation[c].sum(),
+                           np.argsort(-zone_energy[zone_ids[c]], kind="stable")))
+
+    def next_candidate(rejected: np.ndarray) -> Optional[int]:
+        """Returns the unselected client with the largest objective it could still reach on its own."""
+        remaining = np.minimum(capacity - allocation, zone_energy[zone_ids] / epb[:, None]).sum(axis=1)
+        potential = problem.utility * np.minimum(problem.max_batches, np.minimum(remaining, budget / epb))
+        potential[selected | rejected] = -np.inf
+        c = int(np.argmax(potential))
+        return None if potential[c] == -np.inf else c
+
+    rejected = np.zeros(n, dtype=bool)
+    while selected.sum() < problem.n_clients:
+        c = next_candidate(rejected)
+        if c is None:
+            return None
+        rejected[c] = not try_select(c)
+
+    for c in sorted(np.flatnonzero(selected), key=lambda c: -problem.utility[c] / epb[c]):
+        top_up(c)
+    if not problem.exact_n_clients:
+        # Spend what is left on further clients, most objective per Ws first
+        for c in np.argsort(-problem.utility / epb, kind="stable"):
+            if not selected[c] and problem.utility[c] > 0 and try_select(c):
+                top_up(c)
+
+    return SelectionSolution(allocation=allocation, selected=selected,
+                             objective=float((problem.utility[:, None] * allocation).sum()))
+
+
+class SolverBackend(ABC):
+    """Solves the selection and runtime power attribution problems."""
+
+    @abstractmethod
+    def __repr__(self):
+        pass
+
+    def solve_selection(self, problem: SelectionProblem, name: str = "MIP Model",
+                        settings: Optional[SolverSettings] = None) -> Optional[SelectionSolution]:
+        """Returns None if no solution has been found, i.e. the problem is infeasible or the time limit was hit."""
+        return self.solve_selection_with_stats(problem, name, settings)[0]
+
+    @abstractmethod
+    def solve_selection_with_stats(self, problem: SelectionProblem, name: str = "MIP Model",
+                                   settings: Optional[SolverSettings] = None
+                                   ) -> Tuple[Optional[SelectionSolution], SolveStats]:
+        """Like `solve_selection`, also returning the statistics of the solve. Defaults to `SELECTION_SETTINGS`."""
+
+    @abstractmethod
+    def attribute_power(self, problem: AttributionProblem, settings: Optional[SolverSettings] = None) -> np.ndarray:
+        """Returns the batches attributed to each client. Defaults to `ATTRIBUTION_SETTINGS`.
+
+        If the time limit is hit before any solution has been found, falls back to `water_filling`.
+        """
+
+
+class GurobiBackend(SolverBackend):
+    """Solves all models with Gurobi in the process-wide `GUROBI_ENV`."""
+
+    def __repr__(self):
+        return "gurobi"
+
+    def solve_selection_with_stats(self, problem: SelectionProblem, name: str = "MIP Model",
+                                   settings: Optional[SolverSettings] = None
+                                   ) -> Tuple[Optional[SelectionSolution], SolveStats]:
+        model, m_alloc, b = build_matrix_model(problem, name)
+        (SELECTION_SETTINGS if settings is None else settings).apply(model)
+        warm_start = optimize_from_start(model, b, problem.start)
+        stats = gurobi_stats(model, name, warm_start=warm_start)
+        if not stats.has_solution:
+            return None, stats
+        return SelectionSolution(allocation=m_alloc.X.reshape(problem.capacity.shape),
+                                 selected=np.isclose(b.X, 1),
+                                 objective=model.ObjVal), stats
+
+    def attribute_power(self, problem: AttributionProblem, settings: Optional[SolverSettings] = None) -> np.ndarray:
+        model = grb.Model(name="Runtime power attribution model", env=GUROBI_ENV)
+        (ATTRIBUTION_SETTINGS if settings is None else settings).apply(model)
+        is_brown = problem.is_brown
+        ub = problem.max_batches
+        n = len(ub)
+
+        # For brown clients, always compute the expected batches
+        m = model.addMVar(n, lb=np.where(is_brown, ub, 0), ub=ub)
+        y = model.addMVar(n, vtype=grb.GRB.BINARY, lb=is_brown.astype(float))
+        x = model.addVar(lb=0, ub=problem.available_energy/EPSILON)
+
+        # Limit green client energy usage to green energy budget
+        model.addMConstr(np.where(is_brown, 0, problem.energy_per_batch)[None, :], m, "<",
+                         np.array([problem.available_energy]))
+        for i, (m_c, y_c) in enumerate(zip(m.tolist(), y.tolist())):
+            if not is_brown[i]:
+                model.addGenConstrIndicator(y_c, False, m_c == x * problem.weighting[i])
+                model.addGenConstrIndicator(y_c, True, m_c >= ub[i])
+                model.addGenConstrIndicator(y_c, True, x * problem.weighting[i] >= ub[i])
+
+        model.ModelSense = grb.GRB.MAXIMIZE
+        model.setObjective(x)
+        model.optimize()
+
+        if model.Status == grb.GRB.OPTIMAL or (model.Status == grb.GRB.TIME_LIMIT and model.SolCount > 0):
+            return m.X
+        elif model.Status == grb.GRB.TIME_LIMIT:
+            return water_filling(problem)
+        elif model.Status == grb.GRB.INFEASIBLE:
+            raise RuntimeError("INFEASIBLE")
+        elif model.Status == grb.GRB.INF_OR_UNBD:
+            raise RuntimeError("INF_OR_UNBD")
+        else:
+            raise Exception(model.Status)
+
+
+class HighsBackend(SolverBackend):
+    """Solves all models with the HiGHS MILP solver shipped with SciPy (`scipy.optimize.milp`), no licence needed.
+
+    Indicator constraints are linearized: the selection problem only needs linear rows (see
+    `SelectionProblem.constraints`) and the attribution problem uses big-M rows, where M is tight because the
+    common factor `x` never needs to exceed the value at which all green clients reach their `max_batches`.
+    SciPy does not expose the number of threads or MIP starts, so `SolverSettings.threads` and
+    `SelectionProblem.start` are ignored.
+    """
+
+    _SENSE_BOUNDS = {"<": lambda rhs: (-np.inf, rhs), ">": lambda rhs: (rhs, np.inf), "=": lambda rhs: (rhs, rhs)}
+    _STATUS = {0: "OPTIMAL", 1: "TIME_LIMIT", 2: "INFEASIBLE"}  # status codes of scipy.optimize.milp
+
+    def __repr__(self):
+        return "highs"
+
+    def solve_selection_with_stats(self, problem: SelectionProblem, name: str = "MIP Model",
+                                   settings: Optional[SolverSettings] = None
+                                   ) -> Tuple[Optional[SelectionSolution], SolveStats]:
+        n, d = problem.capacity.shape
+        constraints = [LinearConstraint(A, *self._SENSE_BOUNDS[sense](rhs))
+                       for A, sense, rhs in problem.constraints()]
+        start = time.perf_counter()
+        result = milp(c=-problem.objective(),
+                      integrality=np.concatenate([np.zeros(n * d), np.ones(n)]),
+                      bounds=Bounds(np.zeros(n * d + n), np.concatenate([problem.capacity.ravel(), np.ones(n)])),
+                      constraints=constraints,
+                      options=self._options(SELECTION_SETTINGS if settings is None else settings))
+        stats = SolveStats(name=name,
+                           status=self._STATUS.get(result.status, result.message),
+                           has_solution=result.x is not None,
+                           runtime=time.perf_counter() - start,
+                           node_count=getattr(result, "mip_node_count", np.nan),
+                           mip_gap=getattr(result, "mip_gap", 0.0) if result.x is not None else np.inf,
+                           n_vars=n * d + n,
+                           n_constrs=sum(constraint.A.shape[0] for constraint in constraints))
+        if result.x is None:
+            return None, stats
+        return SelectionSolution(allocation=np.clip(result.x[:n * d], 0, None).reshape(n, d),
+                                 selected=result.x[n * d:] > 0.5,
+                                 objective=-result.fun), stats
+
+    def attribute_power(self, problem: AttributionProblem, settings: Optional[SolverSettings] = None) -> np.ndarray:
+        # Variables: m (n), y (n), x
+        ub = problem.max_batches
+        w = problem.weighting
+        n = len(ub)
+        green = ~problem.is_brown
+        x_ub = problem.available_energy / EPSILON
+        if green.any():
+            x_ub = min(x_ub, np.max(np.divide(ub[green], w[green], out=np.zeros(green.sum()), where=w[green] > 0)))
+
+        identity = sp.identity(n, format="csr")[green]
+        rows = sp.vstack([
+            # m <= x * w  (equality for clients below their max_batches)
+            sp.hstack([identity, sp.csr_matrix((green.sum(), n)), -w[green][:, None]]),
+            # m >= x * w - M * y
+            sp.hstack([identity, sp.diags(w * x_ub, format="csr")[green], -w[green][:, None]]),
+            # m >= max_batches * y
+            sp.hstack([identity, -sp.diags(ub, format="csr")[green], sp.csr_matrix((green.sum(), 1))]),
+            # Limit green client energy usage to green energy budget
+            sp.hstack([sp.csr_matrix(np.where(green, problem.energy_per_batch, 0)[None, :]),
+                       sp.csr_matrix((1, n + 1))]),
+        ], format="csr")
+        zeros = np.zeros(green.sum())
+        lb = np.concatenate([np.full(green.sum(), -np.inf), zeros, zeros, [-np.inf]])
+        rhs = np.concatenate([zeros, np.full(green.sum(), np.inf), np.full(green.sum(), np.inf),
+                              [problem.available_energy]])
+
+        # For brown clients, always compute the expected batches
+        result = milp(c=np.concatenate([np.zeros(2 * n), [-1]]),
+                      integrality=np.concatenate([np.zeros(n), np.ones(n), [0]]),
+                      bounds=Bounds(np.concatenate([np.where(green, 0, ub), (~green).astype(float), [0]]),
+                                    np.concatenate([ub, np.ones(n), [x_ub]])),
+                      constraints=[LinearConstraint(rows, lb, rhs)],
+                      options=self._options(ATTRIBUTION_SETTINGS if settings is None else settings))
+        if result.x is None and self._STATUS.get(result.status) == "TIME_LIMIT":
+            return water_filling(problem)
+        if result.x is None:
+            raise RuntimeError(result.message)
+        return np.clip(result.x[:n], 0, ub)
+
+    @staticmethod
+    def _options(settings: SolverSettings) -> Dict:
+        options = {}
+        if settings.time_limit is not None:
+            options["time_limit"] = settings.time_limit
+        if settings.mip_gap is not None:
+            options["mip_rel_gap"] = settings.mip_gap
+        return options
+
+
+def build_matrix_model(problem: SelectionProblem, name: str = "MIP Model"):
+    """Builds the selection MIP with gurobipy's matrix API.
+
+    Returns:
+        The model, the flattened allocation MVar and the selection MVar.
+    """
+    n, d = problem.capacity.shape
+    model = grb.Model(name=name, env=GUROBI_ENV)
+    x = model.addMVar(n * d + n,
+                      ub=np.concatenate([problem.capacity.ravel(), np.ones(n)]),
+                      obj=problem.objective(),
+                      vtype=np.concatenate([np.full(n * d, grb.GRB.CONTINUOUS), np.full(n, grb.GRB.BINARY)]))
+    for A, sense, rhs in problem.constraints():
+        model.addMConstr(A, x, sense, rhs)
+    model.ModelSense = grb.GRB.MAXIMIZE
+    return model, x[:n * d], x[n * d:]
+
+
+_SOLVERS: Dict[str, SolverBackend] = {}
+
+
+def get_solver(name: Optional[str] = None) -> SolverBackend:
+    """Returns the solver backend `name` ("gurobi" or "highs"), defaults to `SOLVER_BACKEND`."""
+    name = SOLVER_BACKEND if name is None else name
+    if name not in _SOLVERS:
+        if name == "gurobi":
+            _SOLVERS[name] = GurobiBackend()
+        elif name == "highs":
+            _SOLVERS[name] = HighsBackend()
+        else:
+            raise ValueError(f"Unknown solver backend: {name}")
+    return _SOLVERS[name]
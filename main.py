@@ -16,15 +16,16 @@ from flwr.server import ServerConfig
 from torch.utils.tensorboard import SummaryWriter
 
 from fedzero.config import NUM_CLIENTS, BATCH_SIZE, CLIENTS_PER_ROUND, MIN_LOCAL_EPOCHS, MAX_LOCAL_EPOCHS, \
-    MAX_ROUNDS, RAY_CLIENT_RESOURCES, RAY_INIT_ARGS, SAVE_TRAINED_MODELS, ENABLE_BROWN_CLIENTS, \
+    MAX_ROUNDS, RAY_CLIENT_RESOURCES, RAY_INIT_ARGS, SAVE_TRAINED_MODELS, ENABLE_BROWN_CLIENTS, ASYNC_EVALUATION, \
     TIME_WINDOW_LOWER_BOUND, TIME_WINDOW_UPPER_BOUND, BROWN_CLIENTS_BUDGET_PERCENTAGE, BROWN_CLIENTS_NUMBER_PERCENTAGE
 from fedzero.datasets import get_dataloaders
+from fedzero.evaluation import EvaluationWorker
 from fedzero.fl_client import flwr_get_parameters, flwr_set_parameters, test, FedZeroClient, FedZeroClientMock
 from fedzero.fl_server import FedZeroServer
 from fedzero.models import create_model
 from fedzero.scenarios import get_scenario, Scenario
 from fedzero.selection_strategy import SelectionStrategy, RandomSelectionStrategy, FedZeroSelectionStrategy, \
-    OortSelectionStrategy
+    OortSelectionStrategy, HeuristicSelectionStrategy
 from fedzero.utility import StaticJudge, StatUtilityJudge
 
 
@@ -159,9 +160,10 @@ def simulate_fl_training(experiment: Experiment, device: torch.device, mock: boo
                                  proximal_mu=experiment.proximal_mu,
                                  device=device)
 
-    # The `evaluate` function will be by Flower called after every round
-    def server_eval_fn(server_round: int, parameters: flwr.common.NDArrays, config: Dict[str, flwr.common.Scalar]):
-        net = create_model(model_arch=experiment.net_arch, num_classes=num_classes, device=device)
+    def create_eval_model() -> torch.nn.Module:
+        return create_model(model_arch=experiment.net_arch, num_classes=num_classes, device=device)
+
+    def evaluate_model(net: torch.nn.Module, server_round: int, parameters: flwr.common.NDArrays):
         flwr_set_parameters(net, parameters)  # Update model with the latest parameters
         loss, accuracy = test(net, testloader, device=device)
         net_state_dict = net.state_dict()
@@ -170,6 +172,12 @@ def simulate_fl_training(experiment: Experiment, device: torch.device, mock: boo
         print(f"Server-side evaluation, round: {server_round},  loss: {loss},  accuracy: {accuracy}")
         return loss, {"accuracy": accuracy}
 
+    # The `evaluate` function will be by Flower called after every round, unless evaluated in the background
+    def server_eval_fn(server_round: int, parameters: flwr.common.NDArrays, config: Dict[str, flwr.common.Scalar]):
+        return evaluate_model(create_eval_model(), server_round, parameters)
+
+    evaluator = EvaluationWorker(create_eval_model, evaluate_model) if ASYNC_EVALUATION else None
+
     # Pass parameters to the Strategy for server-side parameter initialization
     strategy = flwr.server.strategy.FedAvg(
         fraction_fit=NUM_CLIENTS / CLIENTS_PER_ROUND,
@@ -183,7 +191,8 @@ def simulate_fl_training(experiment: Experiment, device: torch.device, mock: boo
                            min_epochs=MIN_LOCAL_EPOCHS,
                            max_epochs=MAX_LOCAL_EPOCHS,
                            strategy=strategy,
-                           writer=writer)
+                           writer=writer,
+                           evaluator=evaluator)
 
     flwr.simulation.start_simulation(
         client_fn=client_fn,
@@ -194,13 +203,15 @@ def simulate_fl_training(experiment: Experiment, device: torch.device, mock: boo
         ray_init_args=RAY_INIT_ARGS,
         keep_initialised=True
     )
+    if evaluator is not None:
+        evaluator.close()
     print("Simulation finished successfully.")
 
 
 @click.command()
 @click.option('--scenario', type=click.Choice(["unconstrained", "global", "germany"]), required=True)
 @click.option('--dataset', type=click.Choice(["cifar10", "cifar100", "tiny_imagenet", "shakespeare", "kwt"]), required=True)
-@click.option('--approach', type=str, required=True)  # fedzero_a{alpha}_e{exclusion_factor}, fedzero_static, random, random_fc, oort, oort_fc
+@click.option('--approach', type=str, required=True)  # fedzero_a{alpha}_e{exclusion_factor}, fedzero_greedy_a{alpha}_e{exclusion_factor}, fedzero_static, random, random_fc, oort, oort_fc
 @click.option('--overselect', type=float, default=1)  # K
 @click.option('--forecast_error', type=click.Choice(["error", "no_error", "error_no_load_fc"]), default="error")
 @click.option('--imbalanced_scenario', is_flag=True, default=False)
@@ -209,8 +220,14 @@ def simulate_fl_training(experiment: Experiment, device: torch.device, mock: boo
 @click.option('--runs', type=int, default=1)
 @click.option('--iid', is_flag=True, default=False)
 @click.option('--cpu', is_flag=True, default=False)
+# Try every round duration in order, or probe durations in growing steps and bisect (fewer, but longer solves)
+@click.option('--linear_duration_search/--exponential_duration_search', default=True)
+# "per_variable" builds the MIPs like FedZero's original selection, with the linear duration search it reproduces it
+@click.option('--model_builder', type=click.Choice(["incremental", "matrix", "per_variable"]), default=None)
+@click.option('--report_heuristic_gap', is_flag=True, default=False)  # also solve fedzero_greedy's problems as MIP
 def main(scenario: str, dataset: str, approach: str, overselect: float, forecast_error: str,
-         imbalanced_scenario: bool, mock: bool, seed: Optional[int], runs: Optional[int], iid: Optional[bool], cpu: Optional[bool]):
+         imbalanced_scenario: bool, mock: bool, seed: Optional[int], runs: Optional[int], iid: Optional[bool], cpu: Optional[bool],
+         linear_duration_search: bool, model_builder: Optional[str], report_heuristic_gap: bool):
     for i in range(0, runs):
         assert overselect >= 1
         clients_per_round = int(CLIENTS_PER_ROUND * overselect)
@@ -240,6 +257,22 @@ def main(scenario: str, dataset: str, approach: str, overselect: float, forecast
                 min_epochs=MIN_LOCAL_EPOCHS,
                 max_epochs=MAX_LOCAL_EPOCHS,
                 seed=seed,
+                linear_duration_search=linear_duration_search,
+                model_builder=model_builder,
+            )
+        elif approach.startswith("fedzero_greedy"):
+            split = approach.split("_")
+            assert len(split) == 4, ("Invalid approach format: greedy FedZero has the format "
+                                    "fedzero_greedy_{alpha}_{exclusion_factor}, e.g. fedzero_greedy_1_1")
+            selection_strategy = HeuristicSelectionStrategy(
+                clients_per_round=clients_per_round,
+                utility_judge=StatUtilityJudge(scenario.client_load_api.get_clients()),
+                alpha=float(split[2]),
+                exclusion_factor=float(split[3]),
+                min_epochs=MIN_LOCAL_EPOCHS,
+                max_epochs=MAX_LOCAL_EPOCHS,
+                seed=seed,
+                report_gap=report_heuristic_gap,
             )
         elif "fedzero" in approach:
             split = approach.split("_")
@@ -253,6 +286,8 @@ def main(scenario: str, dataset: str, approach: str, overselect: float, forecast
                 min_epochs=MIN_LOCAL_EPOCHS,
                 max_epochs=MAX_LOCAL_EPOCHS,
                 seed=seed,
+                linear_duration_search=linear_duration_search,
+                model_builder=model_builder,
             )
         elif approach == "oort":
             selection_strategy = OortSelectionStrategy(clients_per_round=clients_per_round, seed=seed)
@@ -0,0 +1,134 @@
+"""The round simulation as it was before `_simulate_round`, kept as reference for its tests.
+
+The code is unchanged apart from reading the selection from a `SelectionPlan` and not recording the usage.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from fedzero.config import TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, MIN_LOCAL_EPOCHS, MAX_LOCAL_EPOCHS
+from fedzero.entities import PowerDomainApi, ClientLoadApi, Client, SelectionPlan
+from fedzero.solvers import AttributionProblem, water_filling
+
+
+def legacy_simulate_round(power_domain_api: PowerDomainApi,
+                          client_load_api: ClientLoadApi,
+                          plan: SelectionPlan,
+                          min_epochs: float,
+                          max_epochs: float) -> Tuple[Dict[Client, float], int]:
+    """Returns the floored participation of each client and the round duration in timesteps."""
+    for c, is_brown in zip(plan.clients, plan.is_brown):
+        c.is_brown = bool(is_brown)
+    selection = _extend_selection_df(plan.to_dataframe())
+    clients_in_round = len(selection.index)
+    time_iterator = [_execute_power_domain_round(power_domain_api, client_load_api, zone, p_selection, max_epochs)
+                     for zone, p_selection
+                     in selection.groupby(lambda c: c.zone)]
+
+    # We progress in all energy domains until <CLIENTS_PER_ROUND> clients have reached `min_epochs`
+    participation = {}
+    for p_timestep_results in zip(*time_iterator):
+        n_clients_above_min_epochs = 0
+        for p_participation, now in p_timestep_results:
+            for client, part in p_participation.items():
+                participation[client] = part
+                if participation[client] >= client.batches_per_epoch * min_epochs:
+                    n_clients_above_min_epochs += 1
+        if n_clients_above_min_epochs >= clients_in_round:
+            break
+
+    round_duration = now - selection.columns[0]
+    return participation, round_duration
+
+
+def _execute_power_domain_round(power_domain_api: PowerDomainApi,
+                                client_load_api: ClientLoadApi,
+                                zone: str,
+                                selection: pd.DataFrame,
+                                max_epochs: float):
+    first_round = True
+    participation: Dict[Client, float] = {c: 0.0 for c in selection.index}
+    column_index = client_load_api.column_index(list(participation.keys()))
+    for now in selection.columns:
+        # yield aggregated participation after every completed time step
+        if not first_round:
+            yield {c: np.floor(p) for c, p in participation.items()}, now
+
+        clients_below_max = [c for c, p in participation.items() if p < c.batches_per_epoch * MAX_LOCAL_EPOCHS]
+        if len(clients_below_max) == 0:  # no more training
+            continue
+
+        # Minimum of how much the client can compute on excess capacity and until it reaches it max local epochs
+        capacity = client_load_api.actual_all(now)[column_index]
+        max_batches: dict = {
+            c: int(min(capacity[i], c.batches_per_epoch * max_epochs - participation[c]))
+            for i, c in enumerate(participation.keys()) if (not c.is_brown)
+        }
+        # For brown clients, always compute the expected batches
+        max_batches.update(
+            {
+                c: selection[now][c] for c in participation.keys() if c.is_brown
+            }
+        )
+
+        participation = _execute_power_domain_timestep(clients=clients_below_max,
+                                                       participation=participation,
+                                                       available_energy=power_domain_api.actual(now, zone),
+                                                       max_batches=max_batches)
+        first_round = False
+
+
+def _execute_power_domain_timestep(clients: List[Client],
+                                   participation: Dict[Client, float],
+                                   available_energy: float,
+                                   max_batches: Dict[Client, int]) -> Dict[Client, float]:
+    if len(clients) == 1:
+        c = clients[0]
+        if c.is_brown:
+            participation[c] += max_batches[c]
+        else:  # For brown clients, always compute the expected batches
+            participation[c] += min(available_energy / c.energy_per_batch, max_batches[c])
+    else:
+        # First attribute energy to clients that haven't reached MIN_LOCAL_EPOCHS
+        participation1, remaining_energy = _attribute_power(MIN_LOCAL_EPOCHS, participation, available_energy, max_batches)
+        for c, p in participation1.items():
+            participation[c] += p
+            max_batches[c] -= p
+
+        # Attribute the remaining power by how much energy is still required to reach MAX_LOCAL_EPOCHS
+        if remaining_energy > 0:
+            participation2, _ = _attribute_power(MAX_LOCAL_EPOCHS, participation, available_energy, max_batches)
+            for c, p in participation2.items():
+                participation[c] += p
+
+    return participation
+
+
+def _attribute_power(required_epochs, participation, available_energy, max_batches):
+    missing_batches = {c: c.batches_per_epoch * required_epochs - p for c, p in participation.items()}
+    clients: list[Client] = [c for c in participation.keys() if missing_batches[c] > 0]
+    # Weight clients (exclude brown clients)
+    weighting = {c: missing_batches[c] * c.energy_per_batch for c in clients if (not c.is_brown)}
+
+    # capping the available_energy to the max of possible usage allows us to use an equality constraint in (1)
+    # Do not cap brown clients
+    _available_energy = min(available_energy, sum([max_batches[c] * c.energy_per_batch for c in clients if (not c.is_brown)]))
+
+    problem = AttributionProblem(
+        max_batches=np.array([max_batches[c] for c in clients], dtype=float),
+        weighting=np.array([weighting.get(c, 0) for c in clients], dtype=float),
+        energy_per_batch=np.array([c.energy_per_batch for c in clients], dtype=float),
+        is_brown=np.array([c.is_brown for c in clients], dtype=bool),
+        available_energy=_available_energy,
+    )
+    batches = water_filling(problem)
+    participation = dict(zip(clients, batches.tolist()))
+    # Calculate remaining energy, but ignore brown client consumption
+    remaining_energy = available_energy - sum(p * c.energy_per_batch for c, p in participation.items() if (not c.is_brown))
+    return participation, 0 if np.isclose(remaining_energy, 0) else remaining_energy
+
+
+def _extend_selection_df(selection: pd.DataFrame):
+    start = selection.columns[0]
+    return selection.reindex(columns=range(start, start + int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN) + 1), fill_value=1)
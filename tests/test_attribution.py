@@ -0,0 +1,112 @@
+"""Runtime power attribution: `water_filling` must give the same allocations as the MIP of the solver backends.
+
+Run via: python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+gurobipy = pytest.importorskip("gurobipy")  # fedzero.config creates the Gurobi environment on import
+
+from fedzero.config import GUROBI_ENV  # noqa: E402
+from fedzero.solvers import AttributionProblem, GurobiBackend, HighsBackend, SolverSettings, attribution_tolerance, \
+    water_filling  # noqa: E402
+
+# The MIPs are solved to optimality, with the default gap their allocations may differ by about 1e-4
+EXACT = SolverSettings(mip_gap=0)
+
+
+def assert_matches(batches: np.ndarray, expected: np.ndarray, problem: AttributionProblem) -> None:
+    np.testing.assert_allclose(batches, expected, rtol=0, atol=attribution_tolerance(problem))
+
+
+@pytest.fixture(scope="module")
+def numeric_focus():
+    """Gurobi's presolve occasionally returns an `x` a few percent below the optimum of these poorly scaled MIPs."""
+    GUROBI_ENV.setParam("NumericFocus", 3)
+    yield
+    GUROBI_ENV.resetParams()
+    GUROBI_ENV.setParam("OutputFlag", 0)
+
+
+def random_problem(seed: int, brown_share: float = 0.2, energy_share: float = None) -> AttributionProblem:
+    """A power domain with random clients, built like `runtime_optimization._attribute_power` builds it."""
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 10))
+    is_brown = rng.random(n) < brown_share
+    energy_per_batch = rng.uniform(50, 1000, n)
+    # Integral batches from the capacity, fractional ones once part of the timestep has been attributed
+    max_batches = np.where(rng.random(n) < 0.5, rng.integers(0, 20, n), rng.uniform(0, 20, n))
+    missing_batches = rng.uniform(1, 200, n)
+    weighting = np.where(is_brown, 0, missing_batches * energy_per_batch)
+    green_energy = float((max_batches * energy_per_batch)[~is_brown].sum())
+    if energy_share is None:
+        energy_share = rng.uniform(0, 1)
+    return AttributionProblem(max_batches=max_batches.astype(float),
+                              weighting=weighting,
+                              energy_per_batch=energy_per_batch,
+                              is_brown=is_brown,
+                              available_energy=energy_share * green_energy)
+
+
+def edge_cases():
+    ties = AttributionProblem(max_batches=np.array([5.0, 5.0, 5.0, 2.0]),
+                              weighting=np.array([100.0, 100.0, 100.0, 40.0]),
+                              energy_per_batch=np.array([10.0, 10.0, 10.0, 10.0]),
+                              is_brown=np.zeros(4, dtype=bool),
+                              available_energy=90.0)
+    return {
+        "zero energy": random_problem(0, energy_share=0),
+        "all capped by max_batches": random_problem(1, energy_share=1),
+        "brown only": random_problem(2, brown_share=1),
+        "brown and green": random_problem(3, brown_share=0.5),
+        "ties": ties,
+        "ties on a breakpoint": AttributionProblem(ties.max_batches, ties.weighting, ties.energy_per_batch,
+                                                   ties.is_brown, available_energy=170.0),
+        "single client": AttributionProblem(max_batches=np.array([7.5]), weighting=np.array([300.0]),
+                                            energy_per_batch=np.array([40.0]), is_brown=np.array([False]),
+                                            available_energy=100.0),
+        "zero max_batches": AttributionProblem(max_batches=np.array([0.0, 3.0, 0.0]),
+                                               weighting=np.array([50.0, 20.0, 80.0]),
+                                               energy_per_batch=np.array([100.0, 100.0, 100.0]),
+                                               is_brown=np.zeros(3, dtype=bool),
+                                               available_energy=200.0),
+    }
+
+
+PROBLEMS = {**{f"random {seed}": random_problem(seed, brown_share=[0, 0.2, 0.5][seed % 3]) for seed in range(200)},
+            **edge_cases()}
+
+
+def assert_valid(problem: AttributionProblem, batches: np.ndarray) -> None:
+    green = ~problem.is_brown
+    np.testing.assert_allclose(batches[problem.is_brown], problem.max_batches[problem.is_brown])
+    assert np.all(batches >= 0) and np.all(batches <= problem.max_batches)
+    # Clients below their max_batches share a common `x`
+    below = green & (batches < problem.max_batches)
+    x = batches[below] / problem.weighting[below]
+    np.testing.assert_allclose(x, x.max(initial=0))
+    # The budget is capped to what green clients can use, so it is used completely
+    used = float((batches * problem.energy_per_batch)[green].sum())
+    assert np.isclose(used, problem.available_energy, rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("name", list(PROBLEMS))
+def test_water_filling_is_optimal(name):
+    problem = PROBLEMS[name]
+    assert_valid(problem, water_filling(problem))
+
+
+@pytest.mark.parametrize("name", list(PROBLEMS))
+def test_water_filling_matches_highs(name):
+    problem = PROBLEMS[name]
+    assert_matches(water_filling(problem), HighsBackend().attribute_power(problem, EXACT), problem)
+
+
+@pytest.mark.parametrize("name", list(PROBLEMS))
+def test_water_filling_matches_gurobi(name, numeric_focus):
+    problem = PROBLEMS[name]
+    try:
+        expected = GurobiBackend().attribute_power(problem, EXACT)
+    except gurobipy.GurobiError as e:  # e.g. no valid licence
+        pytest.skip(f"Gurobi unavailable: {e}")
+    assert_matches(water_filling(problem), expected, problem)
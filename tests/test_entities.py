@@ -0,0 +1,61 @@
+"""Client bookkeeping in `Client`, `ClientCatalog` and `UtilityHistory`, and round plans in `SelectionPlan`.
+
+Run via: python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("gurobipy")  # fedzero.config creates the Gurobi environment on import
+
+from benchmarks.synthetic import synthetic_scenario  # noqa: E402
+from fedzero.config import STATISTICAL_UTILITY_HISTORY  # noqa: E402
+from fedzero.entities import Client, ClientCatalog, SelectionPlan  # noqa: E402
+
+
+def test_utilities_recorded_before_attaching_are_kept():
+    client = Client(name="0_zone0", zone="zone0", batches_per_timestep=5, energy_per_batch=10)
+    rounds = range(STATISTICAL_UTILITY_HISTORY + 3)
+    for server_round in rounds:
+        client.record_statistical_utility(server_round, float(server_round))
+    kept = {r: float(r) for r in rounds[-STATISTICAL_UTILITY_HISTORY:]}
+    assert client.utility_history.history(client._position) == kept
+
+    other = Client(name="1_zone0", zone="zone0", batches_per_timestep=5, energy_per_batch=10)
+    ClientCatalog([other, client])
+    assert client.utility_history.history(client._position) == kept
+    assert client.statistical_utility() == float(rounds[-1])
+    assert other.utility_history.history(other._position) == {}
+
+
+def test_selection_plan_round_trips_through_dataframes():
+    power_domain_api, client_load_api, clients = synthetic_scenario(6, n_zones=3)
+    selected = [clients[4], clients[0], clients[2]]
+    df = pd.DataFrame(np.arange(12, dtype=float).reshape(3, 4), index=selected, columns=range(10, 14))
+    plan = SelectionPlan.from_dataframe(df, client_load_api, power_domain_api)
+
+    assert plan.start == 10 and plan.duration == 4
+    np.testing.assert_array_equal(plan.timesteps, [10, 11, 12, 13])
+    np.testing.assert_array_equal(plan.client_index, [4, 0, 2])
+    np.testing.assert_array_equal(plan.zone_ids, power_domain_api.zone_index(["zone1", "zone0", "zone2"]))
+    np.testing.assert_array_equal(plan.is_brown, False)
+    pd.testing.assert_frame_equal(plan.to_dataframe(), df, check_dtype=False, check_index_type=False,
+                                  check_column_type=False)
+
+
+def test_selection_plan_resizes_and_concatenates():
+    power_domain_api, client_load_api, clients = synthetic_scenario(4, n_zones=2)
+    green = SelectionPlan.from_clients(clients[:2], client_load_api, power_domain_api, start=5,
+                                       batches=np.full((2, 3), 2))
+    brown = SelectionPlan.from_clients(clients[2:3], client_load_api, power_domain_api, start=5,
+                                       batches=np.full((1, 5), 1), is_brown=True)
+
+    np.testing.assert_array_equal(green.resized(5, fill_value=1).batches, [[2, 2, 2, 1, 1]] * 2)
+    np.testing.assert_array_equal(green.resized(2).batches, [[2, 2]] * 2)
+    assert green.resized(5).clients == green.clients
+
+    plan = green.concat(brown)
+    assert plan.clients == clients[:3] and plan.start == 5 and plan.duration == 5
+    np.testing.assert_array_equal(plan.batches, [[2, 2, 2, 0, 0], [2, 2, 2, 0, 0], [1, 1, 1, 1, 1]])
+    np.testing.assert_array_equal(plan.is_brown, [False, False, True])
+    np.testing.assert_array_equal(plan.client_index, [0, 1, 2])
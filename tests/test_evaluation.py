@@ -0,0 +1,71 @@
+"""Background evaluation of global model snapshots in `EvaluationWorker`.
+
+Run via: python -m pytest tests
+"""
+import threading
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("flwr")
+
+from fedzero.evaluation import EvaluationWorker  # noqa: E402
+
+
+def test_snapshots_are_evaluated_in_order_with_a_single_model():
+    models, evaluated = [], []
+    first_started, release_first = threading.Event(), threading.Event()
+
+    def evaluate(model, server_round, parameters):
+        if server_round == 1:
+            first_started.set()
+            release_first.wait()
+        evaluated.append((model, server_round, threading.current_thread().name))
+        return float(server_round), {"accuracy": parameters[0]}
+
+    worker = EvaluationWorker(lambda: models.append(object()) or models[-1], evaluate)
+    futures = [worker.submit(r, [r / 10]) for r in range(1, 5)]
+    first_started.wait()
+    assert not any(f.done() for f in futures)  # later snapshots wait for the first one
+    release_first.set()
+
+    assert [f.result(timeout=10) for f in futures] == [(float(r), {"accuracy": r / 10}) for r in range(1, 5)]
+    assert len(models) == 1
+    assert evaluated == [(models[0], r, "evaluation") for r in range(1, 5)]
+    worker.close()
+
+
+def test_failed_evaluations_raise_from_their_future_only():
+    def evaluate(model, server_round, parameters):
+        if server_round == 2:
+            raise ValueError("broken snapshot")
+        return 0.0, {"accuracy": 1.0}
+
+    worker = EvaluationWorker(object, evaluate)
+    futures = [worker.submit(r, []) for r in range(1, 4)]
+    worker.join()
+    assert isinstance(futures[1].exception(), ValueError)
+    with pytest.raises(ValueError, match="broken snapshot"):
+        futures[1].result()
+    assert futures[0].result() == futures[2].result() == (0.0, {"accuracy": 1.0})
+    worker.close()
+
+
+def test_close_evaluates_queued_snapshots_and_stops_the_thread():
+    release = threading.Event()
+    callbacks = []
+
+    def evaluate(model, server_round, parameters):
+        release.wait()
+        return float(server_round), {}
+
+    worker = EvaluationWorker(object, evaluate)
+    futures = [worker.submit(r, []) for r in range(1, 4)]
+    for future in futures:
+        future.add_done_callback(lambda f: callbacks.append(f.result()[0]))
+    release.set()
+    worker.close()
+
+    assert not worker._thread.is_alive()
+    assert all(f.done() for f in futures)
+    assert callbacks == [1.0, 2.0, 3.0]
@@ -0,0 +1,57 @@
+"""Pipelined selection of the next round in `FedZeroServer`.
+
+Run via: python -m pytest tests
+"""
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip("gurobipy")  # fedzero.config creates the Gurobi environment on import
+pytest.importorskip("torch")
+pytest.importorskip("flwr")
+
+from benchmarks.synthetic import START, synthetic_scenario  # noqa: E402
+from fedzero import fl_server  # noqa: E402
+from fedzero.scenarios import Scenario  # noqa: E402
+from fedzero.selection_strategy import RandomSelectionStrategy  # noqa: E402
+
+
+def server(pipelined: bool, monkeypatch) -> fl_server.FedZeroServer:
+    """A server whose clients never reach the minimum local epochs, so rounds end without any training."""
+    monkeypatch.setattr(fl_server, "PIPELINED_ROUNDS", pipelined)
+    power_domain_api, client_load_api, clients = synthetic_scenario(10, n_zones=2)
+    for client in clients:
+        client.num_samples = 10 ** 7
+    scenario = Scenario(power_domain_api, client_load_api, start_date=START, end_date=START + timedelta(hours=4),
+                        solar_scenario="synthetic", forecast_error="synthetic", unconstrained=False,
+                        imbalanced_scenario=False)
+    return fl_server.FedZeroServer(scenario=scenario, selection_strategy=RandomSelectionStrategy(3, seed=0),
+                                   min_epochs=1, max_epochs=5, strategy=None, writer=None)
+
+
+def test_next_round_is_selected_in_the_background_and_recorded_once_taken(monkeypatch):
+    pipelined = server(True, monkeypatch)
+    _, _, _, participation, now = pipelined.fit_round_ra(server_round=1, now=30, timeout=None)
+    assert participation == {}
+    catalog = pipelined.client_load_api.catalog
+    recorded = catalog.participated_batches.copy()
+    assert recorded.sum() > 0
+
+    selected = pipelined._next_selection.result()
+    selection, simulated, duration = selected
+    assert selection.start == now + 1
+    np.testing.assert_array_equal(catalog.participated_batches, recorded)  # not recorded before it is taken
+
+    pipelined._next_selection = None
+    _, _, _, _, end = pipelined.fit_round_ra(server_round=2, now=now, timeout=None, selected=selected)
+    assert end == now + duration
+    recorded[selection.client_index] += simulated.astype(recorded.dtype)
+    np.testing.assert_array_equal(catalog.participated_batches, recorded)
+    assert pipelined._next_selection is not None  # round 3 is already being selected
+
+
+def test_rounds_are_selected_in_the_foreground_without_pipelining(monkeypatch):
+    sequential = server(False, monkeypatch)
+    sequential.fit_round_ra(server_round=1, now=30, timeout=None)
+    assert sequential._selection_worker is None and sequential._next_selection is None
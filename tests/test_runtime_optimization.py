@@ -0,0 +1,139 @@
+"""Simulation of training rounds via `execute_round`.
+
+Run via: python -m pytest tests
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("gurobipy")  # fedzero.config creates the Gurobi environment on import
+
+from vessim.signal import HistoricalSignal  # noqa: E402
+
+import fedzero.runtime_optimization as runtime_optimization  # noqa: E402
+from fedzero.config import TIMESTEP_IN_MIN, MAX_ROUND_IN_MIN, MAX_LOCAL_EPOCHS  # noqa: E402
+from fedzero.entities import Client, ClientLoadApi, PowerDomainApi, SelectionPlan  # noqa: E402
+from fedzero.runtime_optimization import execute_round, record_round, simulate_round  # noqa: E402
+from tests.legacy_runtime import legacy_simulate_round  # noqa: E402
+
+START = pd.to_datetime("2022-06-08 00:00:00")
+END = START + timedelta(hours=2)
+
+
+def scenario(solar_fill_method: str):
+    """Two zones with two clients each. Like in `get_scenario`, the client loads end at END."""
+    index = pd.date_range(START, END, freq=f"{TIMESTEP_IN_MIN}min")
+    clients = []
+    for i in range(4):
+        client = Client(name=f"{i}_zone{i % 2}", zone=f"zone{i % 2}", batches_per_timestep=5, energy_per_batch=10)
+        client.num_samples = 1000  # 100 batches per epoch, more than the clients can compute until END
+        clients.append(client)
+    load = pd.DataFrame(0.5, index=index, columns=[c.name for c in clients])
+    client_load_api = ClientLoadApi(clients, HistoricalSignal(load, load, fill_method="bfill"), start=START)
+    solar = pd.DataFrame(1000.0, index=index, columns=["zone0", "zone1"])
+    power_domain_api = PowerDomainApi(HistoricalSignal(solar, solar, fill_method=solar_fill_method),
+                                      start=START, end=END)
+    return power_domain_api, client_load_api, clients
+
+
+@pytest.mark.parametrize("solar_fill_method", ["bfill", "ffill"])
+def test_round_times_out_where_actual_data_ends(solar_fill_method):
+    power_domain_api, client_load_api, clients = scenario(solar_fill_method)
+    end_timestep = client_load_api.clock.to_timestep(END)
+    start = end_timestep - 5
+    assert client_load_api.actual_horizon(start) == 6
+    assert client_load_api.actual_horizon(end_timestep + 1) == 0
+
+    duration = int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN)
+    selection = SelectionPlan.from_clients(clients, client_load_api, power_domain_api, start=start,
+                                           batches=np.full((len(clients), duration), 2.5))
+    computed_batches, round_duration = execute_round(power_domain_api, client_load_api, selection,
+                                                     min_epochs=1, max_epochs=5)
+
+    assert round_duration == 6  # timesteps end_timestep - 5, ..., end_timestep
+    assert computed_batches == {}  # nobody reaches the minimum local epochs
+    # 2.5 batches per timestep, truncated to whole batches
+    np.testing.assert_array_equal(client_load_api.catalog.participated_batches, 6 * 2)
+
+
+def test_participated_batches_are_integers():
+    power_domain_api, client_load_api, clients = scenario("ffill")
+    duration = int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN)
+    selection = SelectionPlan.from_clients(clients, client_load_api, power_domain_api, start=0,
+                                           batches=np.full((len(clients), duration), 2.5))
+    execute_round(power_domain_api, client_load_api, selection, min_epochs=1, max_epochs=5)
+
+    assert client_load_api.catalog.participated_batches.dtype.kind == "i"
+    assert all(type(c.participated_batches) is int and c.participated_batches > 0 for c in clients)
+
+
+def test_simulated_rounds_are_only_recorded_when_taken():
+    power_domain_api, client_load_api, clients = scenario("ffill")
+    duration = int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN)
+    selection = SelectionPlan.from_clients(clients[:2], client_load_api, power_domain_api, start=0,
+                                           batches=np.full((2, duration), 2.5))
+    brown = SelectionPlan.from_clients(clients[2:], client_load_api, power_domain_api, start=0,
+                                       batches=np.full((2, duration), 2.5), is_brown=True)
+    participation, _ = simulate_round(power_domain_api, client_load_api, selection.concat(brown), 1, 5)
+
+    np.testing.assert_array_equal(client_load_api.catalog.participated_batches, 0)
+    assert not any(c.is_brown for c in clients)
+
+    record_round(client_load_api, selection.concat(brown), participation)
+    np.testing.assert_array_equal(client_load_api.catalog.participated_batches, participation)
+    assert [c.is_brown for c in clients] == [False, False, True, True]
+
+
+def random_scenario(rng: np.random.Generator):
+    """Up to three zones with one to four clients each, random loads and solar power with gaps."""
+    index = pd.date_range(START, END, freq=f"{TIMESTEP_IN_MIN}min")
+    zones = [f"zone{z}" for z in range(rng.integers(1, 4))]
+    clients = []
+    for zone in zones:
+        for i in range(rng.integers(1, 5)):
+            client = Client(name=f"{i}_{zone}", zone=zone, batches_per_timestep=float(rng.uniform(1, 20)),
+                            energy_per_batch=float(rng.uniform(1, 20)))
+            client.num_samples = int(rng.integers(10, 1500))
+            clients.append(client)
+    load = pd.DataFrame(rng.uniform(0, 1, (len(index), len(clients))), index=index, columns=[c.name for c in clients])
+    client_load_api = ClientLoadApi(clients, HistoricalSignal(load, load, fill_method="bfill"), start=START)
+    solar = pd.DataFrame(rng.uniform(0, 4, (len(index), len(zones))) * (rng.random((len(index), len(zones))) < 0.7),
+                         index=index, columns=zones)
+    power_domain_api = PowerDomainApi(HistoricalSignal(solar, solar, fill_method="ffill"), start=START, end=END)
+    return power_domain_api, client_load_api, clients
+
+
+def test_simulation_matches_the_legacy_simulation(monkeypatch):
+    attribution_passes = []
+
+    def attribute_power(required_epochs, *args):
+        attribution_passes.append(required_epochs)
+        return attribute(required_epochs, *args)
+    attribute = runtime_optimization._attribute_power
+    monkeypatch.setattr(runtime_optimization, "_attribute_power", attribute_power)
+
+    rng = np.random.default_rng(0)
+    durations = []
+    for _ in range(50):
+        power_domain_api, client_load_api, clients = random_scenario(rng)
+        start = int(rng.integers(0, 30))
+        duration = int(rng.integers(1, int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN) + 1))
+        batches = rng.uniform(0, 10, (len(clients), duration)) * (rng.random((len(clients), duration)) < 0.8)
+        selection = SelectionPlan.from_clients(clients, client_load_api, power_domain_api, start=start, batches=batches)
+        selection.is_brown = rng.random(len(clients)) < 0.3
+        min_epochs, max_epochs = float(rng.uniform(0.5, 2)), float(rng.uniform(2, 5))
+
+        participation, round_duration = simulate_round(power_domain_api, client_load_api, selection,
+                                                       min_epochs, max_epochs)
+        expected, expected_duration = legacy_simulate_round(power_domain_api, client_load_api, selection,
+                                                            min_epochs, max_epochs)
+
+        assert round_duration == expected_duration
+        np.testing.assert_array_equal(participation, [expected[c] for c in clients])
+        durations.append(round_duration)
+
+    # Rounds that end with all clients above the minimum epochs and rounds that time out are both covered
+    assert min(durations) < int(MAX_ROUND_IN_MIN / TIMESTEP_IN_MIN) == max(durations)
+    assert MAX_LOCAL_EPOCHS in attribution_passes  # energy is left after the first attribution pass
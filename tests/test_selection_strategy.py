@@ -0,0 +1,181 @@
+"""Client selection of the `SelectionStrategy` implementations, mostly `FedZeroSelectionStrategy`.
+
+Run via: python -m pytest tests
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("gurobipy")  # fedzero.config creates the Gurobi environment on import
+
+from vessim.signal import HistoricalSignal  # noqa: E402
+
+from benchmarks.synthetic import START, synthetic_scenario  # noqa: E402
+from fedzero import selection_strategy  # noqa: E402
+from fedzero.config import TIMESTEP_IN_MIN  # noqa: E402
+from fedzero.entities import PowerDomainApi, planning_horizon  # noqa: E402
+from fedzero.selection_strategy import (  # noqa: E402
+    FeasibilityIndex, FedZeroSelectionStrategy, HeuristicSelectionStrategy, RandomSelectionStrategy)
+from fedzero.solvers import SolverSettings  # noqa: E402
+from fedzero.utility import StaticJudge  # noqa: E402
+
+
+def counted(first_feasible):
+    """A `solve` callback feasible from duration `first_feasible` on (never if None) that counts its calls."""
+    calls = []
+
+    def solve(d):
+        calls.append(d)
+        return d if first_feasible is not None and d >= first_feasible else None
+    return solve, calls
+
+
+@pytest.mark.parametrize("n_durations", [1, 2, 5, 17, 60])
+def test_search_duration_finds_the_same_duration_as_the_scan(n_durations):
+    rng = np.random.default_rng(n_durations)
+    passes_filters = rng.random(n_durations) < 0.7
+    passes_filters[-1] = True
+    durations = np.flatnonzero(passes_filters) + 1
+    search_solves, scan_solves = 0, 0
+    for first_feasible in [None, *range(1, n_durations + 1)]:
+        search, search_calls = counted(first_feasible)
+        scan, scan_calls = counted(first_feasible)
+        assert (FedZeroSelectionStrategy._search_duration(search, passes_filters)
+                == FedZeroSelectionStrategy._scan_durations(scan, passes_filters))
+        assert set(search_calls) <= set(durations)  # only durations that pass the filters are solved
+        # Overshooting the first feasible duration costs at most one solve
+        assert len(search_calls) <= len(scan_calls) + 1
+        if first_feasible is not None and first_feasible <= durations[min(1, len(durations) - 1)]:
+            assert len(search_calls) == len(scan_calls)
+        search_solves += len(search_calls)
+        scan_solves += len(scan_calls)
+    assert search_solves <= scan_solves
+
+
+def test_selection_picks_the_same_durations_with_fewer_solves():
+    power_domain_api, client_load_api, clients = synthetic_scenario(20, n_zones=2, solar_scale=200)
+    durations, solves = {}, {}
+    for linear in [True, False]:
+        strategy = FedZeroSelectionStrategy(clients_per_round=8, utility_judge=StaticJudge(clients), alpha=0,
+                                            exclusion_factor=0, min_epochs=1, max_epochs=5, solver="highs",
+                                            linear_duration_search=linear)
+        plans = [strategy.select(power_domain_api, client_load_api, round_number=r, now=now)
+                 for r, now in enumerate(range(4, 24, 4), 1)]
+        durations[linear] = [plan.duration for plan in plans]
+        solves[linear] = [strategy.solve_counts[r] for r in range(1, len(plans) + 1)]
+
+    assert durations[False] == durations[True]
+    assert all(search <= scan for search, scan in zip(solves[False], solves[True]))
+    assert sum(solves[False]) < sum(solves[True])
+
+
+def fedzero_strategy(clients, clients_per_round: int, **kwargs) -> FedZeroSelectionStrategy:
+    return FedZeroSelectionStrategy(clients_per_round=clients_per_round, utility_judge=StaticJudge(clients), alpha=0,
+                                    exclusion_factor=0, min_epochs=1, max_epochs=5, solver="highs", **kwargs)
+
+
+def test_pruning_passes_on_unused_quota_and_only_adds_candidates():
+    power_domain_api, client_load_api, clients = synthetic_scenario(30, n_zones=3)
+    feasibility = FeasibilityIndex(power_domain_api, client_load_api, 60, 12)
+    green_candidates = np.ones((feasibility.max_duration, len(clients)), dtype=bool)
+    green_candidates[:, [i for i, c in enumerate(clients) if c.zone == "zone0"][1:]] = False  # one candidate
+    green_candidates[:4, [i for i, c in enumerate(clients) if c.zone == "zone1"][2:]] = False  # two before d = 5
+    pruning = fedzero_strategy(clients, 10, pruning_factor=1)
+    pruning._kept_from = pruning._prune_candidates(feasibility, clients, green_candidates,
+                                                   pruning.utility_judge.utility())
+
+    kept = [set(pruning._kept_candidates(clients, d)) for d in range(1, feasibility.max_duration + 1)]
+    for d, (candidates, kept_for_d) in enumerate(zip(green_candidates, kept), start=1):
+        assert kept_for_d <= {c for c, ok in zip(clients, candidates) if ok}
+        assert len(kept_for_d) >= 10  # ceil(10 / 3) per zone would only keep 1 + 2 + 4 clients for d < 5
+    assert all(shorter <= longer for shorter, longer in zip(kept, kept[1:]))
+
+
+@pytest.mark.parametrize("pruning_factor", [0.5, 2])
+def test_pruned_selection_finds_the_same_durations(pruning_factor):
+    power_domain_api, client_load_api, clients = synthetic_scenario(20, n_zones=2, solar_scale=200)
+    durations = {}
+    for factor in [None, pruning_factor]:
+        selection = fedzero_strategy(clients, 8, pruning_factor=factor)
+        durations[factor] = [selection.select(power_domain_api, client_load_api, round_number=r, now=now).duration
+                             for r, now in enumerate(range(4, 40, 12), 1)]
+    assert durations[pruning_factor] == durations[None]
+
+
+def test_planning_rounds_need_forecasts_for_all_planned_rounds():
+    power_domain_api, client_load_api, clients = synthetic_scenario(20, n_zones=2)
+    with pytest.raises(ValueError, match="planning_rounds=3"):
+        fedzero_strategy(clients, 5, planning_rounds=3).select(power_domain_api, client_load_api, 1, now=30)
+
+    power_domain_api, client_load_api, clients = synthetic_scenario(20, n_zones=2, planning_rounds=3)
+    assert client_load_api.forecast_horizon(30) == power_domain_api.forecast_horizon(30) == planning_horizon(3)
+    planning = fedzero_strategy(clients, 5, planning_rounds=3)
+    plan = planning.select(power_domain_api, client_load_api, 1, now=30)
+    assert [r for r, _ in planning._planned_rounds] == [2, 3]
+    assert all(solution.shape[1] == plan.duration for _, solution in planning._planned_rounds)
+
+
+def test_heuristic_selection_reports_its_gap():
+    power_domain_api, client_load_api, clients = synthetic_scenario(20, n_zones=2)
+    heuristic = HeuristicSelectionStrategy(clients_per_round=5, utility_judge=StaticJudge(clients), alpha=0,
+                                           exclusion_factor=0, min_epochs=1, max_epochs=5, solver="highs",
+                                           report_gap=True)
+    for round_number, now in enumerate(range(30, 90, 20), 1):
+        plan = heuristic.select(power_domain_api, client_load_api, round_number, now)
+        assert len(plan.clients) >= 5
+        assert 0 <= heuristic.gaps[round_number] < 1
+
+
+@pytest.mark.parametrize("solver", ["gurobi", "highs"])
+def test_selection_falls_back_to_the_greedy_heuristic_without_incumbent(solver):
+    power_domain_api, client_load_api, clients = synthetic_scenario(20, n_zones=2)
+    selection = FedZeroSelectionStrategy(clients_per_round=5, utility_judge=StaticJudge(clients), alpha=0,
+                                         exclusion_factor=0, min_epochs=1, max_epochs=5, solver=solver,
+                                         solver_settings=SolverSettings(time_limit=0))
+    plan = selection.select(power_domain_api, client_load_api, 1, now=30)
+    assert len(plan.clients) == 5
+    assert [(s.status, s.has_solution) for s in selection.solve_stats[1]] == [("TIME_LIMIT", False)]
+
+
+def test_combined_selection_is_not_longer_than_the_two_stage_selection(monkeypatch):
+    monkeypatch.setattr(selection_strategy, "ENABLE_BROWN_CLIENTS", True)
+    power_domain_api, client_load_api, clients = synthetic_scenario(10, n_zones=2)
+    plans = {}
+    for combined in [False, True]:
+        selection = fedzero_strategy(clients, 3, combined_brown_selection=combined)
+        plans[combined] = [selection.select(power_domain_api, client_load_api, round_number=r, now=now)
+                           for r, now in zip(range(selection_strategy.TIME_WINDOW_LOWER_BOUND, 200), [10, 20, 30])]
+
+    for two_stage, plan in zip(plans[False], plans[True]):
+        # The two-stage green optimum may leave no feasible brown selection, see `CombinedSelectionProblem`
+        assert two_stage is None or plan.duration <= two_stage.duration
+        green, brown = ~plan.is_brown, plan.is_brown
+        assert green.sum() == 3 and brown.sum() >= 1
+        assert not set(np.array(plan.clients)[green]) & set(np.array(plan.clients)[brown])
+        energy = plan.batches.sum(axis=1) * [c.energy_per_batch for c in plan.clients]  # batches are float32
+        assert energy[brown].sum() <= selection_strategy.BROWN_CLIENTS_BUDGET_PERCENTAGE * energy[green].sum() * 1.0001
+
+
+def night_scenario():
+    """Like `synthetic_scenario`, but without solar power before timestep 40 in zone0 and 60 in zone1."""
+    _, client_load_api, clients = synthetic_scenario(10, n_zones=2)
+    index = pd.date_range(START, START + timedelta(hours=4), freq=f"{TIMESTEP_IN_MIN}min")
+    solar = pd.DataFrame(500.0, index=index, columns=["zone0", "zone1"])
+    solar.iloc[:40, 0] = solar.iloc[:60, 1] = 0
+    power_domain_api = PowerDomainApi(HistoricalSignal(solar, solar, fill_method="bfill"), start=START)
+    return power_domain_api, client_load_api, clients
+
+
+@pytest.mark.parametrize("random", [True, False])
+def test_next_feasible_time_only_skips_timesteps_at_which_selection_fails(random):
+    power_domain_api, client_load_api, clients = night_scenario()
+    selection = RandomSelectionStrategy(3) if random else fedzero_strategy(clients, 3)
+
+    t = selection.next_feasible_time(power_domain_api, client_load_api, 0, until=100)
+    assert t >= 40
+    assert all(selection.select(power_domain_api, client_load_api, 1, now) is None for now in range(0, t, 3))
+    assert selection.select(power_domain_api, client_load_api, 1, t) is not None
+    assert selection.next_feasible_time(power_domain_api, client_load_api, 0, until=39) is None
+    assert selection.next_feasible_time(power_domain_api, client_load_api, 1, until=100, step=5) in range(t, t + 5)
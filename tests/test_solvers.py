@@ -0,0 +1,124 @@
+"""Selection solvers: limits and statistics of solves, MIP starts of the Gurobi models and the greedy heuristic.
+
+Run via: python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+grb = pytest.importorskip("gurobipy")
+
+from fedzero.config import GUROBI_ENV  # noqa: E402
+from fedzero.solvers import (  # noqa: E402
+    CombinedSelectionProblem, SelectionProblem, SolverSettings, get_solver, greedy_selection, optimize_from_start)
+
+
+def selection_model(utility: np.ndarray, n_clients: int):
+    """Selects exactly `n_clients` clients with the highest total utility."""
+    model = grb.Model(env=GUROBI_ENV)
+    model.Params.OutputFlag = 0
+    b = model.addMVar(len(utility), vtype=grb.GRB.BINARY)
+    model.addConstr(b.sum() == n_clients)
+    model.setObjective(utility @ b, grb.GRB.MAXIMIZE)
+    return model, b
+
+
+def test_feasible_start_is_accepted():
+    model, b = selection_model(np.array([1.0, 2.0, 3.0, 4.0]), 2)
+    assert optimize_from_start(model, b, np.array([True, False, True, False])) is True
+    assert np.isclose(model.ObjVal, 7)
+
+
+def test_infeasible_start_is_rejected():
+    model, b = selection_model(np.array([1.0, 2.0, 3.0, 4.0]), 2)
+    assert optimize_from_start(model, b, np.array([True, True, True, False])) is False
+    assert np.isclose(model.ObjVal, 7)
+
+
+@pytest.mark.parametrize("start", [None, np.zeros(4, dtype=bool)])
+def test_empty_start_is_no_start(start):
+    model, b = selection_model(np.array([1.0, 2.0, 3.0, 4.0]), 2)
+    assert optimize_from_start(model, b, start) is None
+    assert np.isclose(model.ObjVal, 7)
+
+
+def random_problem(rng: np.random.Generator, n_clients: int = 8, n_timesteps: int = 6) -> SelectionProblem:
+    min_batches = rng.uniform(1, 10, n_clients)
+    return SelectionProblem(capacity=rng.uniform(0, 5, (n_clients, n_timesteps)),
+                            energy_per_batch=rng.uniform(1, 5, n_clients),
+                            min_batches=min_batches,
+                            max_batches=min_batches * rng.uniform(1, 3, n_clients),
+                            utility=rng.uniform(0, 1, n_clients),
+                            n_clients=3,
+                            zone_ids=rng.integers(0, 2, n_clients),
+                            zone_energy=rng.uniform(0, 30, (2, n_timesteps)))
+
+
+def is_feasible(problem: SelectionProblem, allocation: np.ndarray, selected: np.ndarray) -> bool:
+    x = np.concatenate([allocation.ravel(), selected.astype(float)])
+    rows_hold = {"<": lambda lhs, rhs: lhs <= rhs + 1e-6, ">": lambda lhs, rhs: lhs >= rhs - 1e-6,
+                 "=": lambda lhs, rhs: np.isclose(lhs, rhs)}
+    return (np.all(allocation >= -1e-9) and np.all(allocation <= problem.capacity + 1e-9)
+            and all(rows_hold[sense](a @ x, rhs).all() for a, sense, rhs in problem.constraints()))
+
+
+def test_greedy_selection_is_feasible_and_not_above_the_optimum():
+    rng = np.random.default_rng(0)
+    solved = 0
+    for _ in range(30):
+        problem = random_problem(rng)
+        greedy = greedy_selection(problem)
+        optimal = get_solver("highs").solve_selection(problem)
+        if greedy is None:
+            continue
+        solved += 1
+        assert optimal is not None
+        assert is_feasible(problem, greedy.allocation, greedy.selected)
+        assert np.isclose(greedy.objective, (problem.utility[:, None] * greedy.allocation).sum())
+        assert greedy.objective <= optimal.objective + 1e-6
+    assert solved > 0
+
+
+def test_solver_settings_only_override_given_limits():
+    model = grb.Model(env=GUROBI_ENV)
+    defaults = model.Params.TimeLimit, model.Params.MIPGap, model.Params.Threads
+    SolverSettings().apply(model)
+    assert (model.Params.TimeLimit, model.Params.MIPGap, model.Params.Threads) == defaults
+
+    SolverSettings(time_limit=2.5, mip_gap=0.05, threads=1).apply(model)
+    assert (model.Params.TimeLimit, model.Params.MIPGap, model.Params.Threads) == (2.5, 0.05, 1)
+
+
+@pytest.mark.parametrize("solver", ["gurobi", "highs"])
+def test_solve_stats_describe_the_solve(solver):
+    problem = random_problem(np.random.default_rng(1))
+    n, d = problem.capacity.shape
+    solution, stats = get_solver(solver).solve_selection_with_stats(problem, "test", SolverSettings(mip_gap=0.01))
+    assert solution is not None
+    assert (stats.name, stats.status, stats.has_solution) == ("test", "OPTIMAL", True)
+    assert 0 <= stats.mip_gap <= 0.01 and stats.runtime >= 0
+    assert stats.n_vars == n * d + n
+    assert stats.warm_start is None
+
+    problem.n_clients = n + 1  # more clients than there are
+    solution, stats = get_solver(solver).solve_selection_with_stats(problem, "test")
+    assert solution is None
+    assert (stats.status, stats.has_solution, stats.mip_gap) == ("INFEASIBLE", False, np.inf)
+
+
+def test_combined_selection_backends_agree_and_couple_green_and_brown():
+    rng = np.random.default_rng(2)
+    green = random_problem(rng)
+    brown = random_problem(rng, n_clients=5)
+    brown.n_clients, brown.exact_n_clients, brown.zone_ids, brown.zone_energy = 2, False, None, None
+    problem = CombinedSelectionProblem(green=green, brown=brown, brown_green_index=np.array([0, 3, -1, -1, 6]),
+                                       budget_share=0.5)
+
+    solutions = [get_solver(solver).solve_selection(problem) for solver in ["gurobi", "highs"]]
+    assert np.isclose(solutions[0].objective, solutions[1].objective, rtol=1e-4)
+    for solution in solutions:
+        green_part, brown_part = problem.split(solution)
+        assert is_feasible(green, green_part.allocation, green_part.selected)
+        assert is_feasible(brown, brown_part.allocation, brown_part.selected)
+        assert not (green_part.selected[[0, 3, 6]] & brown_part.selected[[0, 1, 4]]).any()
+        green_energy = green_part.allocation.sum(axis=1) @ green.energy_per_batch
+        assert brown_part.allocation.sum(axis=1) @ brown.energy_per_batch <= 0.5 * green_energy + 1e-6